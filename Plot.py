@@ -1,15 +1,24 @@
 import numpy as np
 from os import environ
-import matplotlib
 import warnings
 
-if 'DISPLAY' not in environ:
-    matplotlib.use('pdf')
-    import matplotlib.pyplot as plt
-else:
+from triangle_mesh import TriangleMesh
+
+
+def _pyplot():
+    # matplotlib is imported on first plot, not on import of this module,
+    # backend is switched to non-interactive raster one if there is no display
+    import matplotlib
+    if 'DISPLAY' not in environ:
+        matplotlib.use('agg')
     import matplotlib.pyplot as plt
+    warnings.simplefilter(action="ignore", category=FutureWarning)
+    return plt
+
 
-warnings.simplefilter(action="ignore", category=FutureWarning)
+def vector_array_translation(vector_arr, translation_arr):
+    # translate vectors to given points (e.g. normals to vertices), returns end points of translated vectors
+    return np.array(vector_arr, dtype=np.float64) + np.array(translation_arr, dtype=np.float64)
 
 
 def axis_equal_3d(ax):
@@ -22,26 +31,178 @@ def axis_equal_3d(ax):
         getattr(ax, 'set_{}lim'.format(dim))(ctr - r, ctr + r)
 
 
+def _flat_values(values):
+    # all numbers of array or nested (possibly ragged) lists as one flat array
+    try:
+        return np.asarray(values, dtype=np.float64).ravel()
+    except ValueError:
+        return np.concatenate([_flat_values(v) for v in values]) if len(values) else np.empty(0)
+
+
 def figure_axis_range(arr):
-    if type(arr) is type([]):
-        arr = np.array(arr)
-    maxim = - np.inf
-    minim = np.inf
-    for obj in arr:
-        ma = np.amax(obj)
-        mi = np.amin(obj)
-        if ma > maxim:
-            maxim = ma
-        if mi < minim:
-            minim = mi
-        # if abs(mi) > maxim: maxim = abs(mi)
-    return np.array([minim, maxim])
+    # [minimum, maximum] of all coordinates of all objects, computed by single min / max over flattened values
+    values = _flat_values(arr)
+    if values.size == 0:
+        return np.array([np.inf, -np.inf])
+    return np.array([np.amin(values), np.amax(values)])
+
+
+# level of detail
+# ---------------
+# scene is decimated to given budget of faces / points before drawing, so time of rendering is bounded
+#       random:  budget of items is sampled uniformly (without replacement, order of items is kept)
+#       cluster: vertex clustering, bounding box is divided into grid of cells, every vertex is moved to mean
+#                of vertices of its cell, faces collapsed by clustering and duplicate faces are dropped
+#                (one point per cell for points); grid is coarsened until result fits the budget
+# decimation returns indices of original items kept (representative item for clustering), so per-item colors
+# are decimated the same way
+
+_CLUSTER_STEPS = 8
+
+
+def _sample(n, budget, seed):
+    return np.sort(np.random.default_rng(seed).choice(n, budget, replace=False))
+
+
+def _unit(points):
+    # points scaled to unit bounding cube, bounding box is computed once for all grid resolutions
+    lower = points.min(axis=0)
+    extent = max(float(np.amax(points.max(axis=0) - lower)), np.finfo(np.float64).tiny)
+    return (points - lower) / extent
+
+
+def _cells(unit, resolution):
+    # cell of every point in grid of resolution ** dim cells over unit cube, as single integer key
+    cells = np.minimum((unit * resolution).astype(np.int64), resolution - 1)
+    key = cells[:, -1].copy()
+    for k in range(unit.shape[1] - 2, -1, -1):
+        key *= resolution
+        key += cells[:, k]
+    return key
+
+
+def _cell_means(points, inverse, n_cells):
+    counts = np.bincount(inverse, minlength=n_cells)
+    return np.stack([np.bincount(inverse, weights=points[:, k], minlength=n_cells) / counts
+                     for k in range(points.shape[1])], axis=1)
+
+
+def _coarser(resolution, count, budget, dim):
+    # grid resolution expected to give at most budget items, count items are given by current resolution
+    return max(min(int(resolution * (float(budget) / count) ** (1.0 / dim)), resolution - 1), 1)
+
+
+def decimate_points(points, budget, method="cluster", seed=0):
+    """
+    :param points: array_like of shape (N, D)
+    :param budget: int, maximal number of points, None for all points
+    :param method: str, "cluster" or "random"
+    :param seed: int, seed of random sampling
+    :return: tuple (points of shape (K, D), indices of kept points), K <= budget
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if budget is None or len(points) <= budget:
+        return points, np.arange(len(points))
+    if method == "random":
+        index = _sample(len(points), budget, seed)
+        return points[index], index
+    if method != "cluster":
+        raise ValueError("unknown decimation method {}".format(method))
+
+    # points of scenes are mostly on surfaces, so initial grid is estimated as 2d
+    resolution, unit = max(int(np.sqrt(budget)), 1), _unit(points)
+    for _ in range(_CLUSTER_STEPS):
+        _, first, inverse = np.unique(_cells(unit, resolution), return_index=True, return_inverse=True)
+        if len(first) <= budget or resolution == 1:
+            break
+        resolution = _coarser(resolution, len(first), budget, points.shape[1])
+    means = _cell_means(points, inverse.ravel(), len(first))
+    order = np.argsort(first)
+    if len(first) > budget:
+        order = order[_sample(len(order), budget, seed)]
+    return means[order], first[order]
+
+
+def decimate_faces(faces, budget, method="cluster", seed=0):
+    """
+    :param faces: array_like of shape (N, M, D) or list of polygons (random sampling only)
+    :param budget: int, maximal number of faces, None for all faces
+    :param method: str, "cluster" (triangles only, random sampling is used otherwise) or "random"
+    :param seed: int, seed of random sampling
+    :return: tuple (faces (K, M, D) or list, indices of kept faces), K <= budget
+    """
+    n = len(faces)
+    if budget is None or n <= budget:
+        return faces, np.arange(n)
+    if method not in ("cluster", "random"):
+        raise ValueError("unknown decimation method {}".format(method))
+    if method == "random" or type(faces) is type([]) or np.shape(faces)[1] != 3:
+        index = _sample(n, budget, seed)
+        return ([faces[i] for i in index] if type(faces) is type([]) else np.asarray(faces)[index]), index
+
+    faces = np.asarray(faces, dtype=np.float64)
+    points = faces.reshape(-1, faces.shape[2])
+    # faces of surface over grid of r x r cells are about 2 r^2
+    resolution, unit = max(int(np.sqrt(budget / 2.0)), 1), _unit(points)
+    for _ in range(_CLUSTER_STEPS):
+        cells, inverse = np.unique(_cells(unit, resolution), return_inverse=True)
+        corners = inverse.reshape(-1, 3)
+        valid = np.flatnonzero((corners[:, 0] != corners[:, 1]) & (corners[:, 1] != corners[:, 2]) &
+                               (corners[:, 0] != corners[:, 2]))
+        # faces with the same cells (in any order) are duplicates, first of them is kept
+        key = np.sort(corners[valid], axis=1)
+        order = np.lexsort((valid, key[:, 2], key[:, 1], key[:, 0]))
+        key = key[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = np.any(key[1:] != key[:-1], axis=1)
+        kept = np.sort(valid[order[first]])
+        if len(kept) <= budget or resolution == 1:
+            break
+        resolution = _coarser(resolution, len(kept), budget, 2)
+    if len(kept) > budget:
+        kept = kept[_sample(len(kept), budget, seed)]
+    means = _cell_means(points, inverse.ravel(), len(cells))
+    return means[corners[kept]], kept
+
+
+def _polygons(objects):
+    # faces of all objects as one array of shape (N, M, 3) (list of polygons if objects have polygons
+    # of different size) and number of faces of each object
+    arrays = [np.asarray(obj, dtype=np.float64) for obj in objects]
+    counts = [len(a) for a in arrays]
+    if all(a.ndim == 3 and a.shape[1:] == arrays[0].shape[1:] for a in arrays) and arrays:
+        return np.concatenate(arrays), counts
+    return [np.asarray(polygon, dtype=np.float64) for obj in objects for polygon in obj], counts
+
+
+def _points(objects):
+    # points of all objects as one array of shape (N, 3) and number of points of each object,
+    # TriangleMesh gives its vertices (faces objects convert to triangles by themselves)
+    arrays = [np.asarray(obj.vertices if isinstance(obj, TriangleMesh) else obj, dtype=np.float64).reshape(-1, 3)
+              for obj in objects]
+    counts = [len(a) for a in arrays]
+    return (np.concatenate(arrays) if arrays else np.empty((0, 3))), counts
+
+
+def _flat_colors(color, counts):
+    # single matplotlib color string or colors given per object and item ([object][item]) flattened to one
+    # list matching concatenated items
+    if type(color) == type(""):
+        return str(color)
+    return [str(c) if np.isscalar(c) else c for obj, n in zip(color, counts) for c in list(obj)[:n]]
+
+
+def _select(colors, index):
+    # colors of kept items after decimation
+    return colors if type(colors) == type("") or len(index) == len(colors) else [colors[i] for i in index]
 
 
 def plot_2d(point_color="r", point_marker="o", points=None, x_label="x", y_label="y", point_size=1., save=False,
-            filename="plot", aspect="equal", line=False, grid=False):
-    zip_data = list(zip(*points))
-    xs, ys = zip_data[0], zip_data[1]
+            filename="plot", aspect="equal", line=False, grid=False, lod=None, lod_method="cluster"):
+    # lod: maximal number of drawn points (level of detail), None for all points
+    plt = _pyplot()
+    points, _ = decimate_points(np.asarray(points, dtype=np.float64)[:, :2], lod, lod_method)
+    xs, ys = points[:, 0], points[:, 1]
     fig = plt.figure()
     ax = fig.add_subplot(111, aspect=aspect)
     ax.scatter([xs], [ys], color=str(point_color), marker=point_marker, s=point_size)
@@ -56,69 +217,82 @@ def plot_2d(point_color="r", point_marker="o", points=None, x_label="x", y_label
     if not save:
         plt.show()
     else:
-        plt.savefig(str(filename) + ".png")
+        fig.savefig(str(filename) + ".png")
+        plt.close(fig)
 
 
 def plot_3d(faces=None, normals=None, vertices=None, edge_color="k",
             face_color="w",  # matplotlib string or list
             normal_color="r", x_label="x", y_label="y", z_label="z", point_color="r", point_size=1.0, axis_off=False,
             faces_view=True, normals_view=True, points_view=True, azim=0, elev=0, face_alpha=1.0, save=False,
-            filename="untitled", x_range=None, y_range=None, z_range=None, dpi=300):
+            filename="untitled", x_range=None, y_range=None, z_range=None, dpi=300, lod=None, lod_method="cluster"):
+    # faces: list of objects of faces, object is nested list / array of shape (F, 3, 3) or TriangleMesh
+    #        (vertices objects can be TriangleMesh too)
+    # lod: maximal number of drawn faces, points and normals (level of detail), None for all of them;
+    #      lod_method: "cluster" or "random", see decimate_faces()
+    plt = _pyplot()
+
+    # axes created by Axes3D(figure) are not added to figure by matplotlib >= 3.4
+    fig = plt.figure()
+    ax = fig.add_subplot(111, projection="3d")
+    _draw_3d(ax, faces=faces, normals=normals, vertices=vertices, edge_color=edge_color, face_color=face_color,
+             normal_color=normal_color, x_label=x_label, y_label=y_label, z_label=z_label, point_color=point_color,
+             point_size=point_size, axis_off=axis_off, faces_view=faces_view, normals_view=normals_view,
+             points_view=points_view, azim=azim, elev=elev, face_alpha=face_alpha, x_range=x_range,
+             y_range=y_range, z_range=z_range, lod=lod, lod_method=lod_method)
+
+    if not save:
+        plt.show()
+    else:
+        fig.savefig(str(filename) + ".png", dpi=dpi)
+        plt.close(fig)
+
+
+def _draw_3d(ax, faces=None, normals=None, vertices=None, edge_color="k", face_color="w", normal_color="r",
+             x_label="x", y_label="y", z_label="z", point_color="r", point_size=1.0, axis_off=False, faces_view=True,
+             normals_view=True, points_view=True, azim=0, elev=0, face_alpha=1.0, x_range=None, y_range=None,
+             z_range=None, lod=None, lod_method="cluster"):
+    # scene of plot_3d() drawn to given 3d axes
     import mpl_toolkits.mplot3d as a3
-    warnings.simplefilter(action="ignore", category=FutureWarning)
 
-    ax = a3.Axes3D(plt.figure())
     axis_range = 0.0
 
     # faces plotting
     # --------------
-    idx_inner, idx_outer = 0, 0
+    # all faces of all objects are drawn as single collection with per-face colors, depth sorting of faces
+    # is done by collection itself
     if faces_view:
-        for obj in faces:
-            idx_inner = 0
-            for vtx in obj:
-                # face color
-                if type(face_color) == type(""):
-                    fce_color = str(face_color)
-                else:
-                    fce_color = str(face_color[idx_outer][idx_inner])
-                # /face color
-                tri = a3.art3d.Poly3DCollection([vtx], alpha=face_alpha,
-                                                edgecolors=str(edge_color))
-                tri.set_facecolor(fce_color)
-                ax.add_collection3d(tri)
-                idx_inner += 1
-        axis_range = figure_axis_range(arr=faces)
+        polygons, counts = _polygons(faces)
+        axis_range = figure_axis_range(polygons)
+        colors = _flat_colors(face_color, counts)
+        polygons, index = decimate_faces(polygons, lod, lod_method)
+        tri = a3.art3d.Poly3DCollection(polygons, alpha=face_alpha, edgecolors=str(edge_color))
+        tri.set_facecolor(_select(colors, index))
+        ax.add_collection3d(tri)
 
     # points ploting
     # --------------
-    idx = 0
     if points_view:
-        for obj in vertices:
-            if type(obj) is type([]): obj = np.array(obj)
-
-            zip_points = obj.T  # zip(*obj)
-            xs, ys, zs = zip_points[0], zip_points[1], zip_points[2]
-            if type(point_color) == type(""):
-                ax.scatter([xs], [ys], [zs], color=point_color, marker="o", s=point_size)
-            else:
-                ax.scatter([xs], [ys], [zs], color=[color for color in point_color[idx]], marker="o", s=point_size)
-            idx += 1
-        axis_range = figure_axis_range(arr=vertices)
+        points, counts = _points(vertices)
+        axis_range = figure_axis_range(points)
+        colors = _flat_colors(point_color, counts)
+        points, index = decimate_points(points, lod, lod_method)
+        ax.scatter(points[:, 0], points[:, 1], points[:, 2], color=_select(colors, index), marker="o",
+                   s=point_size)
 
     # normals ploting
     # ---------------
+    # normals are segments from vertex to end point of normal, given by vertices[i][j] and normals[i][j]
     if normals_view:
-        for obj_idx in range(0, len(normals)):
-            for idx in range(0, len(normals[obj_idx])):
-                # normal color
-                norm_color = str(normal_color) if type(normal_color) == type("") else str(normal_color[obj_idx][idx])
-                # /normal color
-
-                segment = [vertices[obj_idx][idx], normals[obj_idx][idx]]
-                line = a3.art3d.Line3DCollection([segment], alpha=1.0, zorder=1, colors=norm_color)
-                ax.add_collection3d(line)
-        axis_range = figure_axis_range(arr=vertices)
+        ends, counts = _points(normals)
+        starts = np.concatenate([np.asarray(obj, dtype=np.float64).reshape(-1, 3)[:n]
+                                 for obj, n in zip(vertices, counts)]) if len(counts) else np.empty((0, 3))
+        # normals are sampled, clustering would not keep them attached to their vertices
+        segments, index = decimate_faces(np.stack((starts, ends), axis=1), lod, "random")
+        line = a3.art3d.Line3DCollection(segments, alpha=1.0, zorder=1,
+                                         colors=_select(_flat_colors(normal_color, counts), index))
+        ax.add_collection3d(line)
+        axis_range = figure_axis_range(vertices)
 
     # additional plot options
     # -----------------------
@@ -140,16 +314,108 @@ def plot_3d(faces=None, normals=None, vertices=None, edge_color="k",
     ax.view_init(azim=azim, elev=elev)
 
     ax.set_autoscale_on(True)
-    plt.gca().set_aspect('equal')
+    ax.set_aspect('equal')
     axis_equal_3d(ax)
 
     if axis_off:
-        plt.axis('off')
+        ax.set_axis_off()
 
-    if not save:
-        plt.show()
-    else:
-        plt.savefig(str(filename) + ".png", dpi=dpi)
+
+# headless rendering
+# ------------------
+# SceneRenderer draws scenes of plot_3d() to image files, single figure and axes are reused for every frame
+# (axes are cleared between frames); figure is not registered in pyplot, it is drawn by Agg canvas directly, so
+# it does not depend on selected backend and it is released by close() or at the end of with statement
+#
+# render_scenes() renders many scenes (e.g. reports of collision cases) in worker processes, every worker owns
+# one renderer for all its frames, only scenes and file names are sent between processes
+#
+#       with SceneRenderer(dpi=100, azim=30, elev=20) as renderer:
+#           for k, (tri1, tri2) in enumerate(cases):
+#               renderer.render("case_{}.png".format(k), faces=[tri1, tri2], face_color=colors)
+
+# renderer of worker process
+_renderer = None
+
+
+class SceneRenderer(object):
+    def __init__(self, figsize=(6.4, 4.8), dpi=100, **options):
+        """
+        :param figsize: tuple (width, height) in inches
+        :param dpi: int, resolution of images
+        :param options: default keyword arguments of plot_3d() for every scene (e.g. azim, elev, lod)
+        """
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        # registers 3d projection
+        import mpl_toolkits.mplot3d
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111, projection="3d")
+        self.dpi = dpi
+        self.options = options
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def render(self, filename, **scene):
+        """
+        :param filename: str, image file, format is given by extension
+        :param scene: keyword arguments of plot_3d() (faces, normals, vertices, colors, view, ranges, lod);
+                      faces / normals / points are drawn if they are given unless view flag says otherwise
+        :return: filename
+        """
+        if self.figure is None:
+            raise ValueError("renderer is closed")
+        options = dict(self.options)
+        options.update(scene)
+        for items, view in (("faces", "faces_view"), ("normals", "normals_view"), ("vertices", "points_view")):
+            options.setdefault(view, options.get(items) is not None)
+
+        self.ax.cla()
+        self.ax.set_axis_on()
+        _draw_3d(self.ax, **options)
+        self.figure.savefig(filename, dpi=self.dpi)
+        return filename
+
+    def close(self):
+        if self.figure is not None:
+            self.figure.clear()
+            self.figure, self.ax = None, None
+
+
+def _start_renderer(options):
+    # pool initializer
+    global _renderer
+    _renderer = SceneRenderer(**options)
+
+
+def _render_scene(scene):
+    scene = dict(scene)
+    return _renderer.render(scene.pop("filename"), **scene)
+
+
+def render_scenes(scenes, processes=None, chunksize=1, **options):
+    """
+    render scenes to image files in parallel
+
+    :param scenes: iterable of dict, keyword arguments of SceneRenderer.render() including filename
+    :param processes: int, number of worker processes, default is number of cores, 1 renders in current process
+    :param chunksize: int, number of scenes sent to worker at once
+    :param options: arguments of SceneRenderer (figsize, dpi and defaults of scenes)
+    :rtype: list of str, written files in order of scenes
+    """
+    if processes == 1:
+        with SceneRenderer(**options) as renderer:
+            return [renderer.render(**scene) for scene in scenes]
+
+    import multiprocessing as mp
+    with mp.Pool(processes=processes, initializer=_start_renderer, initargs=(options, )) as pool:
+        return list(pool.imap(_render_scene, scenes, chunksize))
 
 
 def empty(var, debug=False):
@@ -189,7 +455,7 @@ def empty(var, debug=False):
     elif type(var) == type("foo"):
         if debug:
             print("Variable type is <string>")
-        if var is "" or var == "0":
+        if var == "" or var == "0":
             return True
     else:
         try:
@@ -0,0 +1,73 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from clipping import intersection_area, triangle_intersection_areas
+
+# clipping of polygons and scale invariance of intersection areas
+#
+# workloads: --n pairs of random triangles (Sutherland-Hodgman, Greiner-Hormann and batched clipping) and
+#            --n / 4 pairs of random star-shaped polygons (Greiner-Hormann)
+# every workload is clipped with coordinates scaled by 1e-8 ... 1e8 and areas divided by scale ** 2 are compared
+# with areas of unscaled workload (relative tolerance 1e-6); number of changed areas is reported for every
+# method and scale and it has to be zero (exit status 1 otherwise), time of unscaled run is recorded too
+#
+# usage: python benchmarks/bench_clipping.py [--n 500] [--output clipping.json]
+
+SCALES = (1e-8, 1e-4, 1e4, 1e8)
+
+
+def star(rng, n):
+    angles = np.sort(rng.random(n)) * 2.0 * np.pi
+    radii = 0.3 + 0.7 * rng.random(n)
+    return np.stack((radii * np.cos(angles), radii * np.sin(angles)), axis=1) * 0.5 + rng.random(2)
+
+
+def methods(t1, t2, stars):
+    return {
+        "sutherland_hodgman": lambda k: np.array([intersection_area(a * k, b * k, convex=True)
+                                                  for a, b in zip(t1, t2)]),
+        "greiner_hormann": lambda k: np.array([intersection_area(a * k, b * k) for a, b in zip(t1, t2)]),
+        "batched": lambda k: triangle_intersection_areas(t1 * k, t2 * k),
+        "greiner_hormann_stars": lambda k: np.array([intersection_area(a * k, b * k) for a, b in stars]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="clipping of polygons and scale invariance of areas")
+    parser.add_argument("--n", type=int, default=500, help="number of triangle pairs")
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    t1, t2 = rng.random((args.n, 3, 2)), rng.random((args.n, 3, 2))
+    stars = [(star(rng, 9), star(rng, 7)) for _ in range(max(args.n // 4, 1))]
+
+    results = {}
+    for name, method in methods(t1, t2, stars).items():
+        t = time.perf_counter()
+        reference = method(1.0)
+        seconds = time.perf_counter() - t
+        changed = {}
+        for k in SCALES:
+            areas = method(k) / (k * k)
+            changed[str(k)] = int(np.count_nonzero(~np.isclose(areas, reference, rtol=1e-6, atol=1e-12)))
+        results[name] = {"pairs": len(reference), "seconds": seconds, "changed": changed}
+        print("{:<24} {:>6} pairs {:>9.4f} s   changed areas by scale: {}".format(
+            name, len(reference), seconds, ", ".join("{} {}".format(k, n) for k, n in changed.items())))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(any(r["changed"].values()) for r in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# import time of core modules, every import is measured in fresh interpreter
+#       numpy is imported first, its time is reported separately, so the module time is cost of module itself
+#       importing of any core module must not import matplotlib (plotting is loaded on first Plot call)
+#
+# usage: python benchmarks/bench_import.py [--repeat 5] [--output import.json]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ["tolerance", "results", "predicates",
+           "edge_intersection", "face_intersection", "plane_line_3d_intesection",
+           "sweep_line", "spatial_index", "clipping", "incremental",
+           "cache", "profiling",
+           "mesh_io", "triangle_mesh", "mesh_intersection",
+           "parallel", "Plot"]
+
+_PROBE = """
+import sys, time
+t = time.perf_counter()
+import numpy
+t_numpy = time.perf_counter() - t
+t = time.perf_counter()
+import {module}
+t_module = time.perf_counter() - t
+print(t_numpy, t_module, "matplotlib" in sys.modules)
+"""
+
+
+def measure(module, repeat):
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    numpy_times, module_times, matplotlib_loaded = [], [], False
+    for _ in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", _PROBE.format(module=module)], env=env, cwd=ROOT)
+        t_numpy, t_module, loaded = out.decode().split()
+        numpy_times.append(float(t_numpy))
+        module_times.append(float(t_module))
+        matplotlib_loaded |= loaded == "True"
+    return {"module": module,
+            "numpy_ms": 1e3 * sorted(numpy_times)[len(numpy_times) // 2],
+            "import_ms": 1e3 * sorted(module_times)[len(module_times) // 2],
+            "matplotlib_loaded": matplotlib_loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="import time of core modules")
+    parser.add_argument("--repeat", type=int, default=5, help="number of fresh interpreters per module")
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    results = [measure(module, args.repeat) for module in MODULES]
+    print("{:<30}{:>12}{:>12}{:>12}".format("module", "numpy [ms]", "import [ms]", "matplotlib"))
+    for r in results:
+        print("{:<30}{:>12.1f}{:>12.1f}{:>12}".format(r["module"], r["numpy_ms"], r["import_ms"],
+                                                      "yes" if r["matplotlib_loaded"] else "no"))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(r["matplotlib_loaded"] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
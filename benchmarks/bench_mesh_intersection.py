@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mesh_intersection import TriangleBVH, candidate_pairs, mesh_intersection, mesh_self_intersection
+from triangle_mesh import TriangleMesh
+
+# self intersection of mesh against intersection of two meshes
+#
+# workload: welded lat-long sphere of about 4 * n ** 2 faces, tested
+#       self:         mesh_self_intersection() of sphere
+#       disjoint:     mesh_intersection() of sphere and its copy scaled by 0.5 (no overlapping boxes of faces)
+#       overlapping:  mesh_intersection() of sphere and its copy rotated by small angle (every face overlaps
+#                     its neighbourhood in the other mesh, density of candidates comparable to self test)
+# for each workload there is recorded best time of --repeat runs, number of candidate pairs (overlapping
+# bounding boxes) and number of reported pairs; in self test candidates are split by number of shared vertices
+# (pairs sharing an edge are skipped, pairs sharing a vertex are tested by edges opposite to it)
+# time per candidate is the figure to compare, self test should not be slower than overlapping meshes
+#
+# usage: python benchmarks/bench_mesh_intersection.py [--n 160] [--output mesh_intersection.json]
+
+
+def sphere(n):
+    m = 2 * n
+    theta, phi = np.meshgrid(np.linspace(0.0, np.pi, n + 1)[1:-1], np.arange(m) * 2.0 * np.pi / m, indexing="ij")
+    vertices = np.stack((np.sin(theta) * np.cos(phi), np.sin(theta) * np.sin(phi), np.cos(theta)), axis=-1)
+    vertices = np.concatenate((vertices.reshape(-1, 3), [[0.0, 0.0, 1.0], [0.0, 0.0, -1.0]]))
+    top, bottom = len(vertices) - 2, len(vertices) - 1
+    rings = np.arange((n - 1) * m).reshape(n - 1, m)
+    a, b = rings[:-1], np.roll(rings[:-1], -1, axis=1)
+    c, d = rings[1:], np.roll(rings[1:], -1, axis=1)
+    faces = np.concatenate((np.stack((a, c, b), axis=-1).reshape(-1, 3), np.stack((b, c, d), axis=-1).reshape(-1, 3),
+                            np.stack((np.full(m, top), rings[0], np.roll(rings[0], -1)), axis=-1),
+                            np.stack((np.full(m, bottom), np.roll(rings[-1], -1), rings[-1]), axis=-1)))
+    return TriangleMesh(vertices, faces)
+
+
+def rotated(mesh, angle):
+    c, s = np.cos(angle), np.sin(angle)
+    rotation = np.array([[c, 0.0, s], [0.0, 1.0, 0.0], [-s, 0.0, c]])
+    return mesh.moved(mesh.vertices @ rotation.T)
+
+
+def candidates(mesh1, mesh2, leaf_size):
+    self_test = mesh2 is None
+    bvh1 = TriangleBVH(mesh1, leaf_size)
+    bvh2 = bvh1 if self_test else TriangleBVH(mesh2, leaf_size)
+    shared = np.zeros(4, dtype=np.int64)
+    for ta, tb in candidate_pairs(bvh1, bvh2, self_test=self_test):
+        if self_test:
+            faces = mesh1.faces
+            n_shared = np.count_nonzero(faces[ta][:, :, np.newaxis] == faces[tb][:, np.newaxis, :], axis=(1, 2))
+            shared += np.bincount(n_shared, minlength=4)[:4]
+        else:
+            shared[0] += len(ta)
+    return shared
+
+
+def best_time(function, repeat):
+    best, result = None, None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - t
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="self intersection of mesh against intersection of two meshes")
+    parser.add_argument("--n", type=int, default=160, help="resolution of sphere, about 4 * n ** 2 faces")
+    parser.add_argument("--leaf-size", type=int, default=4, help="number of triangles in BVH leaf")
+    parser.add_argument("--repeat", type=int, default=3, help="number of runs, the best time is recorded")
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    mesh = sphere(args.n)
+    # other mesh of workload, None for self test
+    workloads = {
+        "self": None,
+        "disjoint": mesh.moved(mesh.vertices * 0.5),
+        "overlapping": rotated(mesh, 0.5 * np.pi / args.n),
+    }
+
+    results = {"faces": len(mesh), "leaf_size": args.leaf_size}
+    print("{} faces, leaf size {}".format(len(mesh), args.leaf_size))
+    for name, other in workloads.items():
+        if other is None:
+            function = lambda: mesh_self_intersection(mesh, leaf_size=args.leaf_size)
+        else:
+            function = lambda: mesh_intersection(mesh, None, other, None, leaf_size=args.leaf_size)
+        seconds, pairs = best_time(function, args.repeat)
+        shared = candidates(mesh, other, args.leaf_size)
+        total = int(shared.sum())
+        per_candidate = 1e6 * seconds / total if total else None
+        results[name] = {"seconds": seconds, "candidates": total, "pairs": len(pairs),
+                         "microseconds_per_candidate": per_candidate}
+        line = "{:<12} {:>9.4f} s {:>9} candidates {:>7} us/candidate {:>7} pairs".format(
+            name, seconds, total, "-" if per_candidate is None else "{:.3f}".format(per_candidate), len(pairs))
+        if other is None:
+            results[name]["shared_vertices"] = {str(k): int(v) for k, v in enumerate(shared)}
+            line += "   shared vertices 0/1/2: {}/{}/{}".format(*shared[:3])
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from mesh_io import STL_RECORD_DTYPE, load_stl
+
+# loading of large binary STL file
+#
+# synthetic STL of --size-mb megabytes is written chunk by chunk (generator itself does not hold whole mesh),
+# then it is loaded and two numbers are recorded
+#       load:   time of load_stl(), file is only mapped, so it does not depend on file size
+#       scan:   time of first pass over all triangles (bounding box), pages are read from disk / page cache
+# and peak resident memory of process in megabytes; triangles are views of mapping, pages are not counted
+# as private memory and they can be dropped by operating system
+#
+# usage: python benchmarks/bench_mesh_io.py [--size-mb 2048] [--path mesh.stl] [--output mesh_io.json]
+
+_CHUNK = 1 << 20
+
+
+def write_synthetic_stl(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as f:
+        f.write(b"synthetic".ljust(80, b"\0"))
+        f.write(np.array([n], dtype="<u4").tobytes())
+        for start in range(0, n, _CHUNK):
+            records = np.zeros(min(_CHUNK, n - start), dtype=STL_RECORD_DTYPE)
+            records["vertices"] = rng.random((len(records), 3, 3), dtype=np.float32)
+            records.tofile(f)
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux, in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20) if sys.platform == "darwin" else rss / (1 << 10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="memory-mapped loading of large binary STL")
+    parser.add_argument("--size-mb", type=int, default=2048, help="size of synthetic file")
+    parser.add_argument("--path", default=None, help="existing STL file, synthetic one is not written")
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    path = args.path
+    if path is None:
+        path = os.path.join(tempfile.gettempdir(), "bench_mesh_io.stl")
+        write_synthetic_stl(path, (args.size_mb << 20) // STL_RECORD_DTYPE.itemsize)
+    rss_before = peak_rss_mb()
+
+    try:
+        t = time.perf_counter()
+        mesh = load_stl(path)
+        t_load = time.perf_counter() - t
+
+        t = time.perf_counter()
+        lower, upper = np.full(3, np.inf), np.full(3, -np.inf)
+        for start in range(0, len(mesh), _CHUNK):
+            points = mesh.triangles[start:start + _CHUNK].reshape(-1, 3)
+            lower, upper = np.minimum(lower, points.min(axis=0)), np.maximum(upper, points.max(axis=0))
+        t_scan = time.perf_counter() - t
+    finally:
+        if args.path is None:
+            os.remove(path)
+
+    results = {"file_mb": os.path.getsize(path) / (1 << 20) if args.path else args.size_mb, "faces": len(mesh),
+               "load": t_load, "scan": t_scan, "peak_rss_mb": peak_rss_mb(), "rss_before_mb": rss_before}
+    print("faces {faces}, load {load:.4f} s, scan {scan:.2f} s, peak rss {peak_rss_mb:.0f} MB "
+          "(before load {rss_before_mb:.0f} MB)".format(**results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from edge_intersection import edge_intersection_2d_batch
+from predicates import orient2d, orient2d_batch, orient3d, orient3d_batch
+
+# cost of adaptive orientation predicates against naive floating point determinant
+#
+# random workload: almost every determinant is decided by filtered path, ratio adaptive / naive time is the
+#                  cost of error bound and it has to stay under 2.0 (exit status 1 otherwise)
+# degenerate workload: points are (nearly) collinear / coplanar, part of determinants goes to exact path,
+#                  number of signs where naive evaluation differs from exact one is reported
+# robust edges: edge_intersection_2d_batch(robust=True) in all-pairs mode (inputs broadcast against each other)
+#                  is compared with element-wise robust mode on the same pairs and with non-robust mode on segments
+#                  in general position, number of differing codes and points has to be zero (exit status 1 otherwise)
+#
+# usage: python benchmarks/bench_predicates.py [--n 1000000] [--repeat 5] [--output predicates.json]
+
+LIMIT = 2.0
+
+
+def naive_orient2d(a, b, c):
+    return np.sign(((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1])) -
+                   ((b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0]))).astype(np.int8)
+
+
+def naive_orient3d(a, b, c, d):
+    return np.sign(np.einsum("...i,...i->...", a - d, np.cross(b - d, c - d))).astype(np.int8)
+
+
+def naive_orient2d_scalar(a, b, c):
+    det = ((b[0] - a[0]) * (c[1] - a[1])) - ((b[1] - a[1]) * (c[0] - a[0]))
+    return (det > 0) - (det < 0)
+
+
+def naive_orient3d_scalar(a, b, c, d):
+    adx, ady, adz = a[0] - d[0], a[1] - d[1], a[2] - d[2]
+    bdx, bdy, bdz = b[0] - d[0], b[1] - d[1], b[2] - d[2]
+    cdx, cdy, cdz = c[0] - d[0], c[1] - d[1], c[2] - d[2]
+    det = adz * (bdx * cdy - cdx * bdy) + bdz * (cdx * ady - adx * cdy) + cdz * (adx * bdy - bdx * ady)
+    return (det > 0) - (det < 0)
+
+
+def workload_2d(rng, n, degenerate):
+    a, b = rng.random((n, 2)), rng.random((n, 2))
+    if not degenerate:
+        return a, b, rng.random((n, 2))
+    c = a + rng.random((n, 1)) * (b - a)
+    return a, b, c + rng.integers(-1, 2, size=c.shape) * np.spacing(c)
+
+
+def workload_3d(rng, n, degenerate):
+    a, b, c = rng.random((n, 3)), rng.random((n, 3)), rng.random((n, 3))
+    if not degenerate:
+        return a, b, c, rng.random((n, 3))
+    u = rng.random((n, 2)) * 0.5
+    d = a + u[:, :1] * (b - a) + u[:, 1:] * (c - a)
+    return a, b, c, d + rng.integers(-1, 2, size=d.shape) * np.spacing(d)
+
+
+def edge_mismatches(rng, n):
+    # differing codes or points of all-pairs robust mode against element-wise robust and non-robust modes
+    e1, e2 = rng.random((n, 2, 2)), rng.random((n // 2, 2, 2))
+    robust = edge_intersection_2d_batch(e1, e2, robust=True)
+    i, j = np.indices(robust.shape).reshape(2, -1)
+    pairwise = edge_intersection_2d_batch(e1[i], e2[j], all_pairs=False, robust=True).reshape(robust.shape)
+    naive = edge_intersection_2d_batch(e1, e2)
+    mismatches = {}
+    for name, other in (("element-wise", pairwise), ("non-robust", naive)):
+        points = np.isclose(robust["x"], other["x"], equal_nan=True) & np.isclose(robust["y"], other["y"],
+                                                                                   equal_nan=True)
+        mismatches[name] = int(np.count_nonzero((robust["code"] != other["code"]) | ~points))
+    return robust.size, mismatches
+
+
+def best_time(function, args, repeat):
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def scalar_loop(function):
+    def run(*args):
+        for points in zip(*args):
+            function(*points)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="adaptive orientation predicates against naive determinant")
+    parser.add_argument("--n", type=int, default=1000000, help="number of batched evaluations")
+    parser.add_argument("--n-scalar", type=int, default=100000, help="number of scalar evaluations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cases = [("orient2d_batch", naive_orient2d, orient2d_batch, workload_2d(rng, args.n, False)),
+             ("orient3d_batch", naive_orient3d, orient3d_batch, workload_3d(rng, args.n, False)),
+             ("orient2d", scalar_loop(naive_orient2d_scalar), scalar_loop(orient2d),
+              [w.tolist() for w in workload_2d(rng, args.n_scalar, False)]),
+             ("orient3d", scalar_loop(naive_orient3d_scalar), scalar_loop(orient3d),
+              [w.tolist() for w in workload_3d(rng, args.n_scalar, False)])]
+
+    results = {"n": args.n, "n_scalar": args.n_scalar, "seed": args.seed, "random": [], "degenerate": []}
+    print("{:<20}{:>14}{:>14}{:>8}".format("random workload", "naive [s]", "adaptive [s]", "ratio"))
+    for name, naive, adaptive, workload in cases:
+        t_naive, t_adaptive = best_time(naive, workload, args.repeat), best_time(adaptive, workload, args.repeat)
+        results["random"].append({"predicate": name, "naive": t_naive, "adaptive": t_adaptive,
+                                  "ratio": t_adaptive / t_naive})
+        print("{:<20}{:>14.4f}{:>14.4f}{:>8.2f}".format(name, t_naive, t_adaptive, t_adaptive / t_naive))
+
+    print("\n{:<20}{:>14}{:>14}{:>14}".format("degenerate workload", "adaptive [s]", "naive wrong", "zero signs"))
+    n = min(args.n, 100000)
+    for name, naive, adaptive, workload in (("orient2d_batch", naive_orient2d, orient2d_batch,
+                                             workload_2d(rng, n, True)),
+                                            ("orient3d_batch", naive_orient3d, orient3d_batch,
+                                             workload_3d(rng, n, True))):
+        t_adaptive = best_time(adaptive, workload, 1)
+        exact = adaptive(*workload)
+        wrong = int((naive(*workload) != exact).sum())
+        results["degenerate"].append({"predicate": name, "n": n, "adaptive": t_adaptive, "naive_wrong": wrong,
+                                      "zero": int((exact == 0).sum())})
+        print("{:<20}{:>14.4f}{:>14}{:>14}".format(name, t_adaptive, wrong, int((exact == 0).sum())))
+
+    pairs, mismatches = edge_mismatches(rng, min(args.n, 1000))
+    results["robust_edges"] = {"pairs": pairs, "mismatches": mismatches}
+    print("\nrobust edges, all pairs ({} pairs) differing from: {}".format(
+        pairs, ", ".join("{} {}".format(k, v) for k, v in mismatches.items())))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(r["ratio"] >= LIMIT for r in results["random"]) or any(mismatches.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,251 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from edge_intersection import edge_intersection_2d, edge_intersection_2d_batch
+from face_intersection import side, point_in_triangle, segment_intersection_2d, point_in_triangle_batch, \
+    face_intersection_2d_batch
+from plane_line_3d_intesection import planeline_intersection, planeline_intersection_batch, to_2d_plane, PlaneFrame, \
+    segment_triangle_intersection_batch
+
+# benchmark of intersection primitives on synthetic workloads
+#
+# every workload is generated from fixed seed for given size n, primitive is called n times (scalar functions
+# in python loop, batched functions once on arrays of n items); for each size there is recorded
+#       seconds:    best time of --repeat runs
+#       throughput: primitive evaluations per second
+#       peak_bytes: peak of memory allocated during one run (tracemalloc, measured in separate run)
+# list of sizes forms scaling curve of primitive
+#
+# usage:
+#       python benchmarks/bench_primitives.py --output results.json
+#       python benchmarks/bench_primitives.py --output new.json --compare results.json
+
+
+def _segments(rng, n):
+    return rng.random((n, 2, 2))
+
+
+def _triangles(rng, n):
+    return rng.random((n, 3, 2))
+
+
+def _points(rng, n):
+    return rng.random((n, 2))
+
+
+def setup_edge(rng, n):
+    return _segments(rng, n).tolist(), _segments(rng, n).tolist()
+
+
+def run_edge(args):
+    for s1, s2 in zip(*args):
+        edge_intersection_2d(s1[0], s1[1], s2[0], s2[1])
+
+
+def setup_edge_batch(rng, n):
+    return _segments(rng, n), _segments(rng, n)
+
+
+def run_edge_batch(args):
+    edge_intersection_2d_batch(args[0], args[1], all_pairs=False)
+
+
+def setup_segment(rng, n):
+    return _segments(rng, n).tolist(), _triangles(rng, n).tolist()
+
+
+def run_segment(args):
+    for s, t in zip(*args):
+        segment_intersection_2d(s[0], s[1], t[0], t[1], t[2])
+
+
+def setup_point(rng, n):
+    return _points(rng, n).tolist(), _triangles(rng, n).tolist()
+
+
+def run_point(args):
+    for p, t in zip(*args):
+        point_in_triangle(p, t[0], t[1], t[2])
+
+
+def setup_point_batch(rng, n):
+    # n points against sqrt(n) small triangles, throughput is counted in points
+    return _points(rng, n), _triangles(rng, max(int(np.sqrt(n)), 1)) * 0.2
+
+
+def run_point_batch(args):
+    point_in_triangle_batch(args[0], args[1])
+
+
+def setup_side(rng, n):
+    return _points(rng, n).tolist(), _points(rng, n).tolist(), _segments(rng, n).tolist()
+
+
+def run_side(args):
+    for p1, p2, s in zip(*args):
+        side(p1, p2, s[0], s[1])
+
+
+def setup_face_batch(rng, n):
+    return _triangles(rng, n), _triangles(rng, n)
+
+
+def run_face_batch(args):
+    face_intersection_2d_batch(args[0], args[1])
+
+
+def setup_planeline(rng, n):
+    return rng.normal(size=(n, 3)).tolist(), rng.normal(size=(n, 3)).tolist(), \
+        rng.normal(size=(n, 3)).tolist(), rng.normal(size=(n, 3)).tolist()
+
+
+def run_planeline(args):
+    for a, b, p, n in zip(*args):
+        planeline_intersection(a, b, p, n)
+
+
+def setup_planeline_batch(rng, n):
+    return rng.normal(size=(n, 3)), rng.normal(size=(n, 3)), rng.normal(size=3), rng.normal(size=3)
+
+
+def run_planeline_batch(args):
+    planeline_intersection_batch(*args)
+
+
+def setup_to_2d(rng, n):
+    basis = PlaneFrame(rng.normal(size=3), rng.normal(size=3)).basis.tolist()
+    return basis, rng.normal(size=(n, 3)).tolist()
+
+
+def run_to_2d(args):
+    s1, s2, s3 = args[0]
+    for pt in args[1]:
+        to_2d_plane(s1, s2, s3, pt)
+
+
+def setup_frame_batch(rng, n):
+    return PlaneFrame(rng.normal(size=3), rng.normal(size=3)), rng.normal(size=(n, 3))
+
+
+def run_frame_batch(args):
+    args[0].project(args[1])
+
+
+def setup_segment_triangle_3d(rng, n):
+    # n segments against sqrt(n) triangles, throughput is counted in segments
+    m = max(int(np.sqrt(n)), 1)
+    return rng.random((n, 3)), rng.random((n, 3)), rng.random((m, 3, 3))
+
+
+def run_segment_triangle_3d(args):
+    segment_triangle_intersection_batch(*args)
+
+
+# name: (setup, run, scalar)
+BENCHMARKS = {
+    "edge_intersection_2d": (setup_edge, run_edge, True),
+    "edge_intersection_2d_batch": (setup_edge_batch, run_edge_batch, False),
+    "segment_intersection_2d": (setup_segment, run_segment, True),
+    "point_in_triangle": (setup_point, run_point, True),
+    "point_in_triangle_batch": (setup_point_batch, run_point_batch, False),
+    "side": (setup_side, run_side, True),
+    "face_intersection_2d_batch": (setup_face_batch, run_face_batch, False),
+    "planeline_intersection": (setup_planeline, run_planeline, True),
+    "planeline_intersection_batch": (setup_planeline_batch, run_planeline_batch, False),
+    "to_2d_plane": (setup_to_2d, run_to_2d, True),
+    "PlaneFrame.project": (setup_frame_batch, run_frame_batch, False),
+    "segment_triangle_intersection_batch": (setup_segment_triangle_3d, run_segment_triangle_3d, False),
+}
+
+
+def measure(name, n, seed, repeat):
+    setup, run, _ = BENCHMARKS[name]
+    args = setup(np.random.default_rng(seed), n)
+
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        run(args)
+        best = min(best, time.perf_counter() - t)
+
+    tracemalloc.start()
+    run(args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"n": n, "seconds": best, "throughput": n / best if best > 0 else np.inf, "peak_bytes": peak}
+
+
+def _version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, reference):
+    # ratio of throughput new / old for sizes measured in both runs, < 1.0 is regression
+    print("\n{:<30}{:>10}{:>14}{:>14}{:>8}".format("primitive", "n", "old [1/s]", "new [1/s]", "ratio"))
+    for name, curve in results["benchmarks"].items():
+        old = {r["n"]: r for r in reference.get("benchmarks", {}).get(name, [])}
+        for r in curve:
+            if r["n"] in old:
+                ratio = r["throughput"] / old[r["n"]]["throughput"]
+                print("{:<30}{:>10}{:>14.0f}{:>14.0f}{:>8.2f}".format(name, r["n"], old[r["n"]]["throughput"],
+                                                                    r["throughput"], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark of intersection primitives")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="workload sizes of scalar primitives")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                        help="workload sizes of batched primitives")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", nargs="+", default=None, choices=sorted(BENCHMARKS), help="run only these")
+    parser.add_argument("--output", default=None, help="json file with results")
+    parser.add_argument("--compare", default=None, help="json file with reference results")
+    args = parser.parse_args()
+
+    results = {"version": _version(),
+               "date": datetime.datetime.now().isoformat(timespec="seconds"),
+               "python": platform.python_version(),
+               "numpy": np.__version__,
+               "platform": platform.platform(),
+               "seed": args.seed,
+               "benchmarks": {}}
+
+    print("{:<30}{:>10}{:>12}{:>14}{:>14}".format("primitive", "n", "time [s]", "calls [1/s]", "peak [kB]"))
+    for name in args.only or BENCHMARKS:
+        sizes = args.sizes if BENCHMARKS[name][2] else args.batch_sizes
+        curve = []
+        for n in sizes:
+            r = measure(name, n, args.seed, args.repeat)
+            curve.append(r)
+            print("{:<30}{:>10}{:>12.4f}{:>14.0f}{:>14.1f}".format(name, n, r["seconds"], r["throughput"],
+                                                                  r["peak_bytes"] / 1024.0))
+        results["benchmarks"][name] = curve
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from spatial_index import QuadTree, UniformGrid, bounding_boxes, edge_intersection_batches
+from sweep_line import sweep_intersections
+
+# broad phase with batched pair tests against sweep line
+#
+# workloads of --n short segments: random segments in unit square and segments with endpoints on integer grid
+# (many parallel, collinear, overlapping and touching pairs); grid workload is scaled by powers of two
+# (2 ** -30, 1, 2 ** 30), so coordinates stay exact
+# intersecting pairs of edge_intersection_batches() (with UniformGrid and QuadTree) are compared with pairs of
+# sweep_intersections(), number of pairs reported by only one of them has to be zero; candidate pairs of
+# QuadTree filled by single inserts (root grows) are compared with all pairs of overlapping boxes, number of
+# missing and extra pairs has to be zero too (exit status 1 otherwise); times are recorded
+#
+# usage: python benchmarks/bench_spatial_index.py [--n 2000] [--output spatial_index.json]
+
+SCALES = (-30, 0, 30)
+
+
+def pair_set(records):
+    return set(zip(records["i"].tolist(), records["j"].tolist()))
+
+
+def box_pairs(boxes):
+    # all pairs i < j of overlapping boxes (closed intervals)
+    a, b = boxes[:, np.newaxis], boxes[np.newaxis, :]
+    overlap = (a[..., 0] <= b[..., 2]) & (b[..., 0] <= a[..., 2]) & (a[..., 1] <= b[..., 3]) & (b[..., 1] <= a[..., 3])
+    i, j = np.nonzero(np.triu(overlap, 1))
+    return set(zip(i.tolist(), j.tolist()))
+
+
+def workloads(rng, n):
+    start = rng.random((n, 1, 2))
+    yield "random", np.concatenate((start, start + (rng.random((n, 1, 2)) - 0.5) * 0.1), axis=1)
+    start = rng.integers(0, max(int(np.sqrt(n)), 4), size=(n, 1, 2))
+    grid = np.concatenate((start, start + rng.integers(-3, 4, size=(n, 1, 2))), axis=1).astype(np.float64)
+    for e in SCALES:
+        yield "grid * 2 ** {}".format(e), np.ldexp(grid, e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="broad phase with batched pair tests against sweep line")
+    parser.add_argument("--n", type=int, default=2000, help="number of segments")
+    parser.add_argument("--output", default=None, help="json file with results")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = {}
+    for name, edges in workloads(rng, args.n):
+        t = time.perf_counter()
+        sweep = pair_set(sweep_intersections(edges))
+        result = {"pairs": len(sweep), "sweep": time.perf_counter() - t}
+        line = "{:<16} {:>6} pairs   sweep {:>7.4f} s".format(name, len(sweep), result["sweep"])
+        for index_name, index in (("grid", UniformGrid()), ("quadtree", QuadTree())):
+            t = time.perf_counter()
+            batches = pair_set(np.concatenate(list(edge_intersection_batches(edges, index=index))))
+            result[index_name] = time.perf_counter() - t
+            result[index_name + "_differing"] = len(batches ^ sweep)
+            line += "   {} {:>7.4f} s ({} differing)".format(index_name, result[index_name], len(batches ^ sweep))
+
+        boxes, tree = bounding_boxes(edges), QuadTree()
+        for key, box in enumerate(boxes.tolist()):
+            tree.insert(key, box)
+        candidates = set((a, b) if a < b else (b, a) for a, b in tree.candidate_pairs())
+        result["quadtree_inserts_differing"] = len(candidates ^ box_pairs(boxes))
+        line += "   single inserts: {} differing candidates".format(result["quadtree_inserts_differing"])
+        results[name] = result
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(v for r in results.values() for k, v in r.items() if k.endswith("differing")) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from collections import OrderedDict, namedtuple
+
+from edge_intersection import edge_intersection_2d
+from face_intersection import segment_intersection_2d
+from tolerance import get_tolerance
+
+# memoization of scalar primitives for repeated queries (e.g. static geometry against static geometry in every
+# frame of simulation)
+#
+# result is stored under key made of primitive keys of both operands, name of primitive and its options;
+# primitive key is
+#       (kind, id):   identifier supplied by caller (int, str, ...) with kind of primitive ("segment" or
+#                     "triangle"), cheapest, caller is responsible for invalidation when primitive with the id
+#                     changes; ids of different kinds are independent (segment 5 is not triangle 5)
+#       coordinates:  coordinates rounded to decimal places significant under absolute tolerance of current
+#                     context (exact coordinates if tolerance is exact), so primitives equal under tolerance
+#                     share results
+# tolerance of current context is part of the key, results computed under different tolerances are not mixed
+#
+# lookup by coordinates costs several microseconds (quantization and hashing of the key), it pays off for
+# expensive primitives (segment_intersection_2d ~ 500 us) but not for edge_intersection_2d (~ 3 us), which
+# should be cached by ids only (~ 2.5 us per hit)
+#
+# cache is bounded, least recently used result is evicted when maxsize is reached; invalidate() drops results
+# of given primitives (by id or by coordinates), info() returns counters in the style of functools.lru_cache
+#
+#       cache = ResultCache(maxsize=1 << 16)
+#       for frame in frames:
+#           for i, j in pairs:
+#               result = cache.segment_intersection_2d(*segments[i], *triangles[j], ids=(i, j))
+#       cache.invalidate_ids(i, kind="segment")  # segment i moved
+
+_MISSING = object()
+
+# kinds of primitives cached by id
+KINDS = ("segment", "triangle")
+
+CacheInfo = namedtuple("CacheInfo", ("hits", "misses", "evictions", "maxsize", "currsize"))
+
+
+class ResultCache(object):
+    def __init__(self, maxsize=1 << 16, decimals=None):
+        """
+        :param maxsize: int, maximal number of stored results
+        :param decimals: int, decimal places of coordinate keys, default is given by absolute tolerance
+                         of current context (see Tolerance.decimals)
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize has to be positive")
+        self.maxsize = maxsize
+        self.decimals = decimals
+        self._scales = {}
+        self._results = OrderedDict()
+        # primitive key -> set of result keys, for invalidation
+        self._owners = {}
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._results)
+
+    def info(self):
+        """
+        :rtype: CacheInfo
+        """
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._results))
+
+    def clear(self):
+        # drop all results and reset counters
+        self._results.clear()
+        self._owners.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def _scale(self, tol):
+        # coordinates are quantized to integer multiples of 10 ** -decimals, None for exact coordinates;
+        # memoized per tolerance, Tolerance.decimals is not cheap
+        try:
+            return self._scales[tol]
+        except KeyError:
+            decimals = tol.decimals if self.decimals is None else self.decimals
+            scale = self._scales[tol] = None if decimals is None else 10.0 ** decimals
+            return scale
+
+    def primitive_key(self, primitive=None, identifier=None, scale=False, kind=None):
+        """
+        :param primitive: sequence of points, e.g. [p0, p1] of segment or [t0, t1, t2] of triangle
+        :param identifier: hashable id of primitive, used instead of coordinates if given
+        :param kind: str, one of KINDS, kind of primitive given by identifier
+        :rtype: tuple
+        """
+        if identifier is not None:
+            if kind not in KINDS:
+                raise ValueError("kind of primitive has to be one of {}".format(", ".join(KINDS)))
+            return kind, identifier
+        if scale is False:
+            scale = self._scale(get_tolerance())
+        if scale is None:
+            return tuple([float(c) for point in primitive for c in point])
+        return tuple([round(c * scale) for point in primitive for c in point])
+
+    def invalidate(self, *keys):
+        """
+        drop results of given primitives, all results if no primitive is given
+
+        :param keys: primitive keys, (kind, id) for primitives cached by id or coordinates of primitive
+                     (sequence of points)
+        :return: int, number of dropped results
+        """
+        if not keys:
+            dropped = len(self._results)
+            self._results.clear()
+            self._owners.clear()
+            return dropped
+        dropped = 0
+        for key in keys:
+            if not (isinstance(key, tuple) and len(key) == 2 and key[0] in KINDS):
+                key = self.primitive_key(key)
+            for result_key in list(self._owners.get(key, ())):
+                self._drop(result_key)
+                dropped += 1
+        return dropped
+
+    def invalidate_ids(self, *ids, kind):
+        """
+        drop results of primitives cached by id
+
+        :param ids: ids of primitives
+        :param kind: str, one of KINDS, kind of primitives, e.g. "triangle" drops results of triangles with
+                     given ids but not of segments with the same ids
+        :return: int, number of dropped results
+        """
+        if not ids:
+            return 0
+        return self.invalidate(*[self.primitive_key(identifier=identifier, kind=kind) for identifier in ids])
+
+    def _drop(self, result_key):
+        del self._results[result_key]
+        for key in result_key[1:3]:
+            owners = self._owners.get(key)
+            if owners is not None:
+                owners.discard(result_key)
+                if not owners:
+                    del self._owners[key]
+
+    def _cached(self, result_key, function, args, kwargs):
+        results = self._results
+        result = results.get(result_key, _MISSING)
+        if result is not _MISSING:
+            results.move_to_end(result_key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = function(*args, **kwargs)
+        results[result_key] = result
+        for key in result_key[1:3]:
+            self._owners.setdefault(key, set()).add(result_key)
+        if len(results) > self.maxsize:
+            self._drop(next(iter(results)))
+            self.evictions += 1
+        return result
+
+    def _keys(self, first, second, ids, tol, kinds):
+        if ids is None:
+            scale = self._scale(tol)
+            return self.primitive_key(first, scale=scale), self.primitive_key(second, scale=scale)
+        return (kinds[0], ids[0]), (kinds[1], ids[1])
+
+    def edge_intersection_2d(self, pt1_xy, pt2_xy, pt3_xy, pt4_xy, ids=None, robust=False):
+        """
+        cached edge_intersection_2d()
+
+        :param ids: tuple (id of first segment, id of second segment) or None for coordinate keys
+        :rtype: EdgeResult
+        """
+        tol = get_tolerance()
+        first, second = self._keys((pt1_xy, pt2_xy), (pt3_xy, pt4_xy), ids, tol, ("segment", "segment"))
+        return self._cached(("edge", first, second, robust, tol), edge_intersection_2d,
+                            (pt1_xy, pt2_xy, pt3_xy, pt4_xy), {"robust": robust})
+
+    def segment_intersection_2d(self, p0, p1, t0, t1, t2, ids=None, robust=False):
+        """
+        cached segment_intersection_2d()
+
+        :param ids: tuple (id of segment, id of triangle) or None for coordinate keys
+        :rtype: CodeResult
+        """
+        tol = get_tolerance()
+        first, second = self._keys((p0, p1), (t0, t1, t2), ids, tol, ("segment", "triangle"))
+        return self._cached(("segment", first, second, robust, tol), segment_intersection_2d,
+                            (p0, p1, t0, t1, t2), {"robust": robust})
@@ -0,0 +1,410 @@
+import numpy as np
+
+from edge_intersection import edge_intersection_2d
+from predicates import orient2d
+from results import EdgeCode
+
+# intersection of polygons in plane (clipping) and area of intersection
+#
+# polygon is array_like of shape (N, 2) of its vertices, closing edge from last vertex to first one is implicit
+#
+# Sutherland-Hodgman (clip_convex): subject polygon is clipped by half-planes of edges of convex clip polygon
+#       one by one; vertex is kept if it is inside (orient2d against clip edge, exact), crossing point of edge
+#       and clip line is computed by edge_intersection_2d(); result is single (possibly empty) polygon
+#
+# crossings are computed by edge_intersection_2d(..., robust=True), parallel edges are decided by exact sign
+# of cross product like the inside tests; absolute tolerance of current context would make crossings of
+# nearly parallel short edges parallel (cross product is length ** 2) and results would depend on scale
+# of coordinates
+#
+# Greiner-Hormann (clip_polygons): general (concave, not self-intersecting) polygons
+#       1. crossing points of all pairs of edges (edge_intersection_2d()) are inserted into both vertex lists,
+#          ordered by parameter along edge (alpha) and linked to each other
+#       2. crossing points are marked as entry / exit alternately, starting from status of first vertex
+#          (inside / outside other polygon)
+#       3. polygons of intersection are traced from unvisited crossing point, forward along entry, backward along
+#          exit, switching to other polygon at every crossing point
+#       algorithm does not handle degenerate configurations (vertex on edge of other polygon, overlapping
+#       edges), subject is moved by tiny distance (relative to size of polygons) in such case and clipping
+#       is repeated, so error of result is of the order of that distance
+#
+# batched mode (clip_triangle_pairs): Sutherland-Hodgman for thousands of pairs of triangles at once, every
+#       polygon is stored in fixed buffer of 6 vertices (triangle clipped by 3 half-planes) with vertex count,
+#       crossing point is given by the same parameter u as in edge_intersection_2d(), computed from distances
+#       of endpoints to clip line
+
+_MAX_CLIP_VERTICES = 6
+# subject of degenerate configuration is moved by this fraction of size of polygons, at most _PERTURBATIONS times
+_PERTURBATION = 1e-9
+_PERTURBATIONS = 16
+
+
+def polygon_area(polygon):
+    """
+    signed area of polygon (shoelace formula)
+
+    :param polygon: array_like of shape (N, 2)
+    :rtype: float, positive for counterclockwise vertices
+    """
+    p = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if len(p) < 3:
+        return 0.0
+    q = np.roll(p, -1, axis=0)
+    return 0.5 * float(np.sum(p[:, 0] * q[:, 1] - q[:, 0] * p[:, 1]))
+
+
+def _zero_area(points):
+    # all vertices on one line (exact orient2d) or less than two distinct vertices
+    first = points[0]
+    other = next((p for p in points if p != first), None)
+    return other is None or all(orient2d(first, other, p) == 0 for p in points)
+
+
+def _counterclockwise(polygon):
+    p = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    return p[::-1] if polygon_area(p) < 0 else p
+
+
+def point_in_polygon(point, polygon):
+    """
+    even-odd test of point against polygon (points on boundary are not decided consistently)
+
+    :param point: [x, y]
+    :param polygon: array_like of shape (N, 2)
+    :rtype: bool
+    """
+    p = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    q = np.roll(p, -1, axis=0)
+    x, y = float(point[0]), float(point[1])
+    crossing = (p[:, 1] > y) != (q[:, 1] > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = p[:, 0] + (y - p[:, 1]) * (q[:, 0] - p[:, 0]) / (q[:, 1] - p[:, 1])
+    return bool(np.count_nonzero(crossing & (x < x_cross)) % 2)
+
+
+# Sutherland-Hodgman
+# ------------------
+def clip_convex(subject, clip):
+    """
+    intersection of polygon with convex polygon
+
+    :param subject: array_like of shape (N, 2), any simple polygon (result of concave subject may contain
+                    zero-width bridges along clip edges)
+    :param clip: array_like of shape (M, 2), convex polygon, either orientation
+    :rtype: ndarray of shape (K, 2), K = 0 if polygons do not overlap or any of them has zero area
+    """
+    output = [tuple(v) for v in np.asarray(subject, dtype=np.float64).reshape(-1, 2).tolist()]
+    clip = _counterclockwise(clip).tolist()
+    # every vertex is inside of degenerate clip edges, zero-area polygon has no inside
+    if len(output) < 3 or len(clip) < 3 or _zero_area(output) or _zero_area(clip):
+        return np.empty((0, 2), dtype=np.float64)
+    for k in range(len(clip)):
+        if not output:
+            break
+        c0, c1 = clip[k], clip[(k + 1) % len(clip)]
+        points, output = output, []
+        for i in range(len(points)):
+            current, following = points[i], points[(i + 1) % len(points)]
+            inside_current, inside_following = orient2d(c0, c1, current) >= 0, orient2d(c0, c1, following) >= 0
+            if inside_current:
+                output.append(current)
+            if inside_current != inside_following:
+                result = edge_intersection_2d(current, following, c0, c1, robust=True)
+                if result.code == EdgeCode.INTERSECTING:
+                    output.append((result.x, result.y))
+    return np.array(output, dtype=np.float64).reshape(-1, 2)
+
+
+# Greiner-Hormann
+# ---------------
+class _Vertex(object):
+    __slots__ = ("x", "y", "next", "prev", "intersect", "entry", "neighbour", "alpha", "visited")
+
+    def __init__(self, x, y, alpha=0.0, intersect=False):
+        self.x, self.y = x, y
+        self.next = self.prev = self.neighbour = None
+        self.intersect = intersect
+        self.entry = False
+        self.alpha = alpha
+        self.visited = False
+
+
+def _ring(points):
+    vertices = [_Vertex(x, y) for x, y in points]
+    for k, vertex in enumerate(vertices):
+        vertex.next, vertex.prev = vertices[(k + 1) % len(vertices)], vertices[k - 1]
+    return vertices
+
+
+def _insert(start, end, vertex):
+    # crossing point between original vertices start and end, ordered by alpha
+    current = start.next
+    while current is not end and current.alpha < vertex.alpha:
+        current = current.next
+    vertex.next, vertex.prev = current, current.prev
+    current.prev.next = vertex
+    current.prev = vertex
+
+
+def _crossings(subject, clip):
+    # crossing points (subject edge, clip edge, alpha on subject edge, alpha on clip edge, point),
+    # None if configuration is degenerate
+    found = []
+    for i in range(len(subject)):
+        s0, s1 = subject[i], subject[(i + 1) % len(subject)]
+        for j in range(len(clip)):
+            c0, c1 = clip[j], clip[(j + 1) % len(clip)]
+            result = edge_intersection_2d(s0, s1, c0, c1, robust=True)
+            if result.code == EdgeCode.OVERLAPPING:
+                return None
+            if result.code != EdgeCode.INTERSECTING:
+                continue
+            # endpoint of one edge on the other edge
+            if orient2d(c0, c1, s0) == 0 or orient2d(c0, c1, s1) == 0 or orient2d(s0, s1, c0) == 0 or \
+                    orient2d(s0, s1, c1) == 0:
+                if result.in_segment or _touches(s0, s1, c0, c1):
+                    return None
+                continue
+            if not result.in_segment:
+                continue
+            found.append((i, j, _alpha(s0, s1, result), _alpha(c0, c1, result), (result.x, result.y)))
+    return found
+
+
+def _alpha(a, b, result):
+    # parameter of crossing point along edge ab
+    d = (b[0] - a[0], b[1] - a[1])
+    return ((result.x - a[0]) * d[0] + (result.y - a[1]) * d[1]) / (d[0] * d[0] + d[1] * d[1])
+
+
+def _touches(s0, s1, c0, c1):
+    # endpoint lies on the other segment (not only on its line)
+    def on(p, a, b):
+        return orient2d(a, b, p) == 0 and min(a[0], b[0]) <= p[0] <= max(a[0], b[0]) and \
+            min(a[1], b[1]) <= p[1] <= max(a[1], b[1])
+    return on(s0, c0, c1) or on(s1, c0, c1) or on(c0, s0, s1) or on(c1, s0, s1)
+
+
+def _scale(points):
+    # size of polygons, distances of perturbation are relative to it
+    scale = float(np.ptp(np.asarray(points, dtype=np.float64).reshape(-1, 2), axis=0).max())
+    return scale if scale > 0 else 1.0
+
+
+def _perturbed(subject, clip, attempt):
+    # subject moved by tiny distance, every attempt moves it further in different direction
+    scale = _scale(np.concatenate((subject, clip)))
+    angle = 0.5 + 2.399963 * attempt
+    shift = _PERTURBATION * scale * (attempt + 1) * np.array([np.cos(angle), np.sin(angle)])
+    return subject + shift
+
+
+def clip_polygons(subject, clip):
+    """
+    intersection of two simple polygons (Greiner-Hormann)
+
+    :param subject: array_like of shape (N, 2)
+    :param clip: array_like of shape (M, 2)
+    :rtype: list of ndarray of shape (K, 2), counterclockwise polygons of intersection (empty list if polygons
+            do not overlap or any of them has zero area)
+    """
+    subject = _counterclockwise(subject).tolist()
+    clip = _counterclockwise(clip).tolist()
+    # zero-area polygon has no inside, its edges overlap each other and no perturbation resolves them
+    if len(subject) < 3 or len(clip) < 3 or _zero_area(subject) or _zero_area(clip):
+        return []
+
+    crossings = _crossings(subject, clip)
+    attempt = 0
+    while crossings is None and attempt < _PERTURBATIONS:
+        moved = _perturbed(np.array(subject), np.array(clip), attempt).tolist()
+        crossings = _crossings(moved, clip)
+        attempt += 1
+        if crossings is not None:
+            subject = moved
+    if crossings is None:
+        raise ValueError("degenerate configuration of polygons could not be resolved")
+    # zero-area pieces of touching polygons become slivers of width of perturbation
+    scale = _scale(subject + clip)
+    sliver = 4.0 * _PERTURBATION * attempt * scale * scale
+
+    if not crossings:
+        # one polygon inside the other or disjoint polygons
+        if _inside(subject, clip):
+            return [np.array(subject)]
+        if _inside(clip, subject):
+            return [np.array(clip)]
+        return []
+
+    s_ring, c_ring = _ring(subject), _ring(clip)
+    for i, j, alpha_s, alpha_c, (x, y) in crossings:
+        vs, vc = _Vertex(x, y, alpha_s, True), _Vertex(x, y, alpha_c, True)
+        vs.neighbour, vc.neighbour = vc, vs
+        _insert(s_ring[i], s_ring[(i + 1) % len(s_ring)], vs)
+        _insert(c_ring[j], c_ring[(j + 1) % len(c_ring)], vc)
+
+    for ring, other in ((s_ring, clip), (c_ring, subject)):
+        entry = not point_in_polygon((ring[0].x, ring[0].y), other)
+        vertex = ring[0]
+        while True:
+            if vertex.intersect:
+                vertex.entry = entry
+                entry = not entry
+            vertex = vertex.next
+            if vertex is ring[0]:
+                break
+
+    polygons = []
+    start = s_ring[0]
+    while True:
+        # first unvisited crossing point of subject
+        vertex = start
+        while not (vertex.intersect and not vertex.visited):
+            vertex = vertex.next
+            if vertex is start:
+                break
+        if not (vertex.intersect and not vertex.visited):
+            break
+
+        points = [(vertex.x, vertex.y)]
+        current = vertex
+        while True:
+            current.visited = current.neighbour.visited = True
+            forward = current.entry
+            while True:
+                current = current.next if forward else current.prev
+                points.append((current.x, current.y))
+                if current.intersect:
+                    break
+            current.visited = True
+            current = current.neighbour
+            if current.visited:
+                break
+        if points[-1] == points[0]:
+            points.pop()
+        polygon = _counterclockwise(points)
+        if len(polygon) >= 3 and polygon_area(polygon) > sliver:
+            polygons.append(polygon)
+    return polygons
+
+
+def _inside(inner, outer):
+    # no crossing edges are assumed, so inner is inside if any of its vertices is
+    return any(point_in_polygon(p, outer) for p in inner[:1])
+
+
+def intersection_area(subject, clip, convex=False):
+    """
+    area of intersection of two polygons
+
+    :param subject: array_like of shape (N, 2)
+    :param clip: array_like of shape (M, 2)
+    :param convex: bool, clip polygon is convex, Sutherland-Hodgman is used instead of Greiner-Hormann
+    :rtype: float
+    """
+    if convex:
+        return abs(polygon_area(clip_convex(subject, clip)))
+    return sum(abs(polygon_area(p)) for p in clip_polygons(subject, clip))
+
+
+# batched Sutherland-Hodgman of triangle pairs
+# --------------------------------------------
+def _clip_half_plane(points, count, c0, c1):
+    # clip polygons (K, M, 2) with count vertices by half-planes left of lines c0 c1 (K, 2)
+    n, m = points.shape[0], points.shape[1]
+    slots = np.arange(m)
+    valid = slots < count[:, np.newaxis]
+    following = np.where(slots + 1 < count[:, np.newaxis], slots + 1, 0)
+    rows = np.arange(n)[:, np.newaxis]
+
+    # distance to clip line scaled by its length, positive inside
+    d = c1 - c0
+    side = d[:, np.newaxis, 0] * (points[..., 1] - c0[:, np.newaxis, 1]) - \
+        d[:, np.newaxis, 1] * (points[..., 0] - c0[:, np.newaxis, 0])
+    side_following = side[rows, following]
+    inside, inside_following = side >= 0, side_following >= 0
+
+    keep = valid & inside
+    cross = valid & (inside != inside_following)
+    # padding slots and vertices on clip line give nan / inf, they are never emitted
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = side / (side - side_following)
+        crossing = points + u[..., np.newaxis] * (points[rows, following] - points)
+
+    emitted = keep.astype(np.int64) + cross
+    position = np.cumsum(emitted, axis=1) - emitted
+    out = np.full((n, m + 1, 2), np.nan)
+    r, k = np.nonzero(keep)
+    out[r, position[r, k]] = points[r, k]
+    r, k = np.nonzero(cross)
+    out[r, position[r, k] + keep[r, k]] = crossing[r, k]
+    return out, emitted.sum(axis=1)
+
+
+def clip_triangle_pairs(triangles1, triangles2):
+    """
+    batched intersection of triangle pairs
+
+    :param triangles1: array_like of shape (K, 3, 2), subject triangles, either orientation
+    :param triangles2: array_like of shape (K, 3, 2), clip triangles, either orientation
+    :return: tuple (polygons, counts), polygons is ndarray of shape (K, 6, 2), first counts[k] vertices of
+             polygon k are valid (counterclockwise), the rest is numpy.nan; counts is ndarray of int of shape (K, )
+    """
+    t1 = np.asarray(triangles1, dtype=np.float64)[..., :2].reshape(-1, 3, 2)
+    t2 = np.asarray(triangles2, dtype=np.float64)[..., :2].reshape(-1, 3, 2)
+    if t1.shape != t2.shape:
+        raise ValueError("triangles1 and triangles2 have to contain the same number of triangles")
+    t1, t2 = _counterclockwise_batch(t1), _counterclockwise_batch(t2)
+
+    points, count = t1, np.full(len(t1), 3, dtype=np.int64)
+    # degenerate triangle has no inside
+    count[(triangle_areas(t1) == 0) | (triangle_areas(t2) == 0)] = 0
+    for k in range(3):
+        points, count = _clip_half_plane(points, count, t2[:, k], t2[:, (k + 1) % 3])
+    points = points[:, :_MAX_CLIP_VERTICES]
+    points[np.arange(_MAX_CLIP_VERTICES) >= count[:, np.newaxis]] = np.nan
+    return points, count
+
+
+def triangle_areas(triangles):
+    """
+    :param triangles: array_like of shape (K, 3, 2)
+    :rtype: ndarray of shape (K, ), signed areas (positive for counterclockwise triangles)
+    """
+    t = np.asarray(triangles, dtype=np.float64)
+    a, b = t[:, 1] - t[:, 0], t[:, 2] - t[:, 0]
+    return 0.5 * (a[:, 0] * b[:, 1] - a[:, 1] * b[:, 0])
+
+
+def _counterclockwise_batch(triangles):
+    flip = triangle_areas(triangles) < 0
+    triangles = triangles.copy()
+    triangles[flip] = triangles[flip][:, ::-1]
+    return triangles
+
+
+def polygon_areas(polygons, counts):
+    """
+    signed areas of batch of polygons stored in fixed buffers
+
+    :param polygons: ndarray of shape (K, M, 2)
+    :param counts: ndarray of int of shape (K, ), number of valid vertices of every polygon
+    :rtype: ndarray of shape (K, )
+    """
+    slots = np.arange(polygons.shape[1])
+    following = np.where(slots + 1 < counts[:, np.newaxis], slots + 1, 0)
+    q = polygons[np.arange(len(polygons))[:, np.newaxis], following]
+    terms = polygons[..., 0] * q[..., 1] - q[..., 0] * polygons[..., 1]
+    return 0.5 * np.where(slots < counts[:, np.newaxis], terms, 0.0).sum(axis=1)
+
+
+def triangle_intersection_areas(triangles1, triangles2):
+    """
+    batched area of intersection of triangle pairs
+
+    :param triangles1: array_like of shape (K, 3, 2)
+    :param triangles2: array_like of shape (K, 3, 2)
+    :rtype: ndarray of shape (K, )
+    """
+    polygons, counts = clip_triangle_pairs(triangles1, triangles2)
+    return polygon_areas(polygons, counts)
@@ -1,9 +1,14 @@
-import matplotlib.pyplot as plt
 import numpy as np
 
+from predicates import cross, orient2d, cross_batch, orient2d_batch
+from results import EdgeCode, EdgeResult, EDGE_INTERSECTION_DTYPE
+from tolerance import get_tolerance
 
-def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
-    # return: tuple
+
+def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy, robust=False):
+    # robust: if True, parallel and overlapping segments are decided by exact predicates (predicates.py)
+    #         instead of tolerance of current context (tolerance.py)
+    # return: EdgeResult, tuple compatible
     #       0: intersection_status:
     #               False: parallel
     #               True:  intersection
@@ -14,6 +19,7 @@ def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
     #       2: intersection point x value if exists, if not numpy.nan
     #       3: intersection point y value if exists, if not numpy.nan
     #       4: distance if parallel
+    #       5: message, name of EdgeCode (attribute code)
     # defs:
     #       x1, y1 = pt1_xy + u * (pt2_xy - pt1_xy) = pt1_xy + u * dp1
     #       x2, y2 = pt3_xy + v * (pt4_xy - pt3_xy) = pt3_xy + v * dp2
@@ -44,11 +50,18 @@ def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
     dp2_x, dp2_y = pt4_x - pt3_x, pt4_y - pt3_y
     # parameter for pt3 and pt4
 
-    d = (dp1_x * dp2_y) - (dp1_y * dp2_x)
-
-    # test if d < 1e-10
-    # testing on zero, but precission should cause a problem
-    if abs(d) < 1e-10:
+    tol = get_tolerance()
+    if robust:
+        # d with exact sign, zero only for exactly parallel lines
+        d = cross(pt1_xy, pt2_xy, pt3_xy, pt4_xy)
+        parallel = d == 0
+    else:
+        d = (dp1_x * dp2_y) - (dp1_y * dp2_x)
+        # test if |d| <= tolerance (absolute 1e-10 by default), relative to lengths of segments if scale-aware
+        # testing on zero, but precission should cause a problem
+        parallel = tol.zero(d, (np.hypot(dp1_x, dp1_y) * np.hypot(dp2_x, dp2_y)) if tol.scale_aware else None)
+
+    if parallel:
         # test distance between lines
         # if general form is known (ax + by + c1 = 0 and ax + by + c2 = 0),
         # d = abs(c1 - c2) / sqrt(a**2 + b**2)
@@ -72,8 +85,15 @@ def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
 
         d = abs(c2 - c1) / (np.sqrt(a1 ** 2 + b1 ** 2))
 
-        int_segment, msg = (True, "OVERLAPPING") if d == 0 else (False, "PARALLEL")
-        return int_segment, np.nan, np.nan, np.nan, d, msg
+        if robust:
+            # parallel lines are identical if endpoint of one segment lies on line of the other one
+            overlapping = orient2d(pt1_xy, pt2_xy, pt3_xy) == 0 and orient2d(pt3_xy, pt4_xy, pt1_xy) == 0
+        else:
+            # distance relative to magnitude of coordinates if scale-aware
+            overlapping = tol.zero(d, max(abs(pt1_x), abs(pt1_y), abs(pt3_x), abs(pt3_y)) if tol.scale_aware
+                                   else None)
+        int_segment, code = (True, EdgeCode.OVERLAPPING) if overlapping else (False, EdgeCode.PARALLEL)
+        return EdgeResult(int_segment, np.nan, np.nan, np.nan, d, code)
 
 
     # +0 because of negative zero (-0.0 is incorrect) formatting on output
@@ -82,7 +102,82 @@ def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
 
     int_x, int_y = pt1_x + (u * dp1_x), pt1_y + (u * dp1_y)
     int_segment = True if 0.0 <= u <= 1.0 and 0.0 <= v <= 1.0 else False
-    return True, int_segment, int_x, int_y, np.nan, "INTERSECTING"
+    return EdgeResult(True, int_segment, int_x, int_y, np.nan, EdgeCode.INTERSECTING)
+
+
+def _edge_intersection_kernel(pt1, pt2, pt3, pt4, robust=False):
+    # vectorized body of edge_intersection_2d(), every argument is array of shape (..., 2) and arrays
+    # have to be broadcastable against each other; arithmetic is done in the same order as in the scalar
+    # function, so results are bit to bit identical
+    pt1_x, pt1_y, pt2_x, pt2_y = pt1[..., 0], pt1[..., 1], pt2[..., 0], pt2[..., 1]
+    pt3_x, pt3_y, pt4_x, pt4_y = pt3[..., 0], pt3[..., 1], pt4[..., 0], pt4[..., 1]
+    dp1_x, dp1_y = pt2_x - pt1_x, pt2_y - pt1_y
+    dp2_x, dp2_y = pt4_x - pt3_x, pt4_y - pt3_y
+
+    tol = get_tolerance()
+    if robust:
+        d = cross_batch(pt1, pt2, pt3, pt4)
+        parallel = d == 0
+    else:
+        d = (dp1_x * dp2_y) - (dp1_y * dp2_x)
+        parallel = tol.zero(d, (np.hypot(dp1_x, dp1_y) * np.hypot(dp2_x, dp2_y)) if tol.scale_aware else None)
+
+    result = np.empty(d.shape, dtype=EDGE_INTERSECTION_DTYPE)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # parallel lines, distance of general forms (see edge_intersection_2d())
+        a1, b1, c1 = -dp1_y, dp1_x, (dp1_y * pt1_x) - (dp1_x * pt1_y)
+        b2, c2 = dp2_x, (dp2_y * pt3_x) - (dp2_x * pt3_y)
+        c2 = np.where((b1 >= 0) == (b2 >= 0), c2, -c2)
+        distance = np.abs(c2 - c1) / np.sqrt(a1 ** 2 + b1 ** 2)
+        if robust:
+            overlapping = parallel & (orient2d_batch(pt1, pt2, pt3) == 0) & (orient2d_batch(pt3, pt4, pt1) == 0)
+        else:
+            overlapping = tol.zero(distance, np.maximum(np.maximum(np.abs(pt1_x), np.abs(pt1_y)),
+                                                        np.maximum(np.abs(pt3_x), np.abs(pt3_y)))
+                                   if tol.scale_aware else None)
+
+        # intersecting lines, d of parallel pairs is replaced by 1.0 to avoid division by zero (their u, v are unused)
+        d = np.where(parallel, 1.0, d)
+        u = ((((pt1_y - pt3_y) * dp2_x) - (dp2_y * (pt1_x - pt3_x))) / d) + 0
+        v = ((((pt1_y - pt3_y) * dp1_x) - (dp1_y * (pt1_x - pt3_x))) / d) + 0
+
+    in_segment = (0.0 <= u) & (u <= 1.0) & (0.0 <= v) & (v <= 1.0)
+
+    result["status"] = ~parallel | overlapping
+    result["in_segment"] = np.where(parallel, np.nan, in_segment)
+    result["x"] = np.where(parallel, np.nan, pt1_x + (u * dp1_x))
+    result["y"] = np.where(parallel, np.nan, pt1_y + (u * dp1_y))
+    result["distance"] = np.where(parallel, distance, np.nan)
+    result["code"] = np.where(parallel, np.where(overlapping, EdgeCode.OVERLAPPING, EdgeCode.PARALLEL),
+                              EdgeCode.INTERSECTING)
+    return result
+
+
+def edge_intersection_2d_batch(edges1, edges2, all_pairs=True, robust=False):
+    """
+    batched edge_intersection_2d()
+
+    :param edges1: array_like of shape (N, 2, 2), segments defined by [[x1, y1], [x2, y2]]
+    :param edges2: array_like of shape (M, 2, 2)
+    :param all_pairs: bool, if True, every segment of edges1 is tested against every segment of edges2 and
+                      result has shape (N, M), otherwise segments are paired element-wise (N == M) and result
+                      has shape (N, )
+    :param robust: bool, parallel and overlapping segments are decided by exact predicates
+    :rtype: ndarray of EDGE_INTERSECTION_DTYPE
+    """
+    edges1, edges2 = np.asarray(edges1, dtype=np.float64), np.asarray(edges2, dtype=np.float64)
+    if edges1.ndim != 3 or edges1.shape[1:] != (2, 2) or edges2.ndim != 3 or edges2.shape[1:] != (2, 2):
+        raise ValueError("edges have to be arrays of shape (N, 2, 2)")
+
+    if all_pairs:
+        edges1, edges2 = edges1[:, np.newaxis], edges2[np.newaxis, :]
+    elif len(edges1) != len(edges2):
+        raise ValueError("element-wise mode requires the same number of edges, "
+                         "got {} and {}".format(len(edges1), len(edges2)))
+
+    return _edge_intersection_kernel(edges1[..., 0, :], edges1[..., 1, :], edges2[..., 0, :], edges2[..., 1, :],
+                                     robust)
 
 
 # interception example in segment
@@ -113,6 +208,7 @@ def edge_intersection_2d(pt1_xy, pt2_xy, pt3_xy, pt4_xy):
 # pt1, pt2, pt3, pt4 = [1.0, 0.5], [0.0, 1.0], [0.0, 0.5], [0.0, 0.0]
 # print(edge_intersection_2d(pt1, pt2, pt3, pt4))
 
+# import matplotlib.pyplot as plt
 # fig = plt.figure()
 # ax = fig.add_subplot(111, aspect="auto")
 # ax.scatter([pt1[0], pt2[0]], [pt1[1], pt2[1]], color="r", s=200)
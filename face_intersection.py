@@ -1,5 +1,8 @@
 import numpy as np
-import Plot as Plt
+
+from predicates import orient2d, orient2d_batch
+from results import PointCode, SegmentCode, FaceCode, POINT_TRIANGLE_PAIR_DTYPE, code_result
+from tolerance import get_tolerance
 
 try:
     from edge_intersection import edge_intersection_2d as ei
@@ -42,119 +45,340 @@ except:
 # and have the actual point-in-triangle function call this for each edge.
 
 # /* Check whether p1 and p2 lie on the same side of line ab */
-def same_side(p1, p2, a, b):
-    return True if side(p1, p2, a, b) >= 0 else False
+def same_side(p1, p2, a, b, robust=False):
+    return True if side(p1, p2, a, b, robust) >= 0 else False
 
 
-def point_in_triangle(p, a, b, c):
-    return True if same_side(p, a, b, c) and same_side(p, b, a, c) and same_side(p, c, a, b) else False
+def point_in_triangle(p, a, b, c, robust=False):
+    return True if same_side(p, a, b, c, robust) and same_side(p, b, a, c, robust) and \
+        same_side(p, c, a, b, robust) else False
 
 
-def side(p1, p2, a, b):
+def side(p1, p2, a, b, robust=False):
     # z1 = (b[0] - a[0]) * (p1[1] - a[1]) - (p1[0] - a[0]) * (b[1] - a[1])
     # z2 = (b[0] - a[0]) * (p2[1] - a[1]) - (p2[0] - a[0]) * (b[1] - a[1])
     # return z1 * z2
+    # robust: if True, exact signs of z1, z2 are taken from predicates.orient2d() and their product (-1, 0, 1)
+    #         is returned; callers use only sign of the result
+    if robust:
+        return orient2d(a, b, p1) * orient2d(a, b, p2)
     p1, p2, a, b = np.array(p1), np.array(p2), np.array(a), np.array(b)
     cp1 = np.cross(b - a, p1 - a)
     cp2 = np.cross(b - a, p2 - a)
     return np.dot(cp1, cp2)
 
 
+# batched point in triangle test via barycentric coordinates
+#
+# point p = a + l1 * (b - a) + l2 * (c - a), in matrix form p - a = M [l1, l2], where M = [b - a, c - a] (columns)
+# basis of every triangle is precomputed once as (a, M^-1), then for each point
+#       [l1, l2] = M^-1 (p - a), l0 = 1 - l1 - l2
+# point is inside if all l > 0, on edge if all l >= 0 and some of them is 0 (with tolerance eps),
+# degenerated triangles (det(M) == 0) contain no points
+#
+# points are not tested against all triangles, triangles are registered in uniform grid (by bounding box) and
+# point is tested only against triangles of its cell; points are processed in chunks, so memory stays bounded,
+# and only pairs of points lying in triangles are returned (no dense array of points x triangles)
+def barycentric_basis(triangles):
+    """
+    :param triangles: array_like of shape (T, 3, 2)
+    :return: tuple (origin (T, 2), inverse matrix (T, 2, 2), valid (T, ))
+    """
+    triangles = np.asarray(triangles, dtype=np.float64)
+    origin = triangles[:, 0]
+    u, v = triangles[:, 1] - origin, triangles[:, 2] - origin
+    det = (u[:, 0] * v[:, 1]) - (u[:, 1] * v[:, 0])
+    valid = det != 0
+    det = np.where(valid, det, 1.0)
+    inverse = np.stack((np.stack((v[:, 1], -v[:, 0]), axis=-1),
+                        np.stack((-u[:, 1], u[:, 0]), axis=-1)), axis=1) / det[:, np.newaxis, np.newaxis]
+    return origin, inverse, valid
+
+
+def _barycentric_code(points, origin, inverse, eps):
+    # element-wise PointCode of points (K, 2) against bases (K, 2), (K, 2, 2)
+    d = points - origin
+    l1 = (inverse[:, 0, 0] * d[:, 0]) + (inverse[:, 0, 1] * d[:, 1])
+    l2 = (inverse[:, 1, 0] * d[:, 0]) + (inverse[:, 1, 1] * d[:, 1])
+    lowest = np.minimum(np.minimum(1.0 - l1 - l2, l1), l2)
+
+    code = np.full(lowest.shape, PointCode.OUTSIDE, dtype=np.int8)
+    code[lowest >= -eps] = PointCode.EDGE
+    code[lowest > eps] = PointCode.INSIDE
+    return code
+
+
+class _TriangleGrid(object):
+    # uniform grid over valid triangles in compressed form (cell -> triangles given by offsets)
+    def __init__(self, triangles, valid):
+        index = np.flatnonzero(valid)
+        tri_min, tri_max = triangles[index].min(axis=1), triangles[index].max(axis=1)
+        self.lo = tri_min.min(axis=0) if len(index) else np.zeros(2)
+        extent = (tri_max.max(axis=0) - self.lo) if len(index) else np.zeros(2)
+        # cell about the mean size of triangle, with at most ~4 cells per triangle
+        size = (tri_max - tri_min).max(axis=1).mean() if len(index) else 1.0
+        size = max(size, np.sqrt(extent[0] * extent[1] / (4.0 * max(len(index), 1))), 1e-300)
+        self.size = size
+        self.shape = np.maximum(np.ceil(extent / size).astype(np.int64), 1)
+
+        cmin = self.cell(tri_min)
+        cmax = self.cell(tri_max)
+        nx, ny = cmax[:, 0] - cmin[:, 0] + 1, cmax[:, 1] - cmin[:, 1] + 1
+        count = nx * ny
+        tri = np.repeat(index, count)
+        local = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        cx = np.repeat(cmin[:, 0], count) + local % np.repeat(nx, count)
+        cy = np.repeat(cmin[:, 1], count) + local // np.repeat(nx, count)
+        cell = cy * self.shape[0] + cx
+
+        order = np.argsort(cell, kind="stable")
+        self.triangles = tri[order]
+        self.offsets = np.searchsorted(cell[order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def cell(self, points):
+        return np.clip(((points - self.lo) // self.size).astype(np.int64), 0, self.shape - 1)
+
+    def pairs(self, points):
+        # candidate pairs (point index, triangle index), points out of grid have no candidates
+        inside = np.all((points >= self.lo) & (points <= self.lo + self.shape * self.size), axis=1)
+        c = self.cell(points)
+        cell = c[:, 1] * self.shape[0] + c[:, 0]
+        start, count = self.offsets[cell], np.where(inside, self.offsets[cell + 1] - self.offsets[cell], 0)
+        point = np.repeat(np.arange(len(points)), count)
+        local = np.arange(len(point)) - np.repeat(np.cumsum(count) - count, count)
+        return point, self.triangles[np.repeat(start, count) + local]
+
+
+def _point_chunks(n_points, chunk_size):
+    for start in range(0, n_points, chunk_size):
+        yield slice(start, min(start + chunk_size, n_points))
+
+
+def point_in_triangle_batch(points, triangles, eps=None, chunk_size=1 << 16):
+    """
+    classification of points against triangles, pairs of point and triangle containing it
+
+    :param points: array_like of shape (P, 2)
+    :param triangles: array_like of shape (T, 3, 2)
+    :param eps: float, tolerance of barycentric coordinates for points on edge, default is relative tolerance
+                of current context
+    :param chunk_size: int, number of points processed at once
+    :rtype: ndarray of POINT_TRIANGLE_PAIR_DTYPE sorted by point and triangle index, (i point, j triangle,
+            code INSIDE or EDGE), pairs of point outside of triangle are not included
+    """
+    points, triangles = np.asarray(points, dtype=np.float64).reshape(-1, 2), np.asarray(triangles, dtype=np.float64)
+    eps = get_tolerance().relative if eps is None else eps
+    origin, inverse, valid = barycentric_basis(triangles)
+    grid = _TriangleGrid(triangles, valid)
+    chunks = []
+    for chunk in _point_chunks(len(points), chunk_size):
+        point, tri = grid.pairs(points[chunk])
+        code = _barycentric_code(points[chunk][point], origin[tri], inverse[tri], eps)
+        hit = np.flatnonzero(code != PointCode.OUTSIDE)
+        records = np.empty(len(hit), dtype=POINT_TRIANGLE_PAIR_DTYPE)
+        records["i"], records["j"], records["code"] = point[hit] + chunk.start, tri[hit], code[hit]
+        chunks.append(records[np.lexsort((records["j"], records["i"]))])
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=POINT_TRIANGLE_PAIR_DTYPE)
+
+
+def point_triangle_owner(points, triangles, eps=None, chunk_size=1 << 16):
+    """
+    index of the first triangle containing point (inside or on edge)
+
+    :param points: array_like of shape (P, 2)
+    :param triangles: array_like of shape (T, 3, 2)
+    :param eps: float, tolerance of barycentric coordinates for points on edge, default is relative tolerance
+                of current context
+    :param chunk_size: int, number of points processed at once
+    :rtype: ndarray of int64 of shape (P, ), -1 for points outside of all triangles
+    """
+    points, triangles = np.asarray(points, dtype=np.float64).reshape(-1, 2), np.asarray(triangles, dtype=np.float64)
+    eps = get_tolerance().relative if eps is None else eps
+    origin, inverse, valid = barycentric_basis(triangles)
+    grid = _TriangleGrid(triangles, valid)
+    owner = np.full(len(points), -1, dtype=np.int64)
+    for chunk in _point_chunks(len(points), chunk_size):
+        point, tri = grid.pairs(points[chunk])
+        hit = _barycentric_code(points[chunk][point], origin[tri], inverse[tri], eps) != PointCode.OUTSIDE
+        point, tri = point[hit], tri[hit]
+        # the first (lowest) triangle index wins
+        first = np.full(chunk.stop - chunk.start, len(triangles), dtype=np.int64)
+        np.minimum.at(first, point, tri)
+        owner[chunk] = np.where(first < len(triangles), first, -1)
+    return owner
+
+
 # check whether segment p0p1 intersects with triangle t0 t1 t2
-def segment_intersection_2d(p0, p1, t0, t1, t2):
+# robust: if True, side() uses exact orientation predicates
+# return: CodeResult of SegmentCode, tuple compatible (code, message)
+def segment_intersection_2d(p0, p1, t0, t1, t2, robust=False):
     # check whether segment is outside one of the three half-planes delimited by the triangle
-    f1, f2, f3 = side(p0, t2, t0, t1), side(p1, t2, t0, t1), side(p0, t0, t1, t2)
-    f4, f5, f6 = side(p1, t0, t1, t2), side(p0, t1, t2, t0), side(p1, t1, t2, t0)
+    f1, f2, f3 = side(p0, t2, t0, t1, robust), side(p1, t2, t0, t1, robust), side(p0, t0, t1, t2, robust)
+    f4, f5, f6 = side(p1, t0, t1, t2, robust), side(p0, t1, t2, t0, robust), side(p1, t1, t2, t0, robust)
 
     # check whether triangle is totally inside one of the two half-planes delimited by the segment
-    f7, f8 = side(t0, t1, p0, p1), side(t1, t2, p0, p1)
+    f7, f8 = side(t0, t1, p0, p1, robust), side(t1, t2, p0, p1, robust)
     # print(f1, f2, f3, f4, f5, f6, f7, f8)
 
     # if segment is strictly outside triangle, or triangle is strictly apart from the line, we're not intersecting
     if (f1 < 0 and f2 < 0) or (f3 < 0 and f4 < 0) or (f5 < 0 and f6 < 0) or (f7 > 0 and f8 > 0):
-        return 0, "NOT_INTERSECTING"
+        return code_result(SegmentCode.NOT_INTERSECTING)
 
     # if segment is aligned with one of the edges, we're overlapping
     if (f1 == 0 and f2 == 0) or (f3 == 0 and f4 == 0) or (f5 == 0 and f6 == 0):
-        return 2, "OVERLAPPING"
+        return code_result(SegmentCode.OVERLAPPING)
 
     # if segment is outside but not strictly (also ==), or triangle is apart but not strictly, we're touching
     if (f1 <= 0 and f2 <= 0) or (f3 <= 0 and f4 <= 0) or (f5 <= 0 and f6 <= 0) or (f7 >= 0 and f8 >= 0):
-        return -1, "TOUCHING"
+        return code_result(SegmentCode.TOUCHING)
 
     # if both segment points are strictly inside the triangle, we are not intersecting either
     if f1 > 0 and f2 > 0 and f3 > 0 and f4 > 0 and f5 > 0 and f6 > 0:
-        return 0, "NOT_INTERSECTING"
+        return code_result(SegmentCode.NOT_INTERSECTING)
 
     # otherwise we're intersecting with at least one edge
-    return 1, "INTERSECTING"
-
-# !!!!!!!!!!!!!!!!!!!!!!! NOT WORKING PROPERLY !!!!!!!!!!!!!!!!!!!!!
-# !!!!!!!!!!!!!!!!!!!!!!! USE MY separating_axis_theorem code !!!!!!
-# def face_intersection_2d(f0, f1):
-#     # test each side (face segment) on intersection
-#     edge0 = segment_intersection_2d(p0=f0[0], p1=f0[1], t0=f1[0], t1=f1[1], t2=f1[2])
-#     edge1 = segment_intersection_2d(p0=f0[1], p1=f0[2], t0=f1[0], t1=f1[1], t2=f1[2])
-#     edge2 = segment_intersection_2d(p0=f0[2], p1=f0[0], t0=f1[0], t1=f1[1], t2=f1[2])
-#     # print(edge0, edge1, edge2)
-#
-#     # if segments are outside of triangle
-#     if edge0[0] == 0 and edge1[0] == 0 and edge2[0] == 0:
-#         # test if triangle is not inside of other because if function segment_intersection_2d() return 0
-#         # because edge is not intersection triangle, but it is inside
-#         face = [f0, f1]
-#         for idx in range(-1, 1):
-#             f, inside = face[idx], 0
-#             for vertice in f:
-#                 inside += 1 if point_in_triangle(vertice, face[idx + 1][0], face[idx + 1][1], face[idx + 1][2]) else 0
-#             if inside == 3:
-#                 return 1, "INTERSECTING"
-#         return 0, "NOT_INTERSECTING"
-#
-#     # if one edge is overllaping
-#     if (edge0[0] == 2 and edge1[0] == -1 and edge2[0] == 2) or (
-#                         edge0[0] == 2 and edge1[0] == 2 and edge2[0] == -1) or (
-#                         edge0[0] == -1 and edge1[0] == 2 and edge2[0] == 2):
-#
-#         intersection = 0
-#         for i in range(-1, 2):
-#             for j in range(-1, 2):
-#                 edge_intersection = ei(f0[i], f0[i + 1], f1[j], f1[j + 1])[1]
-#                 if edge_intersection is True:
-#                     intersection += 1
-#         if intersection < 6:
-#             return 2, "EDGE_OVERLAPPING"
-#
-#     if (edge0[0] == -1 and edge1[0] == 2 and edge2[0] == -1) or (
-#                         edge0[0] == -1 and edge1[0] == -1 and edge2[0] == 2) or (
-#                         edge0[0] == 2 and edge1[0] == -1 and edge2[0] == -1):
-#
-#         intersection = 0
-#         for i in range(-1, 2):
-#             for j in range(-1, 2):
-#                 edge_intersection = ei(f0[i], f0[i + 1], f1[j], f1[j + 1])[1]
-#                 if edge_intersection is True:
-#                     intersection += 1
-#
-#         if intersection >= 6:
-#             return 1, "INTERSECTING"
-#
-#         return 2, "EDGE_OVERLAPPING"
-#
-#     if ((edge0[0] == -1 and edge1[0] == 0 and edge2[0] == 2) or (
-#                         edge0[0] == -1 and edge1[0] == 2 and edge2[0] == 0) or (
-#                         edge0[0] == 0 and edge1[0] == -1 and edge2[0] == 2) or (
-#                         edge0[0] == 0 and edge1[0] == 2 and edge2[0] == -1) or (
-#                         edge0[0] == 2 and edge1[0] == -1 and edge2[0] == 0) or (
-#                         edge0[0] == 2 and edge1[0] == 0 and edge2[0] == -1)) or (
+    return code_result(SegmentCode.INTERSECTING)
+
+
+def _side_z(p, a, b):
+    # z component of cross product (b - a) x (p - a), arrays of shape (K, 2)
+    return ((b[:, 0] - a[:, 0]) * (p[:, 1] - a[:, 1])) - ((b[:, 1] - a[:, 1]) * (p[:, 0] - a[:, 0]))
+
+
+def segment_intersection_2d_batch(segments, triangles, robust=False):
+    """
+    element-wise segment_intersection_2d() of segment k with triangle k, same decisions as scalar function
+
+    :param segments: array_like of shape (K, 2, 2)
+    :param triangles: array_like of shape (K, 3, 2)
+    :param robust: bool, signs of sides are taken from exact orientation predicates
+    :rtype: ndarray of int8 of shape (K, ), SegmentCode values
+    """
+    s = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    t = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 2)
+    if len(s) != len(t):
+        raise ValueError("segments and triangles have to contain the same number of items")
+    p0, p1, t0, t1, t2 = s[:, 0], s[:, 1], t[:, 0], t[:, 1], t[:, 2]
+
+    # side(p1, p2, a, b) is product of z components of both points
+    side_z = (lambda p, a, b: orient2d_batch(a, b, p)) if robust else _side_z
+    z01, z12, z20 = side_z(t2, t0, t1), side_z(t0, t1, t2), side_z(t1, t2, t0)
+    f1, f2 = side_z(p0, t0, t1) * z01, side_z(p1, t0, t1) * z01
+    f3, f4 = side_z(p0, t1, t2) * z12, side_z(p1, t1, t2) * z12
+    f5, f6 = side_z(p0, t2, t0) * z20, side_z(p1, t2, t0) * z20
+    f7 = side_z(t0, p0, p1) * side_z(t1, p0, p1)
+    f8 = side_z(t1, p0, p1) * side_z(t2, p0, p1)
+
+    # decisions of segment_intersection_2d() in reversed order, the first matching one wins
+    code = np.full(len(s), SegmentCode.INTERSECTING, dtype=np.int8)
+    code[(f1 > 0) & (f2 > 0) & (f3 > 0) & (f4 > 0) & (f5 > 0) & (f6 > 0)] = SegmentCode.NOT_INTERSECTING
+    code[((f1 <= 0) & (f2 <= 0)) | ((f3 <= 0) & (f4 <= 0)) | ((f5 <= 0) & (f6 <= 0)) |
+         ((f7 >= 0) & (f8 >= 0))] = SegmentCode.TOUCHING
+    code[((f1 == 0) & (f2 == 0)) | ((f3 == 0) & (f4 == 0)) | ((f5 == 0) & (f6 == 0))] = SegmentCode.OVERLAPPING
+    code[((f1 < 0) & (f2 < 0)) | ((f3 < 0) & (f4 < 0)) | ((f5 < 0) & (f6 < 0)) |
+         ((f7 > 0) & (f8 > 0))] = SegmentCode.NOT_INTERSECTING
+    return code
+
+
+# separating axis theorem (SAT)
 #
-#                     (edge0[0] == -1 and edge1[0] == 0 and edge2[0] == -1) or (
-#                                     edge0[0] == 0 and edge1[0] == -1 and edge2[0] == -1) or (
-#                                 edge0[0] == -1 and edge1[0] == -1 and edge2[0] == 0)):
-#         return -1, "TOUCHING"
+# two convex polygons do not intersect if there is an axis, on which their projections do not overlap;
+# in 2d it is enough to test normals of all edges (6 axes for two triangles)
 #
-#     return 1, "INTERSECTING"
+# for each axis (unit normal of edge), projection intervals [min_0, max_0], [min_1, max_1] gives gap
+#       gap = max(min_0 - max_1, min_1 - max_0)
+# and the largest gap over all axes decides:
+#       gap > 0:  there is separating axis, NOT_INTERSECTING
+#       gap == 0: triangles are only in contact on the axis (interiors are disjoint), contact is edge or vertex
+#                 of both triangles; if edge of one triangle overlaps with edge of other one (in positive length),
+#                 it is EDGE_OVERLAPPING, otherwise it is TOUCHING
+#       gap < 0:  projections overlap on every axis, interiors overlap, INTERSECTING
+# all comparisons with zero are done with tolerance eps scaled by magnitude of coordinates
 #
+# zero-area triangle (segment or point) is not separated along its own line by edge normals, so pairs with
+# zero-area triangle are tested again with three more axes: direction of the longest edge of each zero-area
+# triangle and axis between centroids (the only valid axis of two points, two identical points are TOUCHING)
+def _separating_axis_codes(f0, f1, axes, valid, tol):
+    # FaceCode of triangle pairs f0, f1 (K, 3, 2) tested on unit axes (K, A, 2) where valid (K, A)
+    rows = np.arange(len(f0))
+    proj0 = np.einsum("kad,kvd->kav", axes, f0)
+    proj1 = np.einsum("kad,kvd->kav", axes, f1)
+    min0, max0, min1, max1 = proj0.min(axis=2), proj0.max(axis=2), proj1.min(axis=2), proj1.max(axis=2)
+    gap = np.where(valid, np.maximum(min0 - max1, min1 - max0), -np.inf)
+
+    best = np.argmax(gap, axis=1)
+    max_gap = gap[rows, best]
+
+    # contact on best axis: vertices of each triangle lying at the touching side of its interval
+    tangent = np.stack((-axes[rows, best, 1], axes[rows, best, 0]), axis=-1)
+    p0, p1 = proj0[rows, best], proj1[rows, best]
+    f0_below = (min1 - max0)[rows, best] >= (min0 - max1)[rows, best]
+    side0 = np.where(f0_below, max0[rows, best], min0[rows, best])[:, np.newaxis]
+    side1 = np.where(f0_below, min1[rows, best], max1[rows, best])[:, np.newaxis]
+    contact0 = np.abs(p0 - side0) <= tol[:, np.newaxis]
+    contact1 = np.abs(p1 - side1) <= tol[:, np.newaxis]
+    t0 = np.einsum("kd,kvd->kv", tangent, f0)
+    t1 = np.einsum("kd,kvd->kv", tangent, f1)
+    overlap = np.minimum(np.where(contact0, t0, -np.inf).max(axis=1), np.where(contact1, t1, -np.inf).max(axis=1)) - \
+        np.maximum(np.where(contact0, t0, np.inf).min(axis=1), np.where(contact1, t1, np.inf).min(axis=1))
+
+    code = np.full(len(f0), FaceCode.INTERSECTING, dtype=np.int8)
+    touching = np.abs(max_gap) <= tol
+    code[touching] = np.where(overlap[touching] > tol[touching], FaceCode.EDGE_OVERLAPPING, FaceCode.TOUCHING)
+    code[max_gap > tol] = FaceCode.NOT_INTERSECTING
+    code[~valid.any(axis=1)] = FaceCode.TOUCHING
+    return code
+
+
+def face_intersection_2d_batch(faces0, faces1, eps=None):
+    """
+    batched separating axis test of triangle pairs in plane
+
+    :param faces0: array_like of shape (K, 3, 2), only first two coordinates are used if vertices have more
+    :param faces1: array_like of shape (K, 3, 2)
+    :param eps: float, relative tolerance of contact, default is relative tolerance of current context
+    :rtype: ndarray of int8 of shape (K, ), FaceCode values
+    """
+    f0 = np.asarray(faces0, dtype=np.float64)[..., :2].reshape(-1, 3, 2)
+    f1 = np.asarray(faces1, dtype=np.float64)[..., :2].reshape(-1, 3, 2)
+    if f0.shape != f1.shape:
+        raise ValueError("faces0 and faces1 have to contain the same number of faces")
+    eps = get_tolerance().relative if eps is None else eps
+    tol = eps * np.maximum(np.maximum(np.abs(f0).max(axis=(1, 2)), np.abs(f1).max(axis=(1, 2))), 1.0)
+
+    # unit normals of all six edges, shape (K, 6, 2)
+    edges = np.concatenate((np.roll(f0, -1, axis=1) - f0, np.roll(f1, -1, axis=1) - f1), axis=1)
+    length = np.hypot(edges[..., 0], edges[..., 1])
+    valid = length > tol[:, np.newaxis]
+    axes = np.stack((-edges[..., 1], edges[..., 0]), axis=-1) / np.where(valid, length, 1.0)[..., np.newaxis]
+    code = _separating_axis_codes(f0, f1, axes, valid, tol)
+
+    # zero-area triangles: height over the longest edge is within tolerance, shape (K, 2)
+    rows = np.arange(len(f0))[:, np.newaxis]
+    longest = np.argmax(length.reshape(-1, 2, 3), axis=2) + [0, 3]
+    u, v = edges[rows, longest], edges[rows, (longest + 1) % 3 + longest // 3 * 3]
+    longest_length = length[rows, longest]
+    degenerate = np.abs((u[..., 0] * v[..., 1]) - (u[..., 1] * v[..., 0])) <= tol[:, np.newaxis] * longest_length
+    k = np.flatnonzero(degenerate.any(axis=1))
+    if len(k):
+        centers = f1[k].mean(axis=1) - f0[k].mean(axis=1)
+        extra = np.concatenate((u[k], centers[:, np.newaxis]), axis=1)
+        extra_length = np.concatenate((longest_length[k], np.hypot(centers[:, 0], centers[:, 1])[:, np.newaxis]),
+                                      axis=1)
+        extra_valid = np.concatenate((degenerate[k], np.ones((len(k), 1), dtype=bool)), axis=1) & \
+            (extra_length > tol[k, np.newaxis])
+        extra = extra / np.where(extra_valid, extra_length, 1.0)[..., np.newaxis]
+        code[k] = _separating_axis_codes(f0[k], f1[k], np.concatenate((axes[k], extra), axis=1),
+                                         np.concatenate((valid[k], extra_valid), axis=1), tol[k])
+    return code
+
+
+def face_intersection_2d(f0, f1):
+    # check whether triangles f0, f1 intersect (separating axis theorem, see face_intersection_2d_batch())
+    return code_result(FaceCode(face_intersection_2d_batch([f0], [f1])[0]))
+
+
+# import Plot as Plt
 
 # # not intersection example:
 # faces = [[[0.0, 0.5, 0.0],
@@ -163,7 +387,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [1.0, 0.4, 0.0],
 #           [0.0, -.7, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (0, 'NOT_INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -174,7 +398,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [1.0, 0.3, 0.0],
 #           [0.0, 0.3, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (0, 'NOT_INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -185,7 +409,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [1.0, 0.5, 0.0],
 #           [0.0, 0.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (2, 'EDGE_OVERLAPPING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -196,7 +420,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 1.0, 0.0],
 #           [1.0, 1.0, 0.0],
 #           [1.0, 0.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (2, 'EDGE_OVERLAPPING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -207,7 +431,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[-1., 1.0, 0.0],
 #           [0.0, 1.0, 0.0],
 #           [0.0, 0.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (2, 'EDGE_OVERLAPPING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -218,7 +442,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [0.0, -.5, 0.0],
 #           [-.5, -.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (-1, 'TOUCHING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -229,7 +453,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [-.1, -.5, 0.0],
 #           [-.5, -.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (-1, 'TOUCHING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -240,7 +464,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [-.5, 0.0, 0.0],
 #           [-.5, -.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (-1, 'TOUCHING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -251,7 +475,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.5, -.5, 0.0],
 #           [-.5, 0.5, 0.0],
 #           [-.5, -.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (-1, 'TOUCHING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -262,7 +486,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 2.0, 0.0],
 #           [1.0, 0.5, 0.0],
 #           [0.0, 0.5, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -273,7 +497,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.5, 0.0],
 #           [1.0, 0.5, 0.0],
 #           [0.0, 1.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -284,7 +508,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.0, 0.0, 0.0],
 #           [1.0, 0.0, 0.0],
 #           [0.0, 1.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -295,7 +519,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.5, .25, 0.0],
 #           [1.0, 0.5, 0.0],
 #           [0.5, 1.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -307,7 +531,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.5, -.5, 0.0],
 #           [1.0, -.5, 0.0],
 #           [0.5, 1.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -318,7 +542,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[0.5, -.5, 0.0],
 #           [1.0, -.5, 0.0],
 #           [0.5, 2.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 #
@@ -329,7 +553,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #          [[-.9, -.9, 0.0],
 #           [-3., 3.5, 0.0],
 #           [9.5, 1.0, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 
@@ -341,7 +565,7 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #         [[6.66133815e-16, 0.00000000e+00, 0.0],
 #          [-2.90985300e-01, 4.36730376e-02, 0.0],
 #          [-3.08718461e-02, -3.07471026e-01, 0.0]]]
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
 
@@ -354,4 +578,13 @@ def segment_intersection_2d(p0, p1, t0, t1, t2):
 #           [-0.3368319, -0.26155048, 0.0]]]
 # Plt.plot_3d(faces=[faces], faces_view=True, normals_view=False, points_view=False, face_color=[["r", "g"]],
 #             face_alpha=0.5, azim=-90, elev=90)
-# print(face_intersection_2d(f0=faces[0], f1=faces[1]))
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (1, 'INTERSECTING')
+
+
+# # degenerate examples, collinear slivers and two points are separated
+# faces = [[[0.0, 0.0, 0.0], [1.0, 0.0, 0.0], [0.5, 0.0, 0.0]],
+#          [[2.0, 0.0, 0.0], [3.0, 0.0, 0.0], [2.5, 0.0, 0.0]]]
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (0, 'NOT_INTERSECTING')
+# faces = [[[0.0, 0.0, 0.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]],
+#          [[5.0, 5.0, 0.0], [5.0, 5.0, 0.0], [5.0, 5.0, 0.0]]]
+# print(face_intersection_2d(f0=faces[0], f1=faces[1]))  # (0, 'NOT_INTERSECTING')
@@ -0,0 +1,237 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from itertools import chain
+
+from results import INTERSECTION_PAIR_DTYPE, SEGMENT_TRIANGLE_PAIR_DTYPE, FACE_PAIR_DTYPE
+from spatial_index import UniformGrid, bounding_boxes, intersecting_edge_pairs, intersecting_segment_triangle_pairs, \
+    intersecting_face_pairs
+
+# incremental intersection state of moving 2d primitives (temporal coherence)
+#
+# state keeps primitives, spatial index of their bounding boxes and set of intersecting pairs; move() changes
+# primitives, updates their boxes in index and marks them dirty, refresh() then
+#       1. drops known pairs of dirty primitives
+#       2. queries index with boxes of dirty primitives for candidate pairs
+#       3. evaluates all candidates by batched narrow phase kernel at once and stores intersecting pairs
+# so cost of tick is proportional to number of moved primitives and their neighbours, not to size of scene,
+# pairs of primitives which did not move are never tested again
+#
+#       state = IncrementalFaceIntersections(triangles)
+#       for moved, triangles in simulation:
+#           state.move(moved, triangles)
+#           added, removed = state.refresh()
+#
+# primitives are identified by index into arrays given to constructor, pairs are records of the same dtype as
+# in spatial_index / parallel (i < j for self tests)
+
+
+def _same(a, b):
+    # records are equal, numpy.nan (point of overlapping segments) is equal to itself
+    return b is not None and all(x == y or (x != x and y != y) for x, y in zip(a, b))
+
+
+class _IncrementalPairs(ABC):
+    # second side is None for self test; subclasses define _dtype and _evaluate(i, j)
+    _dtype = None
+
+    def __init__(self, first, second=None, first_index=None, second_index=None):
+        self._self_test = second is None
+        self._arrays = [np.array(first, dtype=np.float64)]
+        self._indices = [UniformGrid() if first_index is None else first_index]
+        if not self._self_test:
+            self._arrays.append(np.array(second, dtype=np.float64))
+            self._indices.append(UniformGrid() if second_index is None else second_index)
+        for array, index in zip(self._arrays, self._indices):
+            index.insert_many(range(len(array)), bounding_boxes(array))
+
+        # (i, j) -> record tuple of intersecting pair, primitive -> set of its pairs (for every side)
+        self._records = {}
+        self._partners = [{} for _ in self._arrays]
+        self._dirty = [set() for _ in self._arrays]
+        if self._self_test:
+            candidates = set((a, b) if a < b else (b, a) for a, b in self._indices[0].candidate_pairs())
+        else:
+            first, second = self._indices
+            candidates = set((a, b) for a in range(len(self._arrays[0])) for b in second.query(first.bbox(a)))
+        for record in self._test(candidates):
+            self._link((record[0], record[1]), record)
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def dirty(self):
+        return sum(len(dirty) for dirty in self._dirty)
+
+    def _move(self, side, keys, primitives):
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1)
+        array, index = self._arrays[side], self._indices[side]
+        array[keys] = primitives
+        for key, box in zip(keys.tolist(), bounding_boxes(array[keys]).tolist()):
+            index.update(key, box)
+        self._dirty[side].update(keys.tolist())
+
+    def _link(self, pair, record):
+        self._records[pair] = record
+        self._partners[0].setdefault(pair[0], set()).add(pair)
+        self._partners[-1].setdefault(pair[1], set()).add(pair)
+
+    def _unlink(self, pair):
+        for side, key in ((0, pair[0]), (-1, pair[1])):
+            pairs = self._partners[side][key]
+            pairs.discard(pair)
+            if not pairs:
+                del self._partners[side][key]
+        return self._records.pop(pair)
+
+    def _candidates(self):
+        # pairs of dirty primitive with any primitive of overlapping box
+        pairs = set()
+        if self._self_test:
+            index = self._indices[0]
+            for a in self._dirty[0]:
+                pairs.update((a, b) if a < b else (b, a) for b in index.query(index.bbox(a)) if b != a)
+            return pairs
+        first, second = self._indices
+        for a in self._dirty[0]:
+            pairs.update((a, b) for b in second.query(first.bbox(a)))
+        for b in self._dirty[1]:
+            pairs.update((a, b) for a in first.query(second.bbox(b)))
+        return pairs
+
+    @abstractmethod
+    def _evaluate(self, i, j):
+        """
+        :param i: ndarray of int, indices to the first side
+        :param j: ndarray of int, indices to the second side (to the first one for self test)
+        :rtype: ndarray of _dtype, records of intersecting pairs
+        """
+
+    def _test(self, candidates):
+        # records (tuples) of intersecting pairs of set of candidate pairs
+        flat = np.fromiter(chain.from_iterable(candidates), dtype=np.int64, count=2 * len(candidates))
+        return self._evaluate(flat[0::2], flat[1::2]).tolist()
+
+    def refresh(self):
+        """
+        re-test pairs of primitives moved since last refresh
+
+        :return: tuple (added, removed), records of pairs which started / stopped intersecting (pair with
+                 changed record, e.g. code or intersection point, is in both)
+        """
+        old = {}
+        for side, dirty in enumerate(self._dirty):
+            for key in dirty:
+                for pair in list(self._partners[side].get(key, ())):
+                    old[pair] = self._unlink(pair)
+
+        records = self._test(self._candidates())
+        for record in records:
+            self._link((record[0], record[1]), record)
+        for dirty in self._dirty:
+            dirty.clear()
+
+        added = [r for r in records if not _same(r, old.get((r[0], r[1])))]
+        removed = [r for pair, r in old.items() if not _same(r, self._records.get(pair))]
+        return np.array(added, dtype=self._dtype), np.array(removed, dtype=self._dtype)
+
+    def pairs(self):
+        """
+        :rtype: ndarray of records of all intersecting pairs, sorted by (i, j)
+        """
+        if any(self._dirty):
+            self.refresh()
+        out = np.array(list(self._records.values()), dtype=self._dtype)
+        return out[np.lexsort((out["j"], out["i"]))]
+
+
+class IncrementalEdgeIntersections(_IncrementalPairs):
+    # intersecting pairs i < j of set of segments, see spatial_index.intersecting_edge_pairs()
+    _dtype = INTERSECTION_PAIR_DTYPE
+
+    def __init__(self, edges, index=None):
+        """
+        :param edges: array_like of shape (N, 2, 2), copied
+        :param index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+        """
+        super(IncrementalEdgeIntersections, self).__init__(edges, None, index)
+
+    @property
+    def edges(self):
+        return self._arrays[0]
+
+    def move(self, keys, edges):
+        """
+        :param keys: array_like of int, indices of moved segments
+        :param edges: array_like of shape (K, 2, 2), new segments
+        """
+        self._move(0, keys, edges)
+
+    def _evaluate(self, i, j):
+        return intersecting_edge_pairs(self._arrays[0], self._arrays[0], i, j)
+
+
+class IncrementalFaceIntersections(_IncrementalPairs):
+    # intersecting pairs i < j of set of triangles, see spatial_index.intersecting_face_pairs()
+    _dtype = FACE_PAIR_DTYPE
+
+    def __init__(self, faces, index=None):
+        """
+        :param faces: array_like of shape (N, 3, 2), copied
+        :param index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+        """
+        super(IncrementalFaceIntersections, self).__init__(faces, None, index)
+
+    @property
+    def faces(self):
+        return self._arrays[0]
+
+    def move(self, keys, faces):
+        """
+        :param keys: array_like of int, indices of moved triangles
+        :param faces: array_like of shape (K, 3, 2), new triangles
+        """
+        self._move(0, keys, faces)
+
+    def _evaluate(self, i, j):
+        return intersecting_face_pairs(self._arrays[0], self._arrays[0], i, j)
+
+
+class IncrementalSegmentTriangleIntersections(_IncrementalPairs):
+    # intersecting pairs of segment i and triangle j, see spatial_index.intersecting_segment_triangle_pairs()
+    _dtype = SEGMENT_TRIANGLE_PAIR_DTYPE
+
+    def __init__(self, segments, triangles, segment_index=None, triangle_index=None):
+        """
+        :param segments: array_like of shape (N, 2, 2), copied
+        :param triangles: array_like of shape (M, 3, 2), copied
+        :param segment_index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+        :param triangle_index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+        """
+        super(IncrementalSegmentTriangleIntersections, self).__init__(segments, triangles, segment_index,
+                                                                      triangle_index)
+
+    @property
+    def segments(self):
+        return self._arrays[0]
+
+    @property
+    def triangles(self):
+        return self._arrays[1]
+
+    def move_segments(self, keys, segments):
+        """
+        :param keys: array_like of int, indices of moved segments
+        :param segments: array_like of shape (K, 2, 2), new segments
+        """
+        self._move(0, keys, segments)
+
+    def move_triangles(self, keys, triangles):
+        """
+        :param keys: array_like of int, indices of moved triangles
+        :param triangles: array_like of shape (K, 3, 2), new triangles
+        """
+        self._move(1, keys, triangles)
+
+    def _evaluate(self, i, j):
+        return intersecting_segment_triangle_pairs(self._arrays[0], self._arrays[1], i, j)
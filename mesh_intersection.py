@@ -0,0 +1,374 @@
+import numpy as np
+
+from tolerance import get_tolerance
+from triangle_mesh import TriangleMesh
+
+# intersection of triangular meshes in 3d
+#
+# broad phase: bounding volume hierarchy (linear BVH) over triangles
+#       triangles are sorted by morton code of their centroids and split into leaves of leaf_size triangles,
+#       tree is complete binary tree stored implicitly in arrays (node i has children 2i + 1 and 2i + 2),
+#       so it is built by sorting and few numpy reductions, without any python recursion;
+#       two trees (or one tree against itself) are traversed simultaneously level by level, all node pairs
+#       of one level are tested on bounding box overlap at once
+#
+# narrow phase: triangle - triangle test (Moller, A Fast Triangle-Triangle Intersection Test, 1997)
+#       1. signed distances of vertices of first triangle to plane of second triangle, if all of them are
+#          on the same side, triangles do not intersect; the same for second triangle against first plane
+#       2. both triangles cut line of intersection of planes (direction D = n1 x n2) in intervals,
+#          triangles intersect if intervals overlap; interval is computed from edges crossing other plane
+#       3. coplanar triangles are projected to 2d and tested by separating axis theorem
+# touching triangles are considered intersecting
+#
+# distances, gaps and interval overlaps are snapped to zero with relative tolerance of current context
+# (tolerance.py)
+#
+# meshes are converted to TriangleMesh (triangle_mesh.py), face normals, plane offsets and bounding boxes
+# are computed once per mesh and gathered for candidate pairs
+
+
+def _spread_bits(v):
+    # insert two zero bits between each of 10 lowest bits
+    v = v.astype(np.uint64)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x030000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x0300F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x030C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x09249249)
+    return v
+
+
+def morton_codes(points):
+    """
+    30 bit morton codes of points quantized in their bounding box
+
+    :param points: ndarray of shape (N, 3)
+    :rtype: ndarray of uint64
+    """
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    span = np.where(hi > lo, hi - lo, 1.0)
+    q = np.clip(((points - lo) / span * 1023.0).astype(np.int64), 0, 1023)
+    return (_spread_bits(q[:, 0]) << np.uint64(2)) | (_spread_bits(q[:, 1]) << np.uint64(1)) | _spread_bits(q[:, 2])
+
+
+class TriangleBVH(object):
+    def __init__(self, triangles, leaf_size=4):
+        """
+        :param triangles: array_like of shape (N, 3, 3) or TriangleMesh (its cached boxes are used)
+        :param leaf_size: int, maximal number of triangles in leaf
+        """
+        if isinstance(triangles, TriangleMesh):
+            tri_min, tri_max = triangles.bounds[:, 0], triangles.bounds[:, 1]
+        else:
+            triangles = np.asarray(triangles, dtype=np.float64)
+            tri_min, tri_max = triangles.min(axis=1), triangles.max(axis=1)
+        self.leaf_size = leaf_size
+        self.n_triangles = len(triangles)
+
+        self.order = np.argsort(morton_codes((tri_min + tri_max) / 2.0), kind="stable") \
+            if self.n_triangles else np.empty(0, dtype=np.int64)
+
+        # number of leaves is power of two, padded leaves are empty (inverted boxes never overlap)
+        n_leaves = max(-(-self.n_triangles // leaf_size), 1)
+        self.depth = int(np.ceil(np.log2(n_leaves)))
+        self.n_leaves = 2 ** self.depth
+        self.first_leaf = self.n_leaves - 1
+
+        node_min = np.full((2 * self.n_leaves - 1, 3), np.inf)
+        node_max = np.full((2 * self.n_leaves - 1, 3), -np.inf)
+        if self.n_triangles:
+            starts = np.arange(0, self.n_triangles, leaf_size)
+            used = slice(self.first_leaf, self.first_leaf + len(starts))
+            node_min[used] = np.minimum.reduceat(tri_min[self.order], starts, axis=0)
+            node_max[used] = np.maximum.reduceat(tri_max[self.order], starts, axis=0)
+
+        # triangle boxes in leaf order, shape (n_leaves, leaf_size, 3), padded slots have inverted boxes
+        n_slots = self.n_leaves * leaf_size
+        self.slot_triangle = np.full(n_slots, -1, dtype=np.int64)
+        self.slot_triangle[:self.n_triangles] = self.order
+        self.slot_min = np.full((n_slots, 3), np.inf)
+        self.slot_max = np.full((n_slots, 3), -np.inf)
+        self.slot_min[:self.n_triangles], self.slot_max[:self.n_triangles] = tri_min[self.order], tri_max[self.order]
+        self.slot_min = self.slot_min.reshape(self.n_leaves, leaf_size, 3)
+        self.slot_max = self.slot_max.reshape(self.n_leaves, leaf_size, 3)
+        # internal nodes bottom up, level by level
+        for level in range(self.depth - 1, -1, -1):
+            nodes = np.arange(2 ** level - 1, 2 ** (level + 1) - 1)
+            node_min[nodes] = np.minimum(node_min[2 * nodes + 1], node_min[2 * nodes + 2])
+            node_max[nodes] = np.maximum(node_max[2 * nodes + 1], node_max[2 * nodes + 2])
+        self.node_min, self.node_max = node_min, node_max
+
+
+def _node_depth(nodes):
+    return np.floor(np.log2(nodes + 1.0)).astype(np.int64)
+
+
+def _overlap(min_a, max_a, min_b, max_b):
+    # boxes given by (..., 3) corners, axes are unrolled, it is faster than reduction over last axis
+    result = (min_a[..., 0] <= max_b[..., 0]) & (min_b[..., 0] <= max_a[..., 0])
+    for axis in (1, 2):
+        result &= (min_a[..., axis] <= max_b[..., axis]) & (min_b[..., axis] <= max_a[..., axis])
+    return result
+
+
+def _leaf_pairs(bvh_a, bvh_b, self_test=False, chunk=1 << 16):
+    # generator of arrays of overlapping leaf pairs (node indices), simultaneous traversal of both trees
+    frontier_a, frontier_b = np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+    while len(frontier_a):
+        keep = _overlap(bvh_a.node_min[frontier_a], bvh_a.node_max[frontier_a],
+                        bvh_b.node_min[frontier_b], bvh_b.node_max[frontier_b])
+        frontier_a, frontier_b = frontier_a[keep], frontier_b[keep]
+
+        leaf_a, leaf_b = frontier_a >= bvh_a.first_leaf, frontier_b >= bvh_b.first_leaf
+        done = leaf_a & leaf_b
+        for start in range(0, int(done.sum()), chunk):
+            yield frontier_a[done][start:start + chunk], frontier_b[done][start:start + chunk]
+
+        a, b = frontier_a[~done], frontier_b[~done]
+        leaf_a, leaf_b = leaf_a[~done], leaf_b[~done]
+        # descend bigger (shallower) node
+        descend_a = ~leaf_a & (leaf_b | (_node_depth(a) <= _node_depth(b)))
+
+        if self_test:
+            # node against itself produces (c1, c1), (c1, c2), (c2, c2)
+            same = a == b
+            s = a[same]
+            a, b, descend_a = a[~same], b[~same], descend_a[~same]
+            same_a = np.concatenate((2 * s + 1, 2 * s + 1, 2 * s + 2))
+            same_b = np.concatenate((2 * s + 1, 2 * s + 2, 2 * s + 2))
+        else:
+            same_a = same_b = np.empty(0, dtype=np.int64)
+
+        da, db = a[descend_a], b[descend_a]
+        ea, eb = a[~descend_a], b[~descend_a]
+        frontier_a = np.concatenate((2 * da + 1, 2 * da + 2, ea, ea, same_a))
+        frontier_b = np.concatenate((db, db, 2 * eb + 1, 2 * eb + 2, same_b))
+
+
+def candidate_pairs(bvh_a, bvh_b, self_test=False):
+    """
+    broad phase, generator of triangle index pairs with overlapping bounding boxes
+
+    :param bvh_a: TriangleBVH
+    :param bvh_b: TriangleBVH, the same tree as bvh_a for self test
+    :param self_test: bool, every pair of single tree is yielded only once and triangle is not paired with itself
+    :rtype: generator of tuple (ta, tb) of ndarrays of int of the same length, triangle indices in bvh_a, bvh_b
+    """
+    for leaves_a, leaves_b in _leaf_pairs(bvh_a, bvh_b, self_test=self_test):
+        leaves_a, leaves_b = leaves_a - bvh_a.first_leaf, leaves_b - bvh_b.first_leaf
+        min_a, max_a = bvh_a.slot_min[leaves_a][:, :, np.newaxis], bvh_a.slot_max[leaves_a][:, :, np.newaxis]
+        min_b, max_b = bvh_b.slot_min[leaves_b][:, np.newaxis], bvh_b.slot_max[leaves_b][:, np.newaxis]
+        # shape (K, leaf_size_a, leaf_size_b), padded slots never overlap
+        overlap = _overlap(min_a, max_a, min_b, max_b)
+        if self_test:
+            # within the same leaf, every pair only once
+            upper = np.triu(np.ones(overlap.shape[1:], dtype=bool), 1)
+            overlap &= (leaves_a != leaves_b)[:, np.newaxis, np.newaxis] | upper
+        k, i, j = np.nonzero(overlap)
+        yield (bvh_a.slot_triangle[leaves_a[k] * bvh_a.leaf_size + i],
+               bvh_b.slot_triangle[leaves_b[k] * bvh_b.leaf_size + j])
+
+
+def _snap(dist, scale):
+    tol = get_tolerance()
+    if tol.exact:
+        return dist
+    return np.where(np.abs(dist) <= tol.relative_limit(scale), 0.0, dist)
+
+
+def _coplanar_overlap(t1, t2, normal):
+    # project on plane given by the dominant axis of normal and use separating axis theorem
+    axis = np.argmax(np.abs(normal), axis=1)
+    keep = np.array([[1, 2], [0, 2], [0, 1]])[axis]
+    rows = np.arange(len(t1))[:, np.newaxis, np.newaxis]
+    p1 = t1[rows, np.arange(3)[:, np.newaxis], keep[:, np.newaxis, :]]
+    p2 = t2[rows, np.arange(3)[:, np.newaxis], keep[:, np.newaxis, :]]
+
+    separated = np.zeros(len(t1), dtype=bool)
+    for poly in (p1, p2):
+        edges = np.roll(poly, -1, axis=1) - poly
+        axes = np.stack((-edges[..., 1], edges[..., 0]), axis=-1)
+        proj1 = np.einsum("kad,kvd->kav", axes, p1)
+        proj2 = np.einsum("kad,kvd->kav", axes, p2)
+        scale = np.abs(axes).sum(axis=-1) * np.maximum(np.abs(p1).max(axis=(1, 2)),
+                                                       np.abs(p2).max(axis=(1, 2)))[:, np.newaxis]
+        gap = np.maximum(proj1.min(axis=2) - proj2.max(axis=2), proj2.min(axis=2) - proj1.max(axis=2))
+        separated |= np.any(gap > get_tolerance().relative_limit(scale), axis=1)
+    return ~separated
+
+
+def _interval(p, d):
+    # interval of triangle on intersection line, p projections of vertices on line, d distances to other plane
+    lo, hi = np.full(len(p), np.inf), np.full(len(p), -np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for i, j in ((0, 1), (1, 2), (2, 0)):
+            cross = d[:, i] * d[:, j] < 0
+            t = p[:, i] + (p[:, j] - p[:, i]) * d[:, i] / (d[:, i] - d[:, j])
+            lo, hi = np.where(cross, np.minimum(lo, t), lo), np.where(cross, np.maximum(hi, t), hi)
+    on_plane = d == 0
+    lo = np.minimum(lo, np.where(on_plane, p, np.inf).min(axis=1))
+    hi = np.maximum(hi, np.where(on_plane, p, -np.inf).max(axis=1))
+    return lo, hi
+
+
+def triangle_intersection_3d(t1, t2, normals1=None, normals2=None):
+    """
+    batched triangle - triangle intersection test in 3d
+
+    :param t1: array_like of shape (K, 3, 3), K triangles given by vertices
+    :param t2: array_like of shape (K, 3, 3)
+    :param normals1: ndarray of shape (K, 3), precomputed cross(v1 - v0, v2 - v0) of t1 (e.g. gathered from
+                     TriangleMesh.normals), computed if None
+    :param normals2: ndarray of shape (K, 3), precomputed normals of t2
+    :rtype: ndarray of bool of shape (K, ), True if triangles intersect (or touch)
+    """
+    t1, t2 = np.asarray(t1, dtype=np.float64), np.asarray(t2, dtype=np.float64)
+    result = np.zeros(len(t1), dtype=bool)
+    if not len(t1):
+        return result
+    scale = np.maximum(np.abs(t1).max(axis=(1, 2)), np.abs(t2).max(axis=(1, 2)))[:, np.newaxis]
+
+    n2 = np.cross(t2[:, 1] - t2[:, 0], t2[:, 2] - t2[:, 0]) if normals2 is None else normals2
+    d1 = _snap(np.einsum("kvd,kd->kv", t1 - t2[:, :1], n2), scale * np.linalg.norm(n2, axis=1, keepdims=True))
+    n1 = np.cross(t1[:, 1] - t1[:, 0], t1[:, 2] - t1[:, 0]) if normals1 is None else normals1
+    d2 = _snap(np.einsum("kvd,kd->kv", t2 - t1[:, :1], n1), scale * np.linalg.norm(n1, axis=1, keepdims=True))
+
+    candidate = ~(np.all(d1 > 0, axis=1) | np.all(d1 < 0, axis=1) | np.all(d2 > 0, axis=1) | np.all(d2 < 0, axis=1))
+    coplanar = candidate & np.all(d1 == 0, axis=1)
+    crossing = candidate & ~coplanar
+
+    if np.any(coplanar):
+        result[coplanar] = _coplanar_overlap(t1[coplanar], t2[coplanar], n1[coplanar])
+
+    if np.any(crossing):
+        idx = np.flatnonzero(crossing)
+        direction = np.cross(n1[idx], n2[idx])
+        axis = np.argmax(np.abs(direction), axis=1)
+        p1, p2 = t1[idx, :, axis], t2[idx, :, axis]
+        lo1, hi1 = _interval(p1, d1[idx])
+        lo2, hi2 = _interval(p2, d2[idx])
+        # intervals touching within tolerance overlap, like snapped distances and coplanar gaps
+        limit = get_tolerance().relative_limit(scale[idx, 0])
+        result[idx] = (lo1 - hi2 <= limit) & (lo2 - hi1 <= limit)
+    return result
+
+
+def _segment_triangle_3d(p, q, tri):
+    # proper crossing of segments pq with triangles via signed volumes, touching included
+    def volume(a, b, c, d):
+        return np.einsum("kd,kd->k", np.cross(b - a, c - a), d - a)
+
+    a, b, c = tri[:, 0], tri[:, 1], tri[:, 2]
+    sp, sq = volume(a, b, c, p), volume(a, b, c, q)
+    s1, s2, s3 = volume(p, q, a, b), volume(p, q, b, c), volume(p, q, c, a)
+    opposite = (sp * sq <= 0) & ~((sp == 0) & (sq == 0))
+    inside = ((s1 >= 0) & (s2 >= 0) & (s3 >= 0)) | ((s1 <= 0) & (s2 <= 0) & (s3 <= 0))
+    return opposite & inside
+
+
+def _opposite_edge(tri, normal, offset, t_edge, t_face, shared):
+    # edge of triangle t_edge opposite to shared vertex against triangle t_face, returns (crossing, hit),
+    # crossing: endpoints are not strictly on one side of plane of t_face, hit: edge crosses t_face
+    p = tri[t_edge, (shared + 1) % 3]
+    q = tri[t_edge, (shared + 2) % 3]
+    sp = np.einsum("kd,kd->k", p, normal[t_face]) - offset[t_face]
+    sq = np.einsum("kd,kd->k", q, normal[t_face]) - offset[t_face]
+    crossing = (sp * sq <= 0) & ~((sp == 0) & (sq == 0))
+    hit = np.zeros(len(t_edge), dtype=bool)
+    k = np.flatnonzero(crossing)
+    hit[k] = _segment_triangle_3d(p[k], q[k], tri[t_face[k]])
+    return crossing, hit
+
+
+def _shared_vertex_intersection(tri, normal, offset, ta, tb, shared_a, shared_b):
+    # triangles sharing single vertex intersect elsewhere only if opposite edge of one of them crosses the other;
+    # edge has to have endpoints on both sides of other plane first, which rejects most of neighbouring faces:
+    # if opposite edge of ta is strictly on one side of plane of tb, ta meets that plane only in the shared
+    # vertex, so the other direction is tested only for pairs which are not rejected (nor hit) by the first one
+    crossing, hit = _opposite_edge(tri, normal, offset, ta, tb, shared_a)
+    rest = np.flatnonzero(crossing & ~hit)
+    hit[rest] = _opposite_edge(tri, normal, offset, tb[rest], ta[rest], shared_b[rest])[1]
+    return hit
+
+
+def _as_mesh(vertices, faces, indexed=False):
+    # TriangleMesh of arguments: mesh itself, indexed mesh or triangle soup (faces None, e.g. STL from mesh_io),
+    # soup is welded if vertex indices are needed
+    if isinstance(vertices, TriangleMesh):
+        mesh = vertices
+    elif faces is None:
+        mesh = TriangleMesh.from_triangles(vertices, weld=indexed)
+    else:
+        mesh = TriangleMesh(vertices, faces)
+    if mesh.dimension != 3:
+        raise ValueError("mesh intersection needs 3d vertices")
+    return mesh
+
+
+def _sorted_pairs(chunks):
+    pairs = np.concatenate(chunks, axis=0) if chunks else np.empty((0, 2), dtype=np.int64)
+    return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+
+
+def mesh_intersection(vertices1, faces1, vertices2, faces2, leaf_size=4):
+    """
+    intersecting faces of two triangular meshes
+
+    :param vertices1: array_like of shape (V1, 3), (F1, 3, 3) triangles if faces1 is None, or TriangleMesh
+    :param faces1: array_like of shape (F1, 3), vertex indices of faces, or None
+    :param vertices2: array_like of shape (V2, 3), (F2, 3, 3) triangles if faces2 is None, or TriangleMesh
+    :param faces2: array_like of shape (F2, 3) or None
+    :param leaf_size: int, number of triangles in BVH leaf
+    :rtype: ndarray of shape (K, 2), pairs of face indices (face of first mesh, face of second mesh)
+    """
+    mesh1, mesh2 = _as_mesh(vertices1, faces1), _as_mesh(vertices2, faces2)
+    tri1, tri2 = mesh1.triangles, mesh2.triangles
+    bvh1, bvh2 = TriangleBVH(mesh1, leaf_size), TriangleBVH(mesh2, leaf_size)
+
+    chunks = []
+    for ta, tb in candidate_pairs(bvh1, bvh2):
+        hit = triangle_intersection_3d(tri1[ta], tri2[tb], mesh1.normals[ta], mesh2.normals[tb])
+        chunks.append(np.stack((ta[hit], tb[hit]), axis=1))
+    return _sorted_pairs(chunks)
+
+
+def mesh_self_intersection(vertices, faces=None, leaf_size=4):
+    """
+    intersecting faces of single triangular mesh
+
+    neighbouring faces touch each other by definition, so pairs sharing an edge are skipped and pairs sharing
+    single vertex are reported only if they intersect outside of the shared vertex (coplanar folds of
+    neighbouring faces are not detected)
+
+    :param vertices: array_like of shape (V, 3), (F, 3, 3) triangles if faces is None (vertices with equal
+                     coordinates are shared), or TriangleMesh (its faces are used as they are, soup has to be
+                     welded)
+    :param faces: array_like of shape (F, 3), vertex indices of faces, or None
+    :param leaf_size: int, number of triangles in BVH leaf
+    :rtype: ndarray of shape (K, 2), pairs of face indices i < j
+    """
+    mesh = _as_mesh(vertices, faces, indexed=True)
+    tri, faces = mesh.triangles, mesh.faces
+    bvh = TriangleBVH(mesh, leaf_size)
+    normal, offset = mesh.normals, mesh.offsets
+
+    chunks = []
+    for ta, tb in candidate_pairs(bvh, bvh, self_test=True):
+        ta, tb = np.minimum(ta, tb), np.maximum(ta, tb)
+
+        # equal vertex indices of both faces, (K, 9) flattened (vertex of a, vertex of b)
+        equal = (faces[ta][:, :, np.newaxis] == faces[tb][:, np.newaxis, :]).reshape(-1, 9)
+        n_shared = np.count_nonzero(equal, axis=1)
+        hit = np.zeros(len(ta), dtype=bool)
+
+        free = np.flatnonzero(n_shared == 0)
+        a, b = ta[free], tb[free]
+        hit[free] = triangle_intersection_3d(tri[a], tri[b], normal[a], normal[b])
+
+        # pairs sharing edge are skipped, pairs sharing single vertex get its position in both faces
+        single = np.flatnonzero(n_shared == 1)
+        if len(single):
+            position = np.argmax(equal[single], axis=1)
+            hit[single] = _shared_vertex_intersection(tri, normal, offset, ta[single], tb[single],
+                                                      position // 3, position % 3)
+        chunks.append(np.stack((ta[hit], tb[hit]), axis=1))
+    return _sorted_pairs(chunks)
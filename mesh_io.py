@@ -0,0 +1,343 @@
+import mmap
+import os
+import re
+import numpy as np
+
+# loading of triangular meshes from STL, OBJ and PLY files
+#
+# file is memory-mapped, binary data are exposed as numpy views of the mapping without copying
+# (pages are read by operating system on first access, so loading is fast and resident memory stays low):
+#       binary STL: records (normal, 3 vertices, attribute) are viewed as structured array, triangles
+#                   (F, 3, 3) and normals (F, 3) are strided float32 views; STL has no shared vertices,
+#                   weld_triangles() creates indexed mesh if it is needed
+#       binary PLY: vertex element is viewed as structured array, vertices (V, 3) is view if x, y, z are
+#                   consecutive properties of the same type; faces (F, 3) is view if all faces are triangles
+#                   and face element has fixed size
+# text formats (OBJ, ASCII STL, ASCII PLY) are parsed from mapping into new arrays, polygons are triangulated
+# as fans
+#
+# result is MeshData, it plugs into intersection and plotting functions
+#       mesh_intersection(mesh.vertices, mesh.faces, ...) or mesh_intersection(mesh.triangles, None, ...)
+#       Plot.plot_3d(faces=[mesh.triangles], ...)
+# or it is converted to TriangleMesh (triangle_mesh.py) with cached derived data (normals, boxes, adjacency)
+
+STL_RECORD_DTYPE = np.dtype([("normal", "<f4", (3, )),
+                             ("vertices", "<f4", (3, 3)),
+                             ("attribute", "<u2")])
+_STL_HEADER = 80
+
+_PLY_TYPES = {"char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1", "short": "i2", "int16": "i2",
+              "ushort": "u2", "uint16": "u2", "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+              "float": "f4", "float32": "f4", "double": "f8", "float64": "f8"}
+
+
+class MeshData(object):
+    # loaded mesh, either indexed (vertices, faces) or triangle soup (triangles), the other form is
+    # derived on first access
+    __slots__ = ("_vertices", "_faces", "_triangles", "normals")
+
+    def __init__(self, vertices=None, faces=None, triangles=None, normals=None):
+        """
+        :param vertices: ndarray of shape (V, 3)
+        :param faces: ndarray of shape (F, 3), vertex indices
+        :param triangles: ndarray of shape (F, 3, 3), used if vertices and faces are not given
+        :param normals: ndarray of shape (F, 3) for STL, (V, 3) for PLY / OBJ vertex normals, or None
+        """
+        if triangles is None and (vertices is None or faces is None):
+            raise ValueError("mesh needs vertices and faces or triangles")
+        self._vertices = vertices
+        self._faces = faces
+        self._triangles = triangles
+        self.normals = normals
+
+    def __len__(self):
+        return len(self._faces) if self._faces is not None else len(self._triangles)
+
+    def __repr__(self):
+        return "MeshData(faces={}, indexed={})".format(len(self), self._faces is not None)
+
+    @property
+    def indexed(self):
+        return self._faces is not None
+
+    @property
+    def vertices(self):
+        if self._vertices is None:
+            self._vertices, self._faces = weld_triangles(self._triangles)
+        return self._vertices
+
+    @property
+    def faces(self):
+        if self._faces is None:
+            self._vertices, self._faces = weld_triangles(self._triangles)
+        return self._faces
+
+    @property
+    def triangles(self):
+        if self._triangles is None:
+            self._triangles = self._vertices[self._faces]
+        return self._triangles
+
+
+def weld_triangles(triangles):
+    """
+    indexed mesh from triangle soup, bit-identical vertices are merged
+
+    :param triangles: array_like of shape (F, 3, 3)
+    :return: tuple (vertices (V, 3), faces (F, 3) of int64)
+    """
+    points = np.ascontiguousarray(triangles).reshape(-1, 3)
+    # + 0.0 turns -0.0 to 0.0, rows are compared as raw bytes
+    points = points + points.dtype.type(0.0)
+    rows = points.view(np.dtype((np.void, points.dtype.itemsize * 3))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+    return points[first], inverse.reshape(-1, 3).astype(np.int64)
+
+
+def _map(path):
+    # read-only mapping of whole file, None for empty file
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _fan(polygons):
+    # triangulation of polygons given as lists of vertex indices, (i0, i1, i2), (i0, i2, i3), ...
+    faces = [(p[0], p[k], p[k + 1]) for p in polygons for k in range(1, len(p) - 1)]
+    return np.array(faces, dtype=np.int64).reshape(-1, 3)
+
+
+def _vertex_view(data, fields):
+    # (N, 3) view of three consecutive fields of the same type in structured array, copy otherwise
+    dtype = data.dtype
+    if all(f in dtype.names for f in fields):
+        types = [dtype.fields[f][0] for f in fields]
+        offsets = [dtype.fields[f][1] for f in fields]
+        size = types[0].itemsize
+        if types[1] == types[0] and types[2] == types[0] and offsets[1] == offsets[0] + size and \
+                offsets[2] == offsets[1] + size:
+            return np.ndarray((len(data), 3), dtype=types[0], buffer=data, offset=offsets[0],
+                              strides=(dtype.itemsize, size))
+        return np.stack([data[f] for f in fields], axis=1)
+    return None
+
+
+# STL
+# ---
+def load_stl(path):
+    """
+    :param path: str, binary or ASCII STL file
+    :rtype: MeshData, triangle soup with face normals; float32 views of file for binary STL
+    """
+    mm = _map(path)
+    if mm is None:
+        raise ValueError("{} is empty".format(path))
+    size = len(mm)
+    if size >= _STL_HEADER + 4:
+        count = int(np.frombuffer(mm, dtype="<u4", count=1, offset=_STL_HEADER)[0])
+        if size == _STL_HEADER + 4 + count * STL_RECORD_DTYPE.itemsize:
+            records = np.frombuffer(mm, dtype=STL_RECORD_DTYPE, count=count, offset=_STL_HEADER + 4)
+            return MeshData(triangles=records["vertices"], normals=records["normal"])
+    if mm[:5].lower() == b"solid":
+        return _load_stl_ascii(mm)
+    raise ValueError("{} is not valid STL file".format(path))
+
+
+def _load_stl_ascii(mm):
+    numbers = br"\s+([-+0-9.eEinfINFaA]+)\s+([-+0-9.eEinfINFaA]+)\s+([-+0-9.eEinfINFaA]+)"
+    vertices = np.array(re.findall(br"vertex" + numbers, mm), dtype=np.float64).reshape(-1, 3, 3)
+    normals = np.array(re.findall(br"facet\s+normal" + numbers, mm), dtype=np.float64).reshape(-1, 3)
+    return MeshData(triangles=vertices, normals=normals if len(normals) == len(vertices) else None)
+
+
+def write_stl(path, triangles, normals=None, header=b""):
+    """
+    write binary STL
+
+    :param path: str
+    :param triangles: array_like of shape (F, 3, 3)
+    :param normals: array_like of shape (F, 3), computed from vertices if None
+    :param header: bytes, at most 80 bytes
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    if normals is None:
+        normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = normals / np.where(length > 0, length, 1.0)
+    records = np.zeros(len(triangles), dtype=STL_RECORD_DTYPE)
+    records["vertices"], records["normal"] = triangles, normals
+    with open(path, "wb") as f:
+        f.write(header[:_STL_HEADER].ljust(_STL_HEADER, b"\0"))
+        f.write(np.array([len(records)], dtype="<u4").tobytes())
+        records.tofile(f)
+
+
+# OBJ
+# ---
+def load_obj(path):
+    """
+    :param path: str, Wavefront OBJ file, only v, vn and f statements are used
+    :rtype: MeshData, indexed mesh, float64 vertices, polygons are triangulated
+    """
+    mm = _map(path)
+    if mm is None:
+        return MeshData(vertices=np.empty((0, 3)), faces=np.empty((0, 3), dtype=np.int64))
+
+    vertex_tokens, normal_tokens, polygons = [], [], []
+    for line in mm.read().splitlines():
+        # statement is the first word, words are separated by any whitespace
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == b"v":
+            vertex_tokens.append(words[1:])
+        elif words[0] == b"vn":
+            normal_tokens.append(words[1:])
+        elif words[0] == b"f":
+            # indices are 1-based, negative ones are relative to the end of vertex list read so far
+            # (multi-object files), 0 is invalid and it is mapped to -1
+            n = len(vertex_tokens)
+            indices = [int(token.split(b"/")[0]) for token in words[1:]]
+            polygons.append([i - 1 if i > 0 else n + i if i < 0 else -1 for i in indices])
+
+    vertices = _obj_numbers(vertex_tokens)
+    normals = _obj_numbers(normal_tokens) if normal_tokens else None
+
+    if polygons and all(len(p) == 3 for p in polygons):
+        faces = np.array(polygons, dtype=np.int64)
+    else:
+        faces = _fan(polygons)
+    if faces.size and (faces.min() < 0 or faces.max() >= len(vertices)):
+        raise ValueError("face of OBJ file refers to vertex out of range (file has {} vertices)".format(len(vertices)))
+    return MeshData(vertices=vertices, faces=faces, normals=normals)
+
+
+def _obj_numbers(tokens):
+    # first three numbers of every statement, statements may contain optional w or vertex colors
+    if tokens and all(len(t) == len(tokens[0]) for t in tokens):
+        return np.array([word for t in tokens for word in t], dtype=np.float64).reshape(len(tokens), -1)[:, :3]
+    return np.array([t[:3] for t in tokens], dtype=np.float64).reshape(-1, 3)
+
+
+# PLY
+# ---
+def _ply_header(mm):
+    end = mm.find(b"end_header")
+    if not mm[:3] == b"ply" or end < 0:
+        raise ValueError("file is not valid PLY file")
+    body = mm.find(b"\n", end) + 1
+    fmt, elements = None, []
+    for line in mm[:end].decode("ascii").splitlines():
+        words = line.split()
+        if not words or words[0] in ("ply", "comment", "obj_info"):
+            continue
+        if words[0] == "format":
+            fmt = words[1]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1][2].append((words[4], (_PLY_TYPES[words[2]], _PLY_TYPES[words[3]])))
+            else:
+                elements[-1][2].append((words[2], _PLY_TYPES[words[1]]))
+    return fmt, elements, body
+
+
+def load_ply(path):
+    """
+    :param path: str, PLY file (binary little / big endian or ASCII), vertex element (x, y, z and optional
+                 nx, ny, nz) and face element (vertex_indices or vertex_index list) are used
+    :rtype: MeshData, indexed mesh; views of file for binary PLY where layout allows it
+    """
+    mm = _map(path)
+    if mm is None:
+        raise ValueError("{} is empty".format(path))
+    fmt, elements, offset = _ply_header(mm)
+    if fmt == "ascii":
+        return _load_ply_ascii(mm, elements, offset)
+    if fmt not in ("binary_little_endian", "binary_big_endian"):
+        raise ValueError("unknown PLY format {}".format(fmt))
+    order = "<" if fmt == "binary_little_endian" else ">"
+
+    data = {}
+    for name, count, properties in elements:
+        if not any(isinstance(t, tuple) for _, t in properties):
+            dtype = np.dtype([(p, order + t) for p, t in properties])
+            data[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=offset)
+            offset += count * dtype.itemsize
+        else:
+            data[name], offset = _ply_list_element(mm, count, properties, order, offset)
+
+    vertex = data["vertex"]
+    vertices = _vertex_view(vertex, ("x", "y", "z"))
+    normals = _vertex_view(vertex, ("nx", "ny", "nz"))
+    faces = data.get("face", np.empty((0, 3), dtype=np.int64))
+    return MeshData(vertices=vertices, faces=faces, normals=normals)
+
+
+def _ply_list_element(mm, count, properties, order, offset):
+    # element with list property of vertex indices; if all lists are triangles, element has fixed size
+    # and it is viewed as structured array, otherwise it is read item by item
+    fields = []
+    for p, t in properties:
+        if isinstance(t, tuple):
+            fields += [(p + "_count", order + t[0]), (p, order + t[1], (3, ))]
+        else:
+            fields.append((p, order + t))
+    dtype = np.dtype(fields)
+    index = [p for p, t in properties if isinstance(t, tuple) and p in ("vertex_indices", "vertex_index")]
+    index = index[0] if index else [p for p, t in properties if isinstance(t, tuple)][0]
+
+    if offset + count * dtype.itemsize <= len(mm):
+        records = np.frombuffer(mm, dtype=dtype, count=count, offset=offset)
+        if all(np.all(records[p + "_count"] == 3) for p, t in properties if isinstance(t, tuple)):
+            return records[index], offset + count * dtype.itemsize
+
+    polygons = []
+    for _ in range(count):
+        for p, t in properties:
+            if isinstance(t, tuple):
+                n = int(np.frombuffer(mm, dtype=order + t[0], count=1, offset=offset)[0])
+                offset += np.dtype(t[0]).itemsize
+                items = np.frombuffer(mm, dtype=order + t[1], count=n, offset=offset)
+                offset += n * np.dtype(t[1]).itemsize
+                if p == index:
+                    polygons.append(items.tolist())
+            else:
+                offset += np.dtype(t).itemsize
+    return _fan(polygons), offset
+
+
+def _load_ply_ascii(mm, elements, offset):
+    lines = mm[offset:].splitlines()
+    data, start = {}, 0
+    for name, count, properties in elements:
+        rows = [line.split() for line in lines[start:start + count]]
+        start += count
+        if not any(isinstance(t, tuple) for _, t in properties):
+            values = np.array(rows, dtype=np.float64).reshape(count, len(properties))
+            data[name] = {p: values[:, k] for k, (p, _) in enumerate(properties)}
+        else:
+            # list is assumed to be the only property which is not skipped (usual face element)
+            data[name] = _fan([[int(v) for v in row[1:1 + int(row[0])]] for row in rows])
+
+    vertex = data["vertex"]
+    vertices = np.stack([vertex[p] for p in ("x", "y", "z")], axis=1)
+    normals = np.stack([vertex[p] for p in ("nx", "ny", "nz")], axis=1) if "nx" in vertex else None
+    faces = data.get("face", np.empty((0, 3), dtype=np.int64))
+    return MeshData(vertices=vertices, faces=faces, normals=normals)
+
+
+def load_mesh(path):
+    """
+    load mesh by file extension (.stl, .obj, .ply)
+
+    :param path: str
+    :rtype: MeshData
+    """
+    loaders = {".stl": load_stl, ".obj": load_obj, ".ply": load_ply}
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in loaders:
+        raise ValueError("unsupported mesh format {}".format(extension))
+    return loaders[extension](path)
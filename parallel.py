@@ -0,0 +1,148 @@
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+from results import INTERSECTION_PAIR_DTYPE, FACE_PAIR_DTYPE
+from spatial_index import intersecting_edge_pairs, intersecting_face_pairs, record_batches
+from tolerance import get_tolerance, set_tolerance, tolerance
+
+# multi-process all pairs intersection of segments / triangles
+#
+# input arrays are copied to multiprocessing.shared_memory once, workers attach to them by name in pool
+# initializer, so only tile coordinates (i0, i1, j0, j1) are sent to workers and only intersecting pairs
+# are sent back; pair space N x M is split into square tiles, tiles are distributed dynamically
+# (imap_unordered), so load is balanced even if intersections are not spread evenly
+#
+# self test (second array is not given) evaluates only tiles on and above diagonal and pairs i < j
+
+# arrays of worker process, name -> ndarray backed by shared memory
+_shared = {}
+
+
+def _attach(specs, tol):
+    # pool initializer, specs: name -> (shared memory name, shape, dtype), tol: tolerance of calling context
+    set_tolerance(tol)
+    for name, (shm_name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _tile_pairs(tile, self_test):
+    # index grids of tile, i < j only in self test
+    i0, i1, j0, j1 = tile
+    i, j = np.meshgrid(np.arange(i0, i1), np.arange(j0, j1), indexing="ij")
+    if self_test:
+        keep = i < j
+        return i[keep], j[keep]
+    return i.ravel(), j.ravel()
+
+
+def _edge_tile(args):
+    tile, self_test = args
+    edges1 = _shared["a"][1]
+    edges2 = _shared["b"][1] if "b" in _shared else edges1
+    i, j = _tile_pairs(tile, self_test)
+    return intersecting_edge_pairs(edges1, edges2, i, j)
+
+
+def _face_tile(args):
+    tile, self_test = args
+    faces1 = _shared["a"][1]
+    faces2 = _shared["b"][1] if "b" in _shared else faces1
+    i, j = _tile_pairs(tile, self_test)
+    return intersecting_face_pairs(faces1, faces2, i, j)
+
+
+def _tiles(n, m, tile, self_test):
+    for i0 in range(0, n, tile):
+        for j0 in range(i0 if self_test else 0, m, tile):
+            yield (i0, min(i0 + tile, n), j0, min(j0 + tile, m)), self_test
+
+
+def _run(worker, arrays, tile, processes, tol):
+    # generator of results of worker over all tiles, arrays are published in shared memory,
+    # tiles are evaluated under tolerance tol of calling context
+    self_test = "b" not in arrays
+    n = len(arrays["a"])
+    m = n if self_test else len(arrays["b"])
+    tiles = _tiles(n, m, tile, self_test)
+
+    if processes == 1:
+        # in process, without shared memory
+        _shared.clear()
+        _shared.update({name: (None, arr) for name, arr in arrays.items()})
+        try:
+            for args in tiles:
+                with tolerance(tol):
+                    out = worker(args)
+                yield out
+        finally:
+            _shared.clear()
+        return
+
+    blocks, specs = [], {}
+    try:
+        for name, arr in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            specs[name] = (shm.name, arr.shape, arr.dtype.str)
+
+        with mp.Pool(processes=processes, initializer=_attach, initargs=(specs, tol)) as pool:
+            for out in pool.imap_unordered(worker, tiles):
+                yield out
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def _arrays(first, second, shape):
+    arrays = {"a": np.ascontiguousarray(first, dtype=np.float64)}
+    if second is not None:
+        arrays["b"] = np.ascontiguousarray(second, dtype=np.float64)
+    for arr in arrays.values():
+        if arr.ndim != 3 or arr.shape[1:] != shape:
+            raise ValueError("input has to be array of shape (N, {}, {})".format(*shape))
+    return arrays
+
+
+def _results(outs, batch_size, dtype):
+    if batch_size is not None:
+        return record_batches(outs, batch_size, dtype)
+    return (out for out in outs if len(out))
+
+
+def parallel_edge_intersections(edges1, edges2=None, processes=None, tile=1024, batch_size=None):
+    """
+    generator of intersecting segment pairs computed in process pool; all pairs of edges1 x edges2 are tested
+    by edge_intersection_2d_batch(), or pairs i < j of edges1 if edges2 is None
+
+    pairs are reported by spatial_index.intersecting_edge_pairs()
+
+    :param edges1: array_like of shape (N, 2, 2)
+    :param edges2: array_like of shape (M, 2, 2) or None
+    :param processes: int, number of worker processes, default is number of cores, 1 runs in current process
+    :param tile: int, size of square tile of pair space evaluated by one task
+    :param batch_size: int, number of records in yielded arrays, None yields one array per tile
+    :return: generator of ndarray of INTERSECTION_PAIR_DTYPE in order of completion of tiles
+    """
+    outs = _run(_edge_tile, _arrays(edges1, edges2, (2, 2)), tile, processes, get_tolerance())
+    return _results(outs, batch_size, INTERSECTION_PAIR_DTYPE)
+
+
+def parallel_face_intersections(faces1, faces2=None, processes=None, tile=1024, batch_size=None):
+    """
+    generator of intersecting triangle pairs computed in process pool; all pairs of faces1 x faces2 are tested
+    by face_intersection_2d_batch(), or pairs i < j of faces1 if faces2 is None
+
+    :param faces1: array_like of shape (N, 3, 2)
+    :param faces2: array_like of shape (M, 3, 2) or None
+    :param processes: int, number of worker processes, default is number of cores, 1 runs in current process
+    :param tile: int, size of square tile of pair space evaluated by one task
+    :param batch_size: int, number of records in yielded arrays, None yields one array per tile
+    :return: generator of ndarray of FACE_PAIR_DTYPE (code is FaceCode other than NOT_INTERSECTING)
+             in order of completion of tiles
+    """
+    outs = _run(_face_tile, _arrays(faces1, faces2, (3, 2)), tile, processes, get_tolerance())
+    return _results(outs, batch_size, FACE_PAIR_DTYPE)
@@ -1,10 +1,10 @@
 import Plot as Plt
 import numpy as np
+from functools import lru_cache
 
-PRECISION = 10
-
-normal = [[0.1, 0.0, 0.0], [0.0, 0.0, 0.0]]
-point = [[1.2, 1.2, 0.0], [0.32, 0.35, 0.28]]
+from predicates import orient3d_batch
+from tolerance import get_tolerance
+from triangle_mesh import TriangleMesh
 
 
 def line(u, a, b):
@@ -45,19 +45,159 @@ def planeline_intersection(a, b, p, n):
     :rtype: ndarray
     """
     a, b, p, n = np.array(a), np.array(b), np.array(p), np.array(n)
-    if np.dot((b - a), n) != 0:
-        u_intersection = np.dot((p - a), n) / np.dot((b - a), n)
+    # line is parallel with plane if denominator is zero under tolerance of current context,
+    # relative to |b - a| * |n| if scale-aware
+    tol = get_tolerance()
+    denominator = np.dot((b - a), n)
+    if not tol.zero(denominator, (np.linalg.norm(b - a) * np.linalg.norm(n)) if tol.scale_aware else None):
+        u_intersection = np.dot((p - a), n) / denominator
         return line(u_intersection, a, b)
     return False
 
 
+def _line_plane_parameters(a, t, p, n):
+    # parameter u of intersection of lines x = a + u * t, shape (N, 3), with planes (x - p) n = 0;
+    # single plane p, n of shape (3, ) gives (N, ), M planes of shape (M, 3) gives (N, M)
+    a, t = np.asarray(a, dtype=np.float64).reshape(-1, 3), np.asarray(t, dtype=np.float64).reshape(-1, 3)
+    p, n = np.asarray(p, dtype=np.float64), np.asarray(n, dtype=np.float64)
+    if p.shape != n.shape or p.ndim not in (1, 2) or p.shape[-1] != 3:
+        raise ValueError("plane point and normal have to be of shape (3, ) or (M, 3)")
+
+    # (p - a) n = p n - a n
+    denominator = np.dot(t, n.T)
+    numerator = np.einsum("...d,...d->...", p, n) - np.dot(a, n.T)
+    # parallel if denominator is zero under tolerance, see planeline_intersection()
+    tol = get_tolerance()
+    scale = np.multiply.outer(np.linalg.norm(t, axis=-1), np.linalg.norm(n, axis=-1)) if tol.scale_aware else None
+    valid = ~tol.zero(denominator, scale)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = np.where(valid, numerator / np.where(valid, denominator, 1.0), np.nan)
+    return u, valid
+
+
+def planeline_intersection_batch(a, b, p, n):
+    """
+    batched planeline_intersection(), lines are given by two points a, b
+
+    :param a: array_like of shape (N, 3)
+    :param b: array_like of shape (N, 3)
+    :param p: array_like of shape (3, ) or (M, 3), point of plane
+    :param n: array_like of shape (3, ) or (M, 3), normal of plane
+    :return: tuple (points (N, 3) or (N, M, 3), u (N, ) or (N, M), valid mask (N, ) or (N, M)),
+             points and u are numpy.nan where line is parallel with plane
+    """
+    a, b = np.asarray(a, dtype=np.float64).reshape(-1, 3), np.asarray(b, dtype=np.float64).reshape(-1, 3)
+    t = b - a
+    u, valid = _line_plane_parameters(a, t, p, n)
+    if u.ndim == 2:
+        a, t = a[:, np.newaxis], t[:, np.newaxis]
+    return a + (u[..., np.newaxis] * t), u, valid
+
+
+def rayplane_intersection_batch(a, t, p, n):
+    """
+    intersection of rays x = a + u * t, u >= 0 with planes
+
+    :param a: array_like of shape (N, 3), ray origins
+    :param t: array_like of shape (N, 3), ray directions
+    :param p: array_like of shape (3, ) or (M, 3), point of plane
+    :param n: array_like of shape (3, ) or (M, 3), normal of plane
+    :return: tuple (points (N, 3) or (N, M, 3), u (N, ) or (N, M), valid mask (N, ) or (N, M)),
+             points and u are numpy.nan where ray misses plane
+    """
+    a, t = np.asarray(a, dtype=np.float64).reshape(-1, 3), np.asarray(t, dtype=np.float64).reshape(-1, 3)
+    u, valid = _line_plane_parameters(a, t, p, n)
+    valid &= u >= 0
+    u = np.where(valid, u, np.nan)
+    if u.ndim == 2:
+        a, t = a[:, np.newaxis], t[:, np.newaxis]
+    return a + (u[..., np.newaxis] * t), u, valid
+
+
 def to_2d_plane(s1, s2, s3, pt):
     # s1, s2, s3 - orthonormal vectors of reference frame
-    s1, s2, s3, pt = np.array(s1), np.array(s2), np.array(s3), np.array(pt)
-    m = [[np.dot(np.array([1., 0., 0.]), s1), np.dot(np.array([0., 1., 0.]), s1), np.dot(np.array([0., 0., 1.]), s1)],
-         [np.dot(np.array([1., 0., 0.]), s2), np.dot(np.array([0., 1., 0.]), s2), np.dot(np.array([0., 0., 1.]), s2)],
-         [np.dot(np.array([1., 0., 0.]), s3), np.dot(np.array([0., 1., 0.]), s3), np.dot(np.array([0., 0., 1.]), s3)]]
-    return np.dot(m, pt)
+    # rows of transformation matrix are s1, s2, s3 (components of s in standard basis)
+    return np.dot(np.array([s1, s2, s3], dtype=np.float64), np.array(pt))
+
+
+class PlaneFrame(object):
+    # orthonormal reference frame of plane (x - p) n = 0
+    #       s1, s2: orthonormal vectors in plane, s3: unit normal
+    #       3d point x -> 2d point [(x - origin) s1, (x - origin) s2]
+    #       2d point [a, b] -> 3d point origin + a * s1 + b * s2
+    # basis is computed once, projection of (N, 3) array is single matrix multiplication
+    __slots__ = ("origin", "basis")
+
+    def __init__(self, n, p):
+        n, p = np.asarray(n, dtype=np.float64), np.asarray(p, dtype=np.float64)
+        norm = np.linalg.norm(n)
+        if norm == 0:
+            raise ValueError("normal vector of plane cannot be zero vector")
+        s3 = n / norm
+        # cross product with the standard basis vector most perpendicular to normal is never degenerated
+        s1 = np.cross(s3, np.eye(3)[np.argmin(np.abs(s3))])
+        s1 /= np.linalg.norm(s1)
+        s2 = np.cross(s3, s1)
+        self.origin = p
+        self.basis = np.array([s1, s2, s3])
+
+    @property
+    def normal(self):
+        return self.basis[2]
+
+    def project(self, points):
+        """
+        :param points: array_like of shape (N, 3) or (3, )
+        :rtype: ndarray of shape (N, 2) or (2, ), coordinates in plane
+        """
+        return np.dot(np.asarray(points, dtype=np.float64) - self.origin, self.basis[:2].T)
+
+    def to_local(self, points):
+        """
+        :param points: array_like of shape (N, 3) or (3, )
+        :rtype: ndarray of shape (N, 3) or (3, ), coordinates in frame, third one is distance from plane
+        """
+        return np.dot(np.asarray(points, dtype=np.float64) - self.origin, self.basis.T)
+
+    def unproject(self, points):
+        """
+        :param points: array_like of shape (N, 2) or (2, ), coordinates in plane
+        :rtype: ndarray of shape (N, 3) or (3, )
+        """
+        return self.origin + np.dot(np.asarray(points, dtype=np.float64), self.basis[:2])
+
+
+def _plane_key(n, p):
+    # plane identified by unit normal and distance from origin, rounded to decimal places significant under
+    # absolute tolerance of current context (10 by default), not rounded if tolerance is exact
+    n, p = np.asarray(n, dtype=np.float64), np.asarray(p, dtype=np.float64)
+    n = n / np.linalg.norm(n)
+    decimals = get_tolerance().decimals
+    if decimals is None:
+        return tuple(n.tolist()) + (float(np.dot(n, p)), )
+    return tuple(np.round(n, decimals).tolist()) + (round(float(np.dot(n, p)), decimals), )
+
+
+@lru_cache(maxsize=4096)
+def _cached_frame(key):
+    n, d = np.array(key[:3]), key[3]
+    return PlaneFrame(n, n * d)
+
+
+def plane_frame(n, p):
+    """
+    cached PlaneFrame, all faces lying in the same plane share one frame;
+    origin of frame is projection of coordinate system origin to plane
+
+    :param n: array_like of shape (3, ), normal of plane
+    :param p: array_like of shape (3, ), point of plane
+    :rtype: PlaneFrame
+    """
+    return _cached_frame(_plane_key(n, p))
+
+
+def clear_plane_frame_cache():
+    _cached_frame.cache_clear()
 
 
 def get_projection_plane(n, p):
@@ -68,34 +208,195 @@ def get_projection_plane(n, p):
     return np.array(projection_plane)
 
 
-projection_point = line_t(-10, point[0], normal[0])
-normal.append([0, 0, 0])
-point.append(projection_point)
+# segment / ray - triangle intersection (Moller, Trumbore, Fast, Minimum Storage Ray / Triangle Intersection, 1997)
+#
+# point of line x = a + t * d is expressed in barycentric coordinates of triangle (v0, v1, v2)
+#       a + t * d = v0 + u * e1 + v * e2,  e1 = v1 - v0, e2 = v2 - v0
+# and the system is solved by Cramer's rule with scalar triple products
+#       p = d x e2,  det = e1 . p,  s = a - v0,  q = s x e1
+#       u = s . p / det,  v = d . q / det,  t = e2 . q / det
+# so plane intersection, projection and point in triangle test are single pass without intermediate arrays;
+# hit if det is not zero, u >= 0, v >= 0, u + v <= 1 (edges included) and 0 <= t <= 1 for segments
+# (d = b - a), t >= 0 for rays
+#
+# det is triple product (length ** 3), it is zero (line parallel to plane of triangle) if
+#       |det| <= relative * |d| * |e1| * |e2|
+# with relative tolerance of current context; absolute tolerance is not used, it would reject every pair
+# of small triangles (det of triangle of size 1e-6 is about 1e-12); robust hits are decided by exact signs
+# of orient3d and t, u, v of them are divided by det itself
+#
+# all pairs of N lines and M triangles are evaluated in chunks of rows of about _CHUNK pairs, so temporary
+# arrays stay small whatever N and M are
+
+_CHUNK = 1 << 16
+
+
+def _moller_trumbore(a, d, v0, e1, e2, t_max, robust=False):
+    # arrays of shape (..., 3) broadcastable against each other, returns hit, t, u, v of broadcast shape;
+    # robust: t, u, v are computed for every det other than exact zero (hit is decided by caller),
+    #         they are numpy.nan where det is zero
+    dx, dy, dz = d[..., 0], d[..., 1], d[..., 2]
+    ax, ay, az = e1[..., 0], e1[..., 1], e1[..., 2]
+    bx, by, bz = e2[..., 0], e2[..., 1], e2[..., 2]
+    px, py, pz = dy * bz - dz * by, dz * bx - dx * bz, dx * by - dy * bx
+    det = ax * px + ay * py + az * pz
+
+    if robust:
+        valid = det != 0
+    else:
+        # norms of lines and of triangle edges are computed separately and broadcast
+        scale = np.linalg.norm(d, axis=-1) * (np.linalg.norm(e1, axis=-1) * np.linalg.norm(e2, axis=-1))
+        valid = np.abs(det) > get_tolerance().relative_limit(scale)
+    inverse = 1.0 / np.where(valid, det, 1.0)
+
+    sx, sy, sz = a[..., 0] - v0[..., 0], a[..., 1] - v0[..., 1], a[..., 2] - v0[..., 2]
+    u = (sx * px + sy * py + sz * pz) * inverse
+    qx, qy, qz = sy * az - sz * ay, sz * ax - sx * az, sx * ay - sy * ax
+    v = (dx * qx + dy * qy + dz * qz) * inverse
+    t = (bx * qx + by * qy + bz * qz) * inverse
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0) & (t <= t_max)
+    if robust:
+        t, u, v = np.where(valid, t, np.nan), np.where(valid, u, np.nan), np.where(valid, v, np.nan)
+    return hit, t, u, v
+
+
+def _exact_segment_hit(a, b, v0, v1, v2):
+    # segment ab crosses or touches triangle, decided by signs of orient3d (exact), coplanar segments excluded
+    sa, sb = orient3d_batch(v0, v1, v2, a), orient3d_batch(v0, v1, v2, b)
+    s1, s2, s3 = orient3d_batch(a, b, v0, v1), orient3d_batch(a, b, v1, v2), orient3d_batch(a, b, v2, v0)
+    opposite = (sa * sb <= 0) & ~((sa == 0) & (sb == 0))
+    inside = ((s1 >= 0) & (s2 >= 0) & (s3 >= 0)) | ((s1 <= 0) & (s2 <= 0) & (s3 <= 0))
+    return opposite & inside
+
+
+def _line_triangle_chunks(a, d, triangles, all_pairs, t_max, robust):
+    # generator of (rows, hit, t, u, v) for chunks of rows of lines
+    a, d = np.asarray(a, dtype=np.float64).reshape(-1, 3), np.asarray(d, dtype=np.float64).reshape(-1, 3)
+    if isinstance(triangles, TriangleMesh):
+        # cached edge vectors, v2 - v0 is exactly -(v0 - v2)
+        e1, e2 = triangles.edges[:, 0], -triangles.edges[:, 2]
+        triangles = triangles.triangles.reshape(-1, 3, 3)
+    else:
+        triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        e1, e2 = triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+    v0 = triangles[:, 0]
+
+    if not all_pairs:
+        if len(a) != len(triangles):
+            raise ValueError("number of lines and triangles has to be the same if all_pairs is False")
+        chunks = [(slice(None), a, d)]
+    else:
+        size = max(_CHUNK // max(len(triangles), 1), 1)
+        chunks = [(slice(k, k + size), a[k:k + size, np.newaxis], d[k:k + size, np.newaxis])
+                  for k in range(0, len(a), size)]
+
+    for rows, a_, d_ in chunks:
+        hit, t, u, v = _moller_trumbore(a_, d_, v0, e1, e2, t_max, robust)
+        if robust:
+            hit = _exact_segment_hit(a_, a_ + d_, triangles[:, 0], triangles[:, 1], triangles[:, 2])
+        yield rows, hit, t, u, v
+
+
+def _line_triangle(a, d, triangles, all_pairs, t_max, robust):
+    n, m = len(np.reshape(a, (-1, 3))), len(np.reshape(triangles, (-1, 3, 3)))
+    shape = (n, m) if all_pairs else (n, )
+    hit, t, barycentric = np.empty(shape, dtype=bool), np.empty(shape), np.empty(shape + (3, ))
+    for rows, h, t_, u, v in _line_triangle_chunks(a, d, triangles, all_pairs, t_max, robust):
+        hit[rows], t[rows] = h, np.where(h, t_, np.nan)
+        barycentric[rows] = np.where(h[..., np.newaxis], np.stack((1.0 - u - v, u, v), axis=-1), np.nan)
+    return hit, t, barycentric
+
+
+def segment_triangle_intersection_batch(a, b, triangles, all_pairs=True, robust=False):
+    """
+    fused segment - triangle intersection in 3d
+
+    :param a: array_like of shape (N, 3), start points of segments
+    :param b: array_like of shape (N, 3), end points of segments
+    :param triangles: array_like of shape (M, 3, 3) or TriangleMesh (its cached edge vectors are used)
+    :param all_pairs: bool, True: every segment against every triangle, results of shape (N, M);
+                      False: segment k against triangle k (N == M), results of shape (N, )
+    :param robust: bool, hit is decided by exact orient3d signs instead of tolerance (t and barycentric
+                   coordinates are floating point values divided by det itself, numpy.nan in the rare case
+                   of det rounded to exact zero)
+    :return: tuple (hit, t, barycentric), hit is mask of intersecting pairs (touching included, coplanar
+             segments excluded), intersection point is a + t * (b - a) = barycentric . triangle vertices,
+             t and barycentric (shape (..., 3)) are numpy.nan where pair does not intersect
+    """
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 3)
+    d = np.asarray(b, dtype=np.float64).reshape(-1, 3) - a
+    return _line_triangle(a, d, triangles, all_pairs, 1.0, robust)
+
+
+def ray_triangle_intersection_batch(a, t, triangles, all_pairs=True):
+    """
+    fused ray - triangle intersection in 3d, rays x = a + u * t, u >= 0
+
+    :param a: array_like of shape (N, 3), ray origins
+    :param t: array_like of shape (N, 3), ray directions
+    :param triangles: array_like of shape (M, 3, 3)
+    :param all_pairs: bool, see segment_triangle_intersection_batch()
+    :return: tuple (hit, u, barycentric), see segment_triangle_intersection_batch()
+    """
+    return _line_triangle(a, t, triangles, all_pairs, np.inf, False)
+
+
+def ray_triangle_first_hit(a, t, triangles):
+    """
+    nearest triangle hit by every ray (picking)
+
+    :param a: array_like of shape (N, 3), ray origins
+    :param t: array_like of shape (N, 3), ray directions
+    :param triangles: array_like of shape (M, 3, 3)
+    :return: tuple (index (N, ) of nearest hit triangle or -1, ray parameter u (N, ) of hit or numpy.nan)
+    """
+    n = len(np.reshape(a, (-1, 3)))
+    index, nearest = np.full(n, -1, dtype=np.int64), np.full(n, np.nan)
+    for rows, hit, u, _, _ in _line_triangle_chunks(a, t, triangles, True, np.inf, False):
+        distance = np.where(hit, u, np.inf)
+        if not distance.shape[1]:
+            break
+        k = np.argmin(distance, axis=1)
+        d = distance[np.arange(len(k)), k]
+        found = np.isfinite(d)
+        index[rows], nearest[rows] = np.where(found, k, -1), np.where(found, d, np.nan)
+    return index, nearest
+
+
+def main():
+    normal = [[0.1, 0.0, 0.0], [0.0, 0.0, 0.0]]
+    point = [[1.2, 1.2, 0.0], [0.32, 0.35, 0.28]]
 
-intersection = planeline_intersection(point[-1], point[1], point[0], normal[0])
-normal.append([0, 0, 0])
-point.append(intersection)
+    projection_point = line_t(-10, point[0], normal[0])
+    normal.append([0, 0, 0])
+    point.append(projection_point)
 
-pp = get_projection_plane(normal[0], point[0])
+    intersection = planeline_intersection(point[-1], point[1], point[0], normal[0])
+    normal.append([0, 0, 0])
+    point.append(intersection)
 
-ref1, ref3 = (pp[0] - pp[1]) / (np.linalg.norm(pp[0] - pp[1])), normal[0] / np.linalg.norm(normal[0])
-ref2 = np.cross(ref1, ref3) / np.linalg.norm(np.cross(ref1, ref3))
+    pp = get_projection_plane(normal[0], point[0])
 
-print(to_2d_plane(ref1, ref2, ref3, intersection - point[0]))
+    frame = PlaneFrame(normal[0], point[0])
+    ref1, ref2, ref3 = frame.basis
 
-normal.append(ref1)
-normal.append(ref2)
+    print(frame.project(intersection))
 
-point.append(point[0])
-point.append(point[0])
+    normal.append(ref1)
+    normal.append(ref2)
 
-normal[0] = ref3
-normal = Plt.vector_array_translation(vector_arr=normal, translation_arr=point)
-# print(intersection)
-# print(to_plane())
+    point.append(point[0])
+    point.append(point[0])
 
+    normal[0] = ref3
+    normal = Plt.vector_array_translation(vector_arr=normal, translation_arr=point)
+    # print(intersection)
+    # print(to_plane())
 
+    Plt.plot_3d(faces=[[pp]], vertices=[point], normals=[normal], faces_view=True, normals_view=True,
+                points_view=True, face_color=[["r", "g"]], point_color=["r", "g", "b", "k"], face_alpha=0.5,
+                azim=-90, elev=90, point_size=20)
 
 
-Plt.plot_3d(faces=[[pp]], vertices=[point], normals=[normal], faces_view=True, normals_view=True, points_view=True,
-            face_color=[["r", "g"]], point_color=["r", "g", "b", "k"], face_alpha=0.5, azim=-90, elev=90, point_size=20)
+if __name__ == "__main__":
+    main()
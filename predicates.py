@@ -0,0 +1,256 @@
+import numpy as np
+from fractions import Fraction
+
+# adaptive orientation predicates (J. R. Shewchuk, Adaptive Precision Floating-Point Arithmetic and Fast Robust
+# Geometric Predicates, 1997)
+#
+# orient2d(a, b, c) = (b - a) x (c - a), positive if c is left of directed line ab (a, b, c counterclockwise),
+# zero if points are collinear; sign is exact for any float64 input
+#
+# determinant is evaluated in floating point first together with its error bound
+#       det = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+#       |error| <= CCW_ERRBOUND * (|(bx - ax) * (cy - ay)| + |(by - ay) * (cx - ax)|)
+# if |det| is greater than the bound, its sign is correct (filtered path, almost every call), otherwise
+# determinant is evaluated again in exact rational arithmetic (every float is exact fraction)
+#
+# cross(p1, p2, p3, p4) = (p2 - p1) x (p4 - p3) is the same determinant for two segments, with the same bound,
+# its sign is zero only for exactly parallel segments
+#
+# orient3d(a, b, c, d) is positive if d is below plane through a, b, c (a, b, c are counterclockwise viewed
+# from above), same scheme with O3D_ERRBOUND
+#
+# bounds are valid if no underflow occurs, so inputs with tiny terms go to exact path as well
+#
+# batched cross() tests uncertain items first whether differences and products are exact in floating point
+# (error terms of Knuth two-sum and Dekker two-product are zero, typical for coordinates on a grid), then
+# det = left - right is correctly rounded exact value and rational arithmetic is not needed
+
+_EPSILON = np.finfo(np.float64).eps / 2.0
+CCW_ERRBOUND = (3.0 + 16.0 * _EPSILON) * _EPSILON
+O3D_ERRBOUND = (7.0 + 56.0 * _EPSILON) * _EPSILON
+# terms smaller than this may have lost precision by underflow
+_TINY = 2.0 ** -900
+_DENORMAL = 2.0 ** -1074
+# Dekker splitting of float64 in two halves of 26 bits, valid for factors of magnitude in (_SPLIT_MIN, _SPLIT_MAX)
+_SPLITTER = 2.0 ** 27 + 1.0
+_SPLIT_MIN, _SPLIT_MAX = 2.0 ** -400, 2.0 ** 400
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+def _to_float(value):
+    # rounded exact value, nonzero value underflowing to zero keeps at least its sign
+    rounded = float(value)
+    if rounded == 0 and value != 0:
+        return _DENORMAL if value > 0 else -_DENORMAL
+    return rounded
+
+
+def _exact_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    # (b - a) x (d - c) in rational arithmetic
+    ax, ay, bx, by = Fraction(float(ax)), Fraction(float(ay)), Fraction(float(bx)), Fraction(float(by))
+    cx, cy, dx, dy = Fraction(float(cx)), Fraction(float(cy)), Fraction(float(dx)), Fraction(float(dy))
+    return ((bx - ax) * (dy - cy)) - ((by - ay) * (dx - cx))
+
+
+def _exact_orient3d(a, b, c, d):
+    adx, ady, adz = (Fraction(float(a[k])) - Fraction(float(d[k])) for k in range(3))
+    bdx, bdy, bdz = (Fraction(float(b[k])) - Fraction(float(d[k])) for k in range(3))
+    cdx, cdy, cdz = (Fraction(float(c[k])) - Fraction(float(d[k])) for k in range(3))
+    return adz * ((bdx * cdy) - (cdx * bdy)) + bdz * ((cdx * ady) - (adx * cdy)) + cdz * ((adx * bdy) - (bdx * ady))
+
+
+def _filtered(left, right):
+    # sign of left - right if floating point evaluation is certain, None otherwise
+    if left > _TINY:
+        if right <= 0:
+            # no cancellation
+            return 1
+    elif left < -_TINY:
+        if right >= 0:
+            return -1
+    det = left - right
+    detsum = abs(left) + abs(right)
+    if abs(det) > CCW_ERRBOUND * detsum and detsum > _TINY:
+        return 1 if det > 0 else -1 if det < 0 else 0
+    return None
+
+
+def cross(p1, p2, p3, p4):
+    """
+    cross product (p2 - p1) x (p4 - p3) with exact sign, zero only for parallel segments p1p2 and p3p4;
+    value is floating point approximation (exactly rounded on exact path)
+
+    :param p1: point [x, y], same for p2, p3, p4
+    :rtype: float
+    """
+    left, right = (p2[0] - p1[0]) * (p4[1] - p3[1]), (p2[1] - p1[1]) * (p4[0] - p3[0])
+    if _filtered(left, right) is not None:
+        return float(left - right)
+    return _to_float(_exact_cross(p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]))
+
+
+def cross_sign(p1, p2, p3, p4):
+    """
+    exact sign of cross product (p2 - p1) x (p4 - p3), zero for parallel segments p1p2 and p3p4
+
+    :param p1: point [x, y], same for p2, p3, p4
+    :rtype: int, -1, 0 or 1
+    """
+    left, right = (p2[0] - p1[0]) * (p4[1] - p3[1]), (p2[1] - p1[1]) * (p4[0] - p3[0])
+    sign = _filtered(left, right)
+    if sign is not None:
+        return sign
+    return _sign(_exact_cross(p1[0], p1[1], p2[0], p2[1], p3[0], p3[1], p4[0], p4[1]))
+
+
+def orient2d(a, b, c):
+    """
+    exact sign of (b - a) x (c - a)
+
+    :param a: point [x, y], same for b, c
+    :rtype: int, 1 if c is left of ab, -1 if right, 0 if collinear
+    """
+    ax, ay = a[0], a[1]
+    left, right = (b[0] - ax) * (c[1] - ay), (b[1] - ay) * (c[0] - ax)
+    sign = _filtered(left, right)
+    if sign is not None:
+        return sign
+    return _sign(_exact_cross(ax, ay, b[0], b[1], ax, ay, c[0], c[1]))
+
+
+def orient3d(a, b, c, d):
+    """
+    exact sign of orientation of d against plane through a, b, c
+
+    :param a: point [x, y, z], same for b, c, d
+    :rtype: int, 1 if d is below plane (a, b, c counterclockwise viewed from above), -1 if above, 0 if coplanar
+    """
+    adx, ady, adz = a[0] - d[0], a[1] - d[1], a[2] - d[2]
+    bdx, bdy, bdz = b[0] - d[0], b[1] - d[1], b[2] - d[2]
+    cdx, cdy, cdz = c[0] - d[0], c[1] - d[1], c[2] - d[2]
+    bdxcdy, cdxbdy = bdx * cdy, cdx * bdy
+    cdxady, adxcdy = cdx * ady, adx * cdy
+    adxbdy, bdxady = adx * bdy, bdx * ady
+    det = adz * (bdxcdy - cdxbdy) + bdz * (cdxady - adxcdy) + cdz * (adxbdy - bdxady)
+    permanent = (abs(bdxcdy) + abs(cdxbdy)) * abs(adz) + (abs(cdxady) + abs(adxcdy)) * abs(bdz) + \
+        (abs(adxbdy) + abs(bdxady)) * abs(cdz)
+    if abs(det) > O3D_ERRBOUND * permanent and permanent > _TINY:
+        return 1 if det > 0 else -1
+    return _sign(_exact_orient3d(a, b, c, d))
+
+
+def _diff_tail(a, b, x):
+    # a - b - x for x = fl(a - b), exact (Knuth two-sum)
+    b_virtual = a - x
+    a_virtual = x + b_virtual
+    return (a - a_virtual) + (b_virtual - b)
+
+
+def _split(a):
+    c = _SPLITTER * a
+    high = c - (c - a)
+    return high, a - high
+
+
+def _product_tail(a, b, x):
+    # a * b - x for x = fl(a * b), exact if factors are zero or in (_SPLIT_MIN, _SPLIT_MAX) (Dekker two-product)
+    a_high, a_low = _split(a)
+    b_high, b_low = _split(b)
+    return (a_low * b_low) - (((x - (a_high * b_high)) - (a_low * b_high)) - (a_high * b_low))
+
+
+def _exact_cross_terms(p1, p2, p3, p4):
+    # True where differences and products of cross() are exact in floating point, p1 ... p4 of shape (K, 2)
+    with np.errstate(over="ignore", invalid="ignore"):
+        dx1, dy1 = p2[:, 0] - p1[:, 0], p2[:, 1] - p1[:, 1]
+        dx2, dy2 = p4[:, 0] - p3[:, 0], p4[:, 1] - p3[:, 1]
+        exact = (_diff_tail(p2[:, 0], p1[:, 0], dx1) == 0) & (_diff_tail(p2[:, 1], p1[:, 1], dy1) == 0) & \
+            (_diff_tail(p4[:, 0], p3[:, 0], dx2) == 0) & (_diff_tail(p4[:, 1], p3[:, 1], dy2) == 0)
+        for a, b in ((dx1, dy2), (dy1, dx2)):
+            magnitude = np.minimum(np.abs(a), np.abs(b))
+            zero = magnitude == 0
+            split = (magnitude > _SPLIT_MIN) & (np.maximum(np.abs(a), np.abs(b)) < _SPLIT_MAX)
+            exact &= zero | (split & (_product_tail(a, b, a * b) == 0))
+    return exact
+
+
+def cross_batch(p1, p2, p3, p4):
+    """
+    vectorized cross(), exact arithmetic is used only for items with uncertain floating point sign
+
+    :param p1: array_like of shape (..., 2), same for p2, p3, p4 (broadcastable against each other)
+    :rtype: ndarray of float64
+    """
+    p1, p2 = np.asarray(p1, dtype=np.float64), np.asarray(p2, dtype=np.float64)
+    p3, p4 = np.asarray(p3, dtype=np.float64), np.asarray(p4, dtype=np.float64)
+    # differences are not multiplied in place, p1, p2 and p3, p4 may broadcast to different shapes;
+    # products depend on all four inputs, so they have the shape of det
+    left = (p2[..., 0] - p1[..., 0]) * (p4[..., 1] - p3[..., 1])
+    right = (p2[..., 1] - p1[..., 1]) * (p4[..., 0] - p3[..., 0])
+    det = left - right
+
+    # |det| > max(bound, _TINY) implies detsum > _TINY, buffers of products are reused for the bound
+    bound = np.abs(left, out=left)
+    bound += np.abs(right, out=right)
+    bound *= CCW_ERRBOUND
+    np.maximum(bound, _TINY, out=bound)
+    uncertain = np.abs(det, out=right) <= bound
+    if uncertain.any():
+        shape = det.shape
+        p1, p2, p3, p4 = [np.broadcast_to(p, shape + (2, ))[uncertain] for p in (p1, p2, p3, p4)]
+        # items with exact terms keep their det, the rest is evaluated in rational arithmetic
+        inexact = ~_exact_cross_terms(p1, p2, p3, p4)
+        uncertain[uncertain] = inexact
+        p1, p2, p3, p4 = [p[inexact].tolist() for p in (p1, p2, p3, p4)]
+        det[uncertain] = [_to_float(_exact_cross(a[0], a[1], b[0], b[1], c[0], c[1], d[0], d[1]))
+                          for a, b, c, d in zip(p1, p2, p3, p4)]
+    return det
+
+
+def cross_sign_batch(p1, p2, p3, p4):
+    """
+    vectorized cross_sign()
+
+    :param p1: array_like of shape (..., 2), same for p2, p3, p4 (broadcastable against each other)
+    :rtype: ndarray of int8
+    """
+    return np.sign(cross_batch(p1, p2, p3, p4)).astype(np.int8)
+
+
+def orient2d_batch(a, b, c):
+    """
+    vectorized orient2d()
+
+    :param a: array_like of shape (..., 2), same for b, c (broadcastable against each other)
+    :rtype: ndarray of int8
+    """
+    return cross_sign_batch(a, b, a, c)
+
+
+def orient3d_batch(a, b, c, d):
+    """
+    vectorized orient3d()
+
+    :param a: array_like of shape (..., 3), same for b, c, d (broadcastable against each other)
+    :rtype: ndarray of int8
+    """
+    a, b = np.asarray(a, dtype=np.float64), np.asarray(b, dtype=np.float64)
+    c, d = np.asarray(c, dtype=np.float64), np.asarray(d, dtype=np.float64)
+    ad, bd, cd = a - d, b - d, c - d
+    bdxcdy, cdxbdy = bd[..., 0] * cd[..., 1], cd[..., 0] * bd[..., 1]
+    cdxady, adxcdy = cd[..., 0] * ad[..., 1], ad[..., 0] * cd[..., 1]
+    adxbdy, bdxady = ad[..., 0] * bd[..., 1], bd[..., 0] * ad[..., 1]
+    det = ad[..., 2] * (bdxcdy - cdxbdy) + bd[..., 2] * (cdxady - adxcdy) + cd[..., 2] * (adxbdy - bdxady)
+    permanent = (np.abs(bdxcdy) + np.abs(cdxbdy)) * np.abs(ad[..., 2]) + \
+        (np.abs(cdxady) + np.abs(adxcdy)) * np.abs(bd[..., 2]) + (np.abs(adxbdy) + np.abs(bdxady)) * np.abs(cd[..., 2])
+    sign = np.sign(det).astype(np.int8)
+
+    uncertain = ~((np.abs(det) > O3D_ERRBOUND * permanent) & (permanent > _TINY))
+    if uncertain.any():
+        shape = det.shape
+        a, b, c, d = [np.broadcast_to(p, shape + (3, ))[uncertain].tolist() for p in (a, b, c, d)]
+        sign[uncertain] = [_sign(_exact_orient3d(*points)) for points in zip(a, b, c, d)]
+    return sign
@@ -0,0 +1,363 @@
+import json
+import sys
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+import numpy as np
+
+from results import EdgeCode, SegmentCode, FaceCode
+
+# opt-in instrumentation of primitives
+#
+# nothing in the library is instrumented, profiling() replaces instrumented functions by counting wrappers
+# on enter and puts original functions back on exit, so there is no cost (not even a flag test) when it is
+# not active
+#
+#       with profiling() as profile:
+#           mesh_self_intersection(vertices, faces)
+#       print(profile.report())
+#       profile.dump("profile.json")
+#
+# for every function it records
+#       calls:     number of calls
+#       time:      seconds spent in function, including instrumented functions called from it
+#       own:       seconds spent in function itself (time of instrumented callees subtracted)
+#       pairs:     number of items processed by batched kernels (pairs of primitives), number of candidate
+#                  pairs produced by broad phase
+#       total:     number of all pairs broad phase has culled from (e.g. n * (n - 1) / 2 for self test),
+#                  pairs / total is fraction of pairs which survived culling
+#       outcomes:  distribution of results by code (PARALLEL, INTERSECTING, TOUCHING, ...) or by sign of
+#                  predicate
+#
+# wrappers are put to every module which holds original function (so names bound by from ... import ... are
+# instrumented too) and only modules already imported are instrumented (profiling() does not import matplotlib);
+# worker processes of parallel.py / Plot.render_scenes() are not instrumented; profiling is not thread-safe,
+# only one profile can be active at a time
+
+_active = None
+
+
+class _Stats(object):
+    __slots__ = ("calls", "time", "own", "pairs", "total", "outcomes")
+
+    def __init__(self):
+        self.calls = 0
+        self.time = self.own = 0.0
+        self.pairs = self.total = 0
+        self.outcomes = {}
+
+    def count(self, outcome, n=1):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + n
+
+    def count_codes(self, codes, code_type):
+        codes = np.asarray(codes).ravel()
+        self.pairs += codes.size
+        values, counts = np.unique(codes, return_counts=True)
+        for value, n in zip(values.tolist(), counts.tolist()):
+            self.count(code_type(value).name, n)
+
+    def count_mask(self, mask, positive="INTERSECTING", negative="NOT_INTERSECTING"):
+        mask = np.asarray(mask, dtype=bool)
+        hits = int(np.count_nonzero(mask))
+        self.pairs += mask.size
+        self.count(positive, hits)
+        self.count(negative, mask.size - hits)
+
+    def as_dict(self):
+        return {"calls": self.calls, "time": self.time, "own": self.own, "pairs": self.pairs, "total": self.total,
+                "outcomes": dict(self.outcomes)}
+
+
+# outcome recorders, called with (stats, args, kwargs, result) after every call
+
+def _code(stats, args, kwargs, result):
+    # EdgeResult, CodeResult
+    stats.count(result.code.name)
+
+
+def _sign(stats, args, kwargs, result):
+    stats.count("POSITIVE" if result > 0 else "NEGATIVE" if result < 0 else "ZERO")
+
+
+def _bool(stats, args, kwargs, result):
+    stats.count("TRUE" if result else "FALSE")
+
+
+def _signs(stats, args, kwargs, result):
+    signs = np.sign(np.asarray(result)).ravel()
+    stats.pairs += signs.size
+    for name, value in (("NEGATIVE", -1), ("ZERO", 0), ("POSITIVE", 1)):
+        stats.count(name, int(np.count_nonzero(signs == value)))
+
+
+def _edge_records(stats, args, kwargs, result):
+    stats.count_codes(result["code"], EdgeCode)
+
+
+def _segment_codes(stats, args, kwargs, result):
+    stats.count_codes(result, SegmentCode)
+
+
+def _face_codes(stats, args, kwargs, result):
+    stats.count_codes(result, FaceCode)
+
+
+def _mask(stats, args, kwargs, result):
+    stats.count_mask(result)
+
+
+def _first_mask(stats, args, kwargs, result):
+    # (hit, t, barycentric) of Moller-Trumbore kernels
+    stats.count_mask(result[0], "HIT", "MISS")
+
+
+def _pair_records(code_type, rejected):
+    # intersecting_*_pairs(first, second, i, j), records of intersecting pairs out of len(i) candidates
+    def record(stats, args, kwargs, result):
+        candidates = len(args[2] if len(args) > 2 else kwargs["i"])
+        stats.count_codes(result["code"], code_type)
+        stats.pairs += candidates - len(result)
+        stats.count(rejected, candidates - len(result))
+    return record
+
+
+def _found(stats, args, kwargs, result):
+    # number of reported pairs / polygons
+    stats.count("FOUND", len(result))
+
+
+# broad phase generators, (total of call, size of yielded item)
+
+def _index_total(args, kwargs):
+    n = len(args[0])
+    return n * (n - 1) // 2
+
+
+def _bvh_total(args, kwargs):
+    a, b = args[0], args[1]
+    if args[2:3] == (True, ) or kwargs.get("self_test"):
+        return a.n_triangles * (a.n_triangles - 1) // 2
+    return a.n_triangles * b.n_triangles
+
+
+def _one(item):
+    return 1
+
+
+def _chunk(item):
+    return len(item[0])
+
+
+# (module, attribute, recorder), attribute of class is given as Class.method; generators are given by
+# (total, size) tuple instead of recorder
+_TARGETS = [
+    ("predicates", "cross", _sign),
+    ("predicates", "orient2d", _sign),
+    ("predicates", "orient3d", _sign),
+    ("predicates", "cross_batch", _signs),
+    ("predicates", "orient2d_batch", _signs),
+    ("predicates", "orient3d_batch", _signs),
+    ("face_intersection", "side", _sign),
+    ("face_intersection", "same_side", _bool),
+    ("face_intersection", "point_in_triangle", _bool),
+    ("edge_intersection", "edge_intersection_2d", _code),
+    ("edge_intersection", "edge_intersection_2d_batch", _edge_records),
+    ("face_intersection", "segment_intersection_2d", _code),
+    ("face_intersection", "segment_intersection_2d_batch", _segment_codes),
+    ("face_intersection", "face_intersection_2d", _code),
+    ("face_intersection", "face_intersection_2d_batch", _face_codes),
+    ("spatial_index", "UniformGrid.candidate_pairs", (_index_total, _one)),
+    ("spatial_index", "QuadTree.candidate_pairs", (_index_total, _one)),
+    ("spatial_index", "intersecting_edge_pairs", _pair_records(EdgeCode, "NOT_INTERSECTING")),
+    ("spatial_index", "intersecting_segment_triangle_pairs",
+     _pair_records(SegmentCode, SegmentCode.NOT_INTERSECTING.name)),
+    ("spatial_index", "intersecting_face_pairs", _pair_records(FaceCode, FaceCode.NOT_INTERSECTING.name)),
+    ("sweep_line", "sweep_intersections", _found),
+    ("mesh_intersection", "candidate_pairs", (_bvh_total, _chunk)),
+    ("mesh_intersection", "triangle_intersection_3d", _mask),
+    ("mesh_intersection", "mesh_intersection", _found),
+    ("mesh_intersection", "mesh_self_intersection", _found),
+    ("plane_line_3d_intesection", "segment_triangle_intersection_batch", _first_mask),
+    ("plane_line_3d_intesection", "ray_triangle_intersection_batch", _first_mask),
+    ("clipping", "clip_convex", None),
+    ("clipping", "clip_polygons", _found),
+    ("clipping", "clip_triangle_pairs", None),
+    ("Plot", "plot_2d", None),
+    ("Plot", "plot_3d", None),
+    ("Plot", "SceneRenderer.render", None),
+]
+
+
+class Profile(object):
+    def __init__(self):
+        self.stats = {}
+        self.elapsed = 0.0
+        # time of instrumented callees of every running call, for own time
+        self._stack = []
+        self._patches = []
+
+    def _entry(self, name):
+        return self.stats.setdefault(name, _Stats())
+
+    def _call(self, function, stats, recorder):
+        stack = self._stack
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            stack.append(0.0)
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as e:
+                stats.count(type(e).__name__)
+                raise
+            finally:
+                elapsed = perf_counter() - start
+                inner = stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+                stats.calls += 1
+                stats.time += elapsed
+                stats.own += elapsed - inner
+            if recorder is not None:
+                recorder(stats, args, kwargs, result)
+            return result
+        return wrapper
+
+    def _generator(self, function, stats, total, size):
+        # time of generator is time spent in its steps
+        stack = self._stack
+
+        def steps(iterator):
+            while True:
+                stack.append(0.0)
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = perf_counter() - start
+                    inner = stack.pop()
+                    if stack:
+                        stack[-1] += elapsed
+                    stats.time += elapsed
+                    stats.own += elapsed - inner
+                stats.pairs += size(item)
+                yield item
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            stats.calls += 1
+            stats.total += total(args, kwargs)
+            return steps(function(*args, **kwargs))
+        return wrapper
+
+    def _install(self, include=None):
+        originals = {}
+        for module_name, attribute, recorder in _TARGETS:
+            name = "{}.{}".format(module_name, attribute)
+            module = sys.modules.get(module_name)
+            if module is None or (include is not None and not any(name.startswith(i) for i in include)):
+                continue
+            stats = self._entry(name)
+            if "." in attribute:
+                # method, patched in class only
+                class_name, method = attribute.split(".")
+                owner = getattr(module, class_name)
+                function = owner.__dict__[method]
+                self._patch(owner, method, self._wrap(function, stats, recorder))
+            else:
+                function = getattr(module, attribute)
+                originals[id(function)] = function, self._wrap(function, stats, recorder)
+
+        # every binding of original function in imported modules
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, "__dict__", None)
+            if not isinstance(namespace, dict):
+                continue
+            for key, value in list(namespace.items()):
+                found = originals.get(id(value))
+                if found is not None and found[0] is value:
+                    self._patch(module, key, found[1])
+
+    def _wrap(self, function, stats, recorder):
+        if isinstance(recorder, tuple):
+            return self._generator(function, stats, *recorder)
+        return self._call(function, stats, recorder)
+
+    def _patch(self, owner, key, wrapper):
+        self._patches.append((owner, key, owner.__dict__[key]))
+        setattr(owner, key, wrapper)
+
+    def _uninstall(self):
+        while self._patches:
+            owner, key, original = self._patches.pop()
+            setattr(owner, key, original)
+
+    def as_dict(self):
+        """
+        :rtype: dict, {"elapsed": seconds, "functions": {name: {calls, time, own, pairs, total, outcomes}}},
+                only called functions are included
+        """
+        return {"elapsed": self.elapsed,
+                "functions": {name: stats.as_dict() for name, stats in self.stats.items() if stats.calls}}
+
+    def dump(self, path):
+        """
+        write as_dict() as json file
+
+        :param path: str
+        """
+        with open(path, "w") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def report(self, sort="own"):
+        """
+        text table of called functions
+
+        :param sort: str, column to sort by (calls, time, own, pairs)
+        :rtype: str
+        """
+        called = sorted(((name, stats) for name, stats in self.stats.items() if stats.calls),
+                        key=lambda item: getattr(item[1], sort), reverse=True)
+        width = max([len(name) for name, _ in called] + [8])
+        lines = ["{:<{w}} {:>10} {:>10} {:>10} {:>12}  outcomes".format("function", "calls", "time [s]", "own [s]",
+                                                                       "pairs", w=width)]
+        for name, stats in called:
+            pairs = "{:>12}".format(stats.pairs) if stats.pairs else " " * 12
+            outcomes = ", ".join("{} {}".format(key, n) for key, n in sorted(stats.outcomes.items(),
+                                                                           key=lambda item: -item[1]))
+            if stats.total:
+                # broad phase, fraction of all pairs culled
+                outcomes = "culled {:.4%} of {}".format(1.0 - stats.pairs / stats.total, stats.total)
+            lines.append("{:<{w}} {:>10} {:>10.4f} {:>10.4f} {}  {}".format(name, stats.calls, stats.time, stats.own,
+                                                                         pairs, outcomes, w=width))
+        lines.append("elapsed {:.4f} s".format(self.elapsed))
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiling(include=None):
+    """
+    context manager instrumenting primitives while it is active
+
+    :param include: iterable of str, prefixes of names of instrumented functions (e.g. "edge_intersection",
+                    "spatial_index.UniformGrid"), default is all; hot scalar predicates (predicates.orient2d, ...)
+                    add noticeable overhead of wrapper to every call, they can be left out this way
+    :return: Profile, filled when context exits (and during it)
+    """
+    global _active
+    if _active is not None:
+        raise RuntimeError("profiling is already active")
+    profile = Profile()
+    _active = profile
+    start = perf_counter()
+    try:
+        profile._install(None if include is None else tuple(include))
+        yield profile
+    finally:
+        profile.elapsed = perf_counter() - start
+        profile._uninstall()
+        _active = None
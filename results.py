@@ -0,0 +1,182 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from enum import IntEnum
+from functools import lru_cache
+
+# compact representation of intersection results
+#
+# every family of tests has integer code (IntEnum), scalar functions return small objects with __slots__ holding
+# the code and numbers, batched functions return numpy arrays of codes or structured records
+#
+# scalar results behave like tuples returned by older versions (indexing, unpacking, len, comparison with tuple),
+# message string is not stored, it is created from the code only when it is asked for (result.message, item of
+# tuple view or code_messages() for arrays), so it is cheap to keep or log results
+
+
+class EdgeCode(IntEnum):
+    # integer replacement of message strings returned by edge_intersection_2d()
+    PARALLEL = 0
+    INTERSECTING = 1
+    OVERLAPPING = 2
+
+
+class SegmentCode(IntEnum):
+    # integer codes of segment_intersection_2d(), same as first item of returned tuple
+    TOUCHING = -1
+    NOT_INTERSECTING = 0
+    INTERSECTING = 1
+    OVERLAPPING = 2
+
+
+class FaceCode(IntEnum):
+    # integer codes of face_intersection_2d(), same as first item of returned tuple
+    TOUCHING = -1
+    NOT_INTERSECTING = 0
+    INTERSECTING = 1
+    EDGE_OVERLAPPING = 2
+
+
+class PointCode(IntEnum):
+    # classification of point against triangle
+    EDGE = -1
+    OUTSIDE = 0
+    INSIDE = 1
+
+
+# record of batched edge_intersection_2d_batch() output, fields follow tuple returned by edge_intersection_2d()
+#       status:     False: parallel, True: intersection (or overlapping)
+#       in_segment: 1.0 / 0.0 for intersection between / out of defined points, numpy.nan if unknown
+#       x, y:       intersection point if exists, if not numpy.nan
+#       distance:   distance if parallel, if not numpy.nan
+#       code:       EdgeCode value
+EDGE_INTERSECTION_DTYPE = np.dtype([("status", np.bool_),
+                                    ("in_segment", np.float64),
+                                    ("x", np.float64),
+                                    ("y", np.float64),
+                                    ("distance", np.float64),
+                                    ("code", np.int8)])
+
+# record of intersecting pair of segments i < j with intersection point and EdgeCode; overlapping segments
+# have point where overlap starts (sweep_line) or numpy.nan (batched queries)
+INTERSECTION_PAIR_DTYPE = np.dtype([("i", np.int64),
+                                    ("j", np.int64),
+                                    ("x", np.float64),
+                                    ("y", np.float64),
+                                    ("code", np.int8)])
+
+# record of segment-triangle pair, code is SegmentCode
+SEGMENT_TRIANGLE_PAIR_DTYPE = np.dtype([("i", np.int64),
+                                        ("j", np.int64),
+                                        ("code", np.int8)])
+
+# record of point i lying in triangle j (inside or on edge), code is PointCode
+POINT_TRIANGLE_PAIR_DTYPE = np.dtype([("i", np.int64),
+                                      ("j", np.int64),
+                                      ("code", np.int8)])
+
+# record of intersecting triangle pair, code is FaceCode
+FACE_PAIR_DTYPE = np.dtype([("i", np.int64),
+                            ("j", np.int64),
+                            ("code", np.int8)])
+
+
+class _Result(ABC):
+    # tuple compatible view of result, subclasses define _items()
+    __slots__ = ()
+
+    @abstractmethod
+    def _items(self):
+        """
+        :rtype: tuple, items of tuple view
+        """
+
+    @property
+    def message(self):
+        return self.code.name
+
+    def __len__(self):
+        return len(self._items())
+
+    def __iter__(self):
+        return iter(self._items())
+
+    def __getitem__(self, item):
+        return self._items()[item]
+
+    def __eq__(self, other):
+        # tuple first, isinstance() of abstract class is slower
+        if isinstance(other, tuple) or isinstance(other, _Result):
+            return self._items() == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash(self._items())
+
+    def __repr__(self):
+        return repr(self._items())
+
+
+class EdgeResult(_Result):
+    # result of edge_intersection_2d(), tuple view is (status, in_segment, x, y, distance, message)
+    __slots__ = ("status", "in_segment", "x", "y", "distance", "code")
+
+    def __init__(self, status, in_segment, x, y, distance, code):
+        self.status = status
+        self.in_segment = in_segment
+        self.x = x
+        self.y = y
+        self.distance = distance
+        self.code = code
+
+    def _items(self):
+        return self.status, self.in_segment, self.x, self.y, self.distance, self.code.name
+
+    @classmethod
+    def from_record(cls, record):
+        """
+        :param record: item of array of EDGE_INTERSECTION_DTYPE
+        :rtype: EdgeResult
+        """
+        in_segment = record["in_segment"]
+        in_segment = np.nan if np.isnan(in_segment) else bool(in_segment)
+        return cls(bool(record["status"]), in_segment, float(record["x"]), float(record["y"]),
+                   float(record["distance"]), EdgeCode(record["code"]))
+
+
+class CodeResult(_Result):
+    # result given by code only, tuple view is (int code, message)
+    # used by segment_intersection_2d() (SegmentCode) and face_intersection_2d() (FaceCode)
+    __slots__ = ("code", )
+
+    def __init__(self, code):
+        self.code = code
+
+    def _items(self):
+        return int(self.code), self.code.name
+
+
+@lru_cache(maxsize=None, typed=True)
+def code_result(code):
+    """
+    shared CodeResult of code, results of scalar functions given by code only are not allocated per call
+
+    :param code: member of SegmentCode or FaceCode
+    :rtype: CodeResult
+    """
+    return CodeResult(code)
+
+
+def code_messages(codes, code_type):
+    """
+    lazy view of message strings of array of codes, e.g. for logging
+
+    :param codes: array_like of int codes
+    :param code_type: IntEnum class of codes (EdgeCode, SegmentCode, FaceCode, PointCode)
+    :return: generator of str
+    """
+    for code in np.asarray(codes).ravel().tolist():
+        yield code_type(code).name
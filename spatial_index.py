@@ -0,0 +1,562 @@
+import numpy as np
+from abc import ABC, abstractmethod
+from itertools import chain, islice
+from math import floor
+
+from edge_intersection import edge_intersection_2d, edge_intersection_2d_batch
+from face_intersection import segment_intersection_2d, segment_intersection_2d_batch, face_intersection_2d_batch
+from predicates import orient2d_batch
+from results import EdgeCode, SegmentCode, FaceCode, INTERSECTION_PAIR_DTYPE, SEGMENT_TRIANGLE_PAIR_DTYPE, \
+    FACE_PAIR_DTYPE
+from triangle_mesh import TriangleMesh
+
+# broad phase for 2d primitives (segments, triangles)
+#
+# primitives are stored by key (any hashable, usually index in input array) with axis aligned bounding box
+# (x_min, y_min, x_max, y_max); index returns candidate pairs with overlapping (or touching) boxes and only
+# those are passed to narrow phase functions edge_intersection_2d() and segment_intersection_2d()
+#
+# UniformGrid: box is registered in every cell it covers, suitable for primitives of similar size
+# QuadTree:    box is stored in the deepest node which contains it whole, suitable for skewed data
+#
+# both indices support incremental insert(), remove() and update(), so scenes changing a little in time
+# do not have to be rebuilt from scratch
+#
+# *_candidates() generators yield one tuple per candidate pair, *_batches() generators evaluate candidate
+# pairs by batched kernels and yield only intersecting pairs as numpy record arrays of fixed length, so memory
+# used by query does not depend on number of results
+
+def bounding_boxes(primitives):
+    """
+    bounding boxes of primitives given by vertices
+
+    :param primitives: array_like of shape (N, K, 2), e.g. (N, 2, 2) for segments or (N, 3, 2) for triangles,
+                       or TriangleMesh (its cached boxes are used)
+    :rtype: ndarray of shape (N, 4), rows are (x_min, y_min, x_max, y_max)
+    """
+    if isinstance(primitives, TriangleMesh):
+        return primitives.bounds.reshape(len(primitives), -1)
+    primitives = np.asarray(primitives, dtype=np.float64)
+    return np.concatenate((primitives.min(axis=1), primitives.max(axis=1)), axis=1)
+
+
+def boxes_overlap(a, b):
+    # closed intervals, touching boxes overlap
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class _SpatialIndex(ABC):
+    # boxes by key, subclasses implement storage of boxes and pair search
+    def __init__(self):
+        self._boxes = {}
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, key):
+        return key in self._boxes
+
+    def __iter__(self):
+        return iter(self._boxes)
+
+    def bbox(self, key):
+        return self._boxes[key]
+
+    def insert_many(self, keys, boxes):
+        for key, box in zip(keys, np.asarray(boxes, dtype=np.float64).tolist()):
+            self.insert(key, box)
+
+    def update(self, key, box):
+        self.remove(key)
+        self.insert(key, box)
+
+    @abstractmethod
+    def insert(self, key, box):
+        """
+        :param key: hashable, KeyError if key is already in index
+        :param box: (x_min, y_min, x_max, y_max)
+        """
+
+    @abstractmethod
+    def remove(self, key):
+        """
+        :param key: key of inserted box, KeyError if there is none
+        """
+
+    @abstractmethod
+    def query(self, box):
+        """
+        :param box: (x_min, y_min, x_max, y_max)
+        :rtype: set of keys with box overlapping given box
+        """
+
+    @abstractmethod
+    def candidate_pairs(self):
+        """
+        generator of unique pairs (key_a, key_b) with overlapping boxes
+        """
+
+
+class UniformGrid(_SpatialIndex):
+    def __init__(self, cell_size=None):
+        """
+        :param cell_size: float, size of square cell; if None, cell size is derived from mean size of boxes
+                          in first insert_many() (or from first inserted box)
+        """
+        super(UniformGrid, self).__init__()
+        self.cell_size = cell_size
+        self._cells = {}
+
+    @staticmethod
+    def auto_cell_size(boxes):
+        # cell of the size of mean box extent keeps number of cells per box and boxes per cell small
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        extent = np.maximum(boxes[:, 2] - boxes[:, 0], boxes[:, 3] - boxes[:, 1])
+        size = extent.mean() if len(extent) else 0.0
+        if not size > 0:
+            # points only, use spread of data
+            span = np.ptp(boxes, axis=0).max() if len(boxes) else 0.0
+            size = span / max(np.sqrt(len(boxes)), 1.0) if span > 0 else 1.0
+        return float(size)
+
+    def _cell_range(self, box):
+        cs = self.cell_size
+        return floor(box[0] / cs), floor(box[1] / cs), floor(box[2] / cs), floor(box[3] / cs)
+
+    def insert_many(self, keys, boxes):
+        if self.cell_size is None:
+            self.cell_size = self.auto_cell_size(boxes)
+        super(UniformGrid, self).insert_many(keys, boxes)
+
+    def insert(self, key, box):
+        if key in self._boxes:
+            raise KeyError("key {} is already in index".format(key))
+        box = tuple(box)
+        if self.cell_size is None:
+            self.cell_size = self.auto_cell_size([box])
+        self._boxes[key] = box
+        x0, y0, x1, y1 = self._cell_range(box)
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                self._cells.setdefault((ix, iy), set()).add(key)
+
+    def remove(self, key):
+        box = self._boxes.pop(key)
+        x0, y0, x1, y1 = self._cell_range(box)
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                cell = self._cells[(ix, iy)]
+                cell.discard(key)
+                if not cell:
+                    del self._cells[(ix, iy)]
+
+    def query(self, box):
+        """
+        :param box: (x_min, y_min, x_max, y_max)
+        :rtype: set of keys with box overlapping given box
+        """
+        found = set()
+        if self.cell_size is None:
+            return found
+        x0, y0, x1, y1 = self._cell_range(box)
+        for ix in range(x0, x1 + 1):
+            for iy in range(y0, y1 + 1):
+                for key in self._cells.get((ix, iy), ()):
+                    if key not in found and boxes_overlap(self._boxes[key], box):
+                        found.add(key)
+        return found
+
+    def candidate_pairs(self):
+        """
+        generator of unique pairs (key_a, key_b) with overlapping boxes
+        """
+        cs, boxes = self.cell_size, self._boxes
+        for (ix, iy), cell in self._cells.items():
+            if len(cell) < 2:
+                continue
+            keys = list(cell)
+            for a in range(len(keys)):
+                box_a = boxes[keys[a]]
+                for b in range(a + 1, len(keys)):
+                    box_b = boxes[keys[b]]
+                    if not boxes_overlap(box_a, box_b):
+                        continue
+                    # pair is shared by every cell covering intersection of boxes,
+                    # it is reported only from cell containing lower left corner of intersection
+                    if floor(max(box_a[0], box_b[0]) / cs) == ix and floor(max(box_a[1], box_b[1]) / cs) == iy:
+                        yield keys[a], keys[b]
+
+
+class _QuadNode(object):
+    __slots__ = ("bounds", "depth", "items", "children")
+
+    def __init__(self, bounds, depth):
+        self.bounds = bounds
+        self.depth = depth
+        self.items = {}
+        self.children = None
+
+    def contains(self, box):
+        return (self.bounds[0] <= box[0] and box[2] <= self.bounds[2] and
+                self.bounds[1] <= box[1] and box[3] <= self.bounds[3])
+
+    def child_for(self, box):
+        # child which contains box whole, None if box crosses center lines
+        x0, y0, x1, y1 = self.bounds
+        cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+        if box[2] < cx:
+            col = 0
+        elif box[0] >= cx:
+            col = 1
+        else:
+            return None
+        if box[3] < cy:
+            row = 0
+        elif box[1] >= cy:
+            row = 1
+        else:
+            return None
+        return self.children[2 * row + col]
+
+    def split(self):
+        x0, y0, x1, y1 = self.bounds
+        cx, cy = (x0 + x1) / 2.0, (y0 + y1) / 2.0
+        self.children = [_QuadNode((x0, y0, cx, cy), self.depth + 1), _QuadNode((cx, y0, x1, cy), self.depth + 1),
+                         _QuadNode((x0, cy, cx, y1), self.depth + 1), _QuadNode((cx, cy, x1, y1), self.depth + 1)]
+
+
+class QuadTree(_SpatialIndex):
+    def __init__(self, bounds=None, max_items=8, max_depth=16):
+        """
+        :param bounds: (x_min, y_min, x_max, y_max) of root node; if None, it is taken from first insert,
+                       root grows automatically when box out of bounds is inserted
+        :param max_items: int, number of items in node which causes node split
+        :param max_depth: int, maximal depth of tree
+        """
+        super(QuadTree, self).__init__()
+        self.max_items = max_items
+        self.max_depth = max_depth
+        self._root = None if bounds is None else _QuadNode(tuple(float(b) for b in bounds), 0)
+        self._nodes = {}
+
+    def insert_many(self, keys, boxes):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if self._root is None and len(boxes):
+            self._root = _QuadNode(tuple(np.concatenate((boxes[:, :2].min(axis=0),
+                                                         boxes[:, 2:].max(axis=0))).tolist()), 0)
+        super(QuadTree, self).insert_many(keys, boxes)
+
+    def _grow(self, box):
+        # double root towards the box until box fits; old root becomes quadrant of new one
+        moved = []
+        while not self._root.contains(box):
+            old = self._root
+            x0, y0, x1, y1 = old.bounds
+            w, h = x1 - x0, y1 - y0
+            if not (w > 0 and h > 0):
+                # root of zero area (only points or axis-parallel segments so far) cannot be quadrant, it is
+                # replaced by root of its bounds extended by the box and all its boxes are re-inserted
+                self._root = _QuadNode((min(x0, box[0]), min(y0, box[1]), max(x1, box[2]), max(y1, box[3])), 0)
+                moved.extend(self._detach(old, lambda b: True))
+                continue
+            left, down = box[0] < x0, box[1] < y0
+            bounds = (x0 - w if left else x0, y0 - h if down else y0, x1 if left else x1 + w, y1 if down else y1 + h)
+            root = _QuadNode(bounds, 0)
+            root.split()
+            root.children[2 * int(down) + int(left)] = old
+            # quadrants are half-open (see child_for()), boxes of old root touching center lines of new root
+            # do not belong to its quadrant and would never be paired with boxes of sibling quadrants
+            moved.extend(self._detach(old, lambda b: root.child_for(b) is not old))
+            self._root = root
+        self._reset_depth(self._root, 0)
+        for key, b in moved:
+            self._insert(self._root, key, b)
+
+    @staticmethod
+    def _detach(node, condition):
+        # remove boxes satisfying condition from subtree of node, return list of (key, box)
+        detached, stack = [], [node]
+        while stack:
+            node = stack.pop()
+            for key, box in list(node.items.items()):
+                if condition(box):
+                    del node.items[key]
+                    detached.append((key, box))
+            if node.children is not None:
+                stack.extend(node.children)
+        return detached
+
+    def _reset_depth(self, node, depth):
+        node.depth = depth
+        if node.children is not None:
+            for child in node.children:
+                self._reset_depth(child, depth + 1)
+
+    def insert(self, key, box):
+        if key in self._boxes:
+            raise KeyError("key {} is already in index".format(key))
+        box = tuple(box)
+        if self._root is None:
+            self._root = _QuadNode(box, 0)
+        elif not self._root.contains(box):
+            self._grow(box)
+        self._boxes[key] = box
+        self._insert(self._root, key, box)
+
+    def _insert(self, node, key, box):
+        while node.children is not None:
+            child = node.child_for(box)
+            if child is None:
+                break
+            node = child
+        node.items[key] = box
+        self._nodes[key] = node
+
+        if node.children is None and len(node.items) > self.max_items and node.depth < self.max_depth:
+            node.split()
+            items, node.items = node.items, {}
+            for k, b in items.items():
+                child = node.child_for(b)
+                target = node if child is None else child
+                target.items[k] = b
+                self._nodes[k] = target
+
+    def remove(self, key):
+        del self._boxes[key]
+        del self._nodes.pop(key).items[key]
+
+    def query(self, box):
+        """
+        :param box: (x_min, y_min, x_max, y_max)
+        :rtype: set of keys with box overlapping given box
+        """
+        found = set()
+        stack = [] if self._root is None else [self._root]
+        while stack:
+            node = stack.pop()
+            if not boxes_overlap(node.bounds, box):
+                continue
+            found.update(k for k, b in node.items.items() if boxes_overlap(b, box))
+            if node.children is not None:
+                stack.extend(node.children)
+        return found
+
+    def candidate_pairs(self):
+        """
+        generator of unique pairs (key_a, key_b) with overlapping boxes
+        """
+        stack = [] if self._root is None else [self._root]
+        while stack:
+            node = stack.pop()
+            items = list(node.items.items())
+            for a in range(len(items)):
+                for b in range(a + 1, len(items)):
+                    if boxes_overlap(items[a][1], items[b][1]):
+                        yield items[a][0], items[b][0]
+            if node.children is None:
+                continue
+            # items stored in node against items stored deeper
+            for key, box in items:
+                inner = [child for child in node.children if boxes_overlap(child.bounds, box)]
+                while inner:
+                    descendant = inner.pop()
+                    for k, b in descendant.items.items():
+                        if boxes_overlap(box, b):
+                            yield key, k
+                    if descendant.children is not None:
+                        inner.extend(child for child in descendant.children if boxes_overlap(child.bounds, box))
+            stack.extend(node.children)
+
+
+def edge_intersection_candidates(edges, index=None):
+    """
+    generator of (i, j, edge_intersection_2d() result) for pairs of segments with overlapping bounding boxes
+
+    :param edges: array_like of shape (N, 2, 2)
+    :param index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    index = UniformGrid() if index is None else index
+    index.insert_many(range(len(edges)), bounding_boxes(edges))
+    for i, j in index.candidate_pairs():
+        i, j = (i, j) if i < j else (j, i)
+        yield i, j, edge_intersection_2d(edges[i][0], edges[i][1], edges[j][0], edges[j][1])
+
+
+def segment_triangle_candidates(segments, triangles, index=None):
+    """
+    generator of (i, j, segment_intersection_2d() result) for segment i and triangle j with overlapping
+    bounding boxes
+
+    :param segments: array_like of shape (N, 2, 2)
+    :param triangles: array_like of shape (M, 3, 2)
+    :param index: empty UniformGrid or QuadTree used for triangles, default UniformGrid with automatic cell size
+    """
+    segments, triangles = np.asarray(segments, dtype=np.float64), np.asarray(triangles, dtype=np.float64)
+    index = UniformGrid() if index is None else index
+    index.insert_many(range(len(triangles)), bounding_boxes(triangles))
+    for i, box in enumerate(bounding_boxes(segments).tolist()):
+        for j in sorted(index.query(box)):
+            p0, p1 = segments[i]
+            yield i, j, segment_intersection_2d(p0, p1, triangles[j][0], triangles[j][1], triangles[j][2])
+
+
+def record_batches(chunks, batch_size, dtype):
+    """
+    regroup record arrays of arbitrary length to arrays of batch_size records (the last one may be shorter)
+
+    :param chunks: iterable of ndarray of dtype
+    :param batch_size: int
+    :param dtype: numpy.dtype of records
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size has to be positive")
+    buffer, filled = np.empty(batch_size, dtype=dtype), 0
+    for chunk in chunks:
+        start = 0
+        while start < len(chunk):
+            n = min(batch_size - filled, len(chunk) - start)
+            buffer[filled:filled + n] = chunk[start:start + n]
+            filled, start = filled + n, start + n
+            if filled == batch_size:
+                yield buffer
+                buffer, filled = np.empty(batch_size, dtype=dtype), 0
+    if filled:
+        yield buffer[:filled]
+
+
+def _pair_chunks(pairs, chunk_size):
+    # generator of (i, j) index arrays of at most chunk_size pairs taken from iterable of pairs
+    pairs = iter(pairs)
+    while True:
+        flat = np.fromiter(chain.from_iterable(islice(pairs, chunk_size)), dtype=np.int64)
+        if not len(flat):
+            return
+        yield flat[0::2], flat[1::2]
+
+
+def intersecting_edge_pairs(edges1, edges2, i, j):
+    """
+    pairs (edges1[i], edges2[j]) crossing inside of both segments, or collinear and sharing a part
+    (EdgeCode.OVERLAPPING, x and y are numpy.nan); parallel and collinear segments are decided by exact
+    predicates (robust mode of edge_intersection_2d_batch())
+
+    :param edges1: ndarray of shape (N, 2, 2)
+    :param edges2: ndarray of shape (M, 2, 2)
+    :param i: ndarray of int of shape (K, ), indices to edges1
+    :param j: ndarray of int of shape (K, ), indices to edges2
+    :rtype: ndarray of INTERSECTION_PAIR_DTYPE
+    """
+    e1, e2 = edges1[i], edges2[j]
+    result = edge_intersection_2d_batch(e1, e2, all_pairs=False, robust=True)
+    hit = result["in_segment"] == 1
+
+    # exactly parallel segments are collinear if endpoints of the shorter one are on line of the longer one
+    # (exact orient2d), they share a part if parameters of its endpoints on the longer one overlap with [0, 1]
+    k = np.flatnonzero(result["code"] != EdgeCode.INTERSECTING)
+    a, b = e1[k], e2[k]
+    swap = (np.einsum("kpd,kpd->k", np.diff(a, axis=1), np.diff(a, axis=1)) <
+            np.einsum("kpd,kpd->k", np.diff(b, axis=1), np.diff(b, axis=1)))
+    line = np.where(swap[:, np.newaxis, np.newaxis], b, a)
+    other = np.where(swap[:, np.newaxis, np.newaxis], a, b)
+    collinear = (orient2d_batch(line[:, 0], line[:, 1], other[:, 0]) == 0) & \
+        (orient2d_batch(line[:, 0], line[:, 1], other[:, 1]) == 0)
+    d = line[:, 1] - line[:, 0]
+    length_2 = np.einsum("kd,kd->k", d, d)
+    # longer one is a point, so both are points
+    point = length_2 == 0
+    collinear[point] = np.all(line[point, 0] == other[point, 0], axis=1)
+    length_2[point] = 1.0
+    u3 = np.einsum("kd,kd->k", other[:, 0] - line[:, 0], d) / length_2
+    u4 = np.einsum("kd,kd->k", other[:, 1] - line[:, 0], d) / length_2
+    hit[k] = collinear & (np.maximum(np.minimum(u3, u4), 0.0) <= np.minimum(np.maximum(u3, u4), 1.0))
+    result["code"][k] = np.where(collinear, EdgeCode.OVERLAPPING, EdgeCode.PARALLEL)
+
+    out = np.empty(int(hit.sum()), dtype=INTERSECTION_PAIR_DTYPE)
+    out["i"], out["j"] = i[hit], j[hit]
+    out["x"], out["y"], out["code"] = result["x"][hit], result["y"][hit], result["code"][hit]
+    return out
+
+
+def intersecting_segment_triangle_pairs(segments, triangles, i, j):
+    """
+    pairs (segments[i], triangles[j]) with segment_intersection_2d() other than NOT_INTERSECTING
+
+    :param segments: ndarray of shape (N, 2, 2)
+    :param triangles: ndarray of shape (M, 3, 2)
+    :param i: ndarray of int of shape (K, ), indices to segments
+    :param j: ndarray of int of shape (K, ), indices to triangles
+    :rtype: ndarray of SEGMENT_TRIANGLE_PAIR_DTYPE
+    """
+    code = segment_intersection_2d_batch(segments[i], triangles[j])
+    hit = code != SegmentCode.NOT_INTERSECTING
+    out = np.empty(int(hit.sum()), dtype=SEGMENT_TRIANGLE_PAIR_DTYPE)
+    out["i"], out["j"], out["code"] = i[hit], j[hit], code[hit]
+    return out
+
+
+def intersecting_face_pairs(faces1, faces2, i, j):
+    """
+    pairs (faces1[i], faces2[j]) with face_intersection_2d_batch() other than NOT_INTERSECTING
+
+    :param faces1: ndarray of shape (N, 3, 2)
+    :param faces2: ndarray of shape (M, 3, 2)
+    :param i: ndarray of int of shape (K, ), indices to faces1
+    :param j: ndarray of int of shape (K, ), indices to faces2
+    :rtype: ndarray of FACE_PAIR_DTYPE
+    """
+    code = face_intersection_2d_batch(faces1[i], faces2[j])
+    hit = code != FaceCode.NOT_INTERSECTING
+    out = np.empty(int(hit.sum()), dtype=FACE_PAIR_DTYPE)
+    out["i"], out["j"], out["code"] = i[hit], j[hit], code[hit]
+    return out
+
+
+def edge_intersection_batches(edges, index=None, batch_size=1 << 16):
+    """
+    generator of intersecting pairs i < j of segments with overlapping bounding boxes,
+    see intersecting_edge_pairs()
+
+    :param edges: array_like of shape (N, 2, 2)
+    :param index: empty UniformGrid or QuadTree, default UniformGrid with automatic cell size
+    :param batch_size: int, number of records in yielded arrays (candidate pairs are evaluated in chunks
+                       of the same size)
+    :return: generator of ndarray of INTERSECTION_PAIR_DTYPE
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    index = UniformGrid() if index is None else index
+    index.insert_many(range(len(edges)), bounding_boxes(edges))
+
+    def chunks():
+        for a, b in _pair_chunks(index.candidate_pairs(), batch_size):
+            yield intersecting_edge_pairs(edges, edges, np.minimum(a, b), np.maximum(a, b))
+
+    return record_batches(chunks(), batch_size, INTERSECTION_PAIR_DTYPE)
+
+
+def segment_triangle_batches(segments, triangles, index=None, batch_size=1 << 16):
+    """
+    generator of intersecting pairs of segment i and triangle j with overlapping bounding boxes,
+    see intersecting_segment_triangle_pairs()
+
+    :param segments: array_like of shape (N, 2, 2)
+    :param triangles: array_like of shape (M, 3, 2)
+    :param index: empty UniformGrid or QuadTree used for triangles, default UniformGrid with automatic cell size
+    :param batch_size: int, number of records in yielded arrays (candidate pairs are evaluated in chunks
+                       of the same size)
+    :return: generator of ndarray of SEGMENT_TRIANGLE_PAIR_DTYPE
+    """
+    segments, triangles = np.asarray(segments, dtype=np.float64), np.asarray(triangles, dtype=np.float64)
+    index = UniformGrid() if index is None else index
+    index.insert_many(range(len(triangles)), bounding_boxes(triangles))
+
+    def candidates():
+        for i, box in enumerate(bounding_boxes(segments).tolist()):
+            for j in sorted(index.query(box)):
+                yield i, j
+
+    def chunks():
+        for i, j in _pair_chunks(candidates(), batch_size):
+            yield intersecting_segment_triangle_pairs(segments, triangles, i, j)
+
+    return record_batches(chunks(), batch_size, SEGMENT_TRIANGLE_PAIR_DTYPE)
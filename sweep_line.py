@@ -0,0 +1,223 @@
+import heapq
+import math
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+from results import EdgeCode, INTERSECTION_PAIR_DTYPE
+from tolerance import get_tolerance
+
+# Bentley-Ottmann sweep line algorithm (de Berg et al., Computational Geometry, chapter 2), reports every pair of
+# intersecting segments in O((n + k) log n) time, where k is number of intersections
+#
+# sweep line goes from left to right, event points are ordered lexicographically by (x, y), so vertical segments
+# starts at their lower endpoint and line at the same x is processed from bottom to top
+#
+# status (segments crossing sweep line) is kept in python list ordered by y coordinate at current event point,
+# position is searched by bisection (O(log n)), insert / delete is memmove of list of pointers
+#
+# in event point p:
+#       U(p): segments with left endpoint p (stored in event queue)
+#       C(p): segments containing p in interior
+#       L(p): segments with right endpoint p
+#       C(p) and L(p) are contiguous part of the status, all segments of U(p) + C(p) + L(p) are reported,
+#       C(p) and L(p) are removed and U(p) + C(p) are inserted back in order given by slope (just right of p),
+#       new neighbours are tested on intersection right of p and added to event queue
+#
+# pair test uses same parametric equations as edge_intersection_2d():
+#       pt1_xy + u * dp1 = pt3_xy + v * dp2
+#       d = (dp1_x * dp2_y) - (dp1_y * dp2_x)
+#       u = (((pt1_y - pt3_y) * dp2_x) - (dp2_y * (pt1_x - pt3_x))) / d
+#       v = (((pt1_y - pt3_y) * dp1_x) - (dp1_y * (pt1_x - pt3_x))) / d
+# parallel segments never cross, collinear segments sharing a part are reported as EdgeCode.OVERLAPPING
+# with point where overlap starts
+#
+# output records are of results.INTERSECTION_PAIR_DTYPE, i < j are indices of input segments
+
+
+class _Sweep(object):
+    def __init__(self, edges, tol):
+        self.tol = tol
+        # left endpoint is lexicographically smaller one
+        swap = (edges[:, 0, 0] > edges[:, 1, 0]) | ((edges[:, 0, 0] == edges[:, 1, 0]) &
+                                                     (edges[:, 0, 1] > edges[:, 1, 1]))
+        edges = np.where(swap[:, np.newaxis, np.newaxis], edges[:, ::-1], edges)
+        self.x1, self.y1 = edges[:, 0, 0].tolist(), edges[:, 0, 1].tolist()
+        self.x2, self.y2 = edges[:, 1, 0].tolist(), edges[:, 1, 1].tolist()
+        dx, dy = edges[:, 1, 0] - edges[:, 0, 0], edges[:, 1, 1] - edges[:, 0, 1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.slope = np.where(dx != 0, dy / np.where(dx != 0, dx, 1.0), np.inf).tolist()
+
+        self.status = []
+        self.queue, self.starts, self.ends = [], {}, {}
+        for idx, pt in enumerate(zip(self.x1, self.y1)):
+            self.push(pt)
+            self.starts.setdefault(pt, []).append(idx)
+        for idx, pt in enumerate(zip(self.x2, self.y2)):
+            self.push(pt)
+            self.ends.setdefault(pt, []).append(idx)
+
+        self.reported = set()
+        self.result = []
+        self.px, self.py = -math.inf, -math.inf
+
+    def push(self, pt):
+        if pt not in self.starts and pt not in self.ends:
+            heapq.heappush(self.queue, pt)
+        # event already in queue is marked by empty record
+        self.starts.setdefault(pt, [])
+
+    def key(self, idx):
+        # y coordinate of segment on sweep line at current event point
+        if self.slope[idx] == math.inf:
+            return self.py
+        if self.px == self.x1[idx]:
+            return self.y1[idx]
+        if self.px == self.x2[idx]:
+            return self.y2[idx]
+        return self.y1[idx] + (self.px - self.x1[idx]) * self.slope[idx]
+
+    def order(self, idx):
+        # order of segments passing through current event point, just right of it
+        return self.slope[idx], idx
+
+    def pair(self, i, j):
+        # intersection of segments i, j; return None or (x, y, code)
+        pt1_x, pt1_y, pt2_x, pt2_y = self.x1[i], self.y1[i], self.x2[i], self.y2[i]
+        pt3_x, pt3_y, pt4_x, pt4_y = self.x1[j], self.y1[j], self.x2[j], self.y2[j]
+        dp1_x, dp1_y = pt2_x - pt1_x, pt2_y - pt1_y
+        dp2_x, dp2_y = pt4_x - pt3_x, pt4_y - pt3_y
+        d = (dp1_x * dp2_y) - (dp1_y * dp2_x)
+        length1, length2 = math.hypot(dp1_x, dp1_y), math.hypot(dp2_x, dp2_y)
+
+        # angle of segments is so small that endpoints deviate from other line by less than tol
+        if abs(d) <= self.tol * min(length1, length2):
+            return self.collinear_pair(i, j)
+
+        u = (((pt1_y - pt3_y) * dp2_x) - (dp2_y * (pt1_x - pt3_x))) / d
+        v = (((pt1_y - pt3_y) * dp1_x) - (dp1_y * (pt1_x - pt3_x))) / d
+        # tolerance in parameter space corresponds to tolerance in distance
+        eps_u, eps_v = self.tol / length1, self.tol / length2
+        if -eps_u <= u <= 1.0 + eps_u and -eps_v <= v <= 1.0 + eps_v:
+            u = min(max(u, 0.0), 1.0)
+            return pt1_x + (u * dp1_x), pt1_y + (u * dp1_y), EdgeCode.INTERSECTING
+        return None
+
+    def collinear_pair(self, i, j):
+        # parallel (or degenerated) segments, they intersect only if they are on the same line
+        if math.hypot(self.x2[i] - self.x1[i], self.y2[i] - self.y1[i]) < \
+                math.hypot(self.x2[j] - self.x1[j], self.y2[j] - self.y1[j]):
+            i, j = j, i
+        # i is the longer one, distance of j endpoints from line of i
+        pt1_x, pt1_y, dp1_x, dp1_y = self.x1[i], self.y1[i], self.x2[i] - self.x1[i], self.y2[i] - self.y1[i]
+        length = math.hypot(dp1_x, dp1_y)
+        if length == 0:
+            # both segments are points
+            if abs(self.x1[j] - pt1_x) <= self.tol and abs(self.y1[j] - pt1_y) <= self.tol:
+                return pt1_x, pt1_y, EdgeCode.INTERSECTING
+            return None
+
+        for pt_x, pt_y in ((self.x1[j], self.y1[j]), (self.x2[j], self.y2[j])):
+            if abs((dp1_x * (pt_y - pt1_y)) - (dp1_y * (pt_x - pt1_x))) / length > self.tol:
+                return None
+
+        # parameters of j endpoints on i; both are ordered by (x, y) so j runs in the same direction
+        length_2 = length ** 2
+        u1 = ((self.x1[j] - pt1_x) * dp1_x + (self.y1[j] - pt1_y) * dp1_y) / length_2
+        u2 = ((self.x2[j] - pt1_x) * dp1_x + (self.y2[j] - pt1_y) * dp1_y) / length_2
+        start, end = max(u1, 0.0), min(u2, 1.0)
+        if (end - start) * length < -self.tol:
+            return None
+        code = EdgeCode.OVERLAPPING if (end - start) * length > self.tol else EdgeCode.INTERSECTING
+        return pt1_x + (start * dp1_x), pt1_y + (start * dp1_y), code
+
+    def report(self, i, j):
+        i, j = (i, j) if i < j else (j, i)
+        if (i, j) in self.reported:
+            return
+        intersection = self.pair(i, j)
+        if intersection is not None:
+            self.reported.add((i, j))
+            self.result.append((i, j) + intersection)
+
+    def find_new_event(self, i, j):
+        intersection = self.pair(i, j)
+        if intersection is None or intersection[2] == EdgeCode.OVERLAPPING:
+            # overlapping segments are reported when the later one starts on the other
+            return
+        pt = intersection[:2]
+        if pt > (self.px, self.py):
+            self.push(pt)
+        elif abs(pt[0] - self.px) <= self.tol and abs(pt[1] - self.py) <= self.tol:
+            self.report(i, j)
+
+    def handle_event(self, pt):
+        self.px, self.py = pt
+        upper, ending = self.starts.pop(pt), self.ends.pop(pt, [])
+
+        lo = bisect_left(self.status, self.py - self.tol, key=self.key)
+        hi = bisect_right(self.status, self.py + self.tol, key=self.key)
+        crossing = self.status[lo:hi]
+
+        # segment ending in this point has to be removed even if float order of status is broken
+        # (degenerated segment starts and ends in the same event and it is never inserted)
+        missing = set(ending).difference(crossing, upper)
+        for idx in missing:
+            position = self.status.index(idx)
+            del self.status[position]
+            if position < lo:
+                lo, hi = lo - 1, hi - 1
+            elif 0 < position < len(self.status):
+                self.find_new_event(self.status[position - 1], self.status[position])
+
+        involved = upper + crossing + list(missing)
+        if len(involved) > 1:
+            for a in range(len(involved)):
+                for b in range(a + 1, len(involved)):
+                    self.report(involved[a], involved[b])
+
+        ending = set(ending)
+        inserted = sorted([idx for idx in upper + crossing if idx not in ending], key=self.order)
+        self.status[lo:hi] = inserted
+
+        if not inserted:
+            if 0 < lo < len(self.status):
+                self.find_new_event(self.status[lo - 1], self.status[lo])
+            return
+        if lo > 0:
+            self.find_new_event(self.status[lo - 1], inserted[0])
+        if lo + len(inserted) < len(self.status):
+            self.find_new_event(inserted[-1], self.status[lo + len(inserted)])
+
+    def run(self):
+        while self.queue:
+            self.handle_event(heapq.heappop(self.queue))
+        result = np.array(self.result, dtype=INTERSECTION_PAIR_DTYPE)
+        return result[np.lexsort((result["j"], result["i"]))]
+
+
+def sweep_intersections(edges, tol=None):
+    """
+    find all intersecting pairs in set of segments using Bentley-Ottmann sweep line algorithm
+
+    :param edges: array_like of shape (N, 2, 2), segments defined by [[x1, y1], [x2, y2]]
+    :param tol: float, distance under which points are considered identical,
+                default is relative tolerance of current context (1e-12) * maximal absolute coordinate
+    :rtype: ndarray of INTERSECTION_PAIR_DTYPE sorted by (i, j)
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    if edges.ndim != 3 or edges.shape[1:] != (2, 2):
+        raise ValueError("edges have to be array of shape (N, 2, 2)")
+    if len(edges) == 0:
+        return np.empty(0, dtype=INTERSECTION_PAIR_DTYPE)
+    if tol is None:
+        tol = get_tolerance().relative_limit(max(np.abs(edges).max(), 1.0))
+    return _Sweep(edges, tol).run()
+
+
+# crossing example
+# edges = [[[0.0, 0.0], [2.0, 2.0]], [[0.0, 2.0], [2.0, 0.0]], [[1.0, -1.0], [1.0, 3.0]], [[1.5, 0.0], [3.0, 0.0]]]
+# print(sweep_intersections(edges))
+
+# overlapping example
+# edges = [[[0.0, 0.0], [2.0, 0.0]], [[1.0, 0.0], [3.0, 0.0]], [[2.0, 0.0], [2.0, 1.0]]]
+# print(sweep_intersections(edges))
@@ -0,0 +1,174 @@
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# tolerance policy shared by all primitives
+#
+#       absolute:    values (determinants, distances, denominators) with magnitude up to absolute are zero
+#       relative:    tolerance relative to magnitude of data, used by tests which are scale-aware by nature
+#                    (separating axis test, barycentric coordinates, sweep line, mesh intersection)
+#       scale_aware: if True, absolute tests are scale-aware too, value is zero if
+#                    |value| <= absolute + relative * scale, where scale is magnitude of the value computed
+#                    from its inputs (e.g. product of segment lengths for cross product)
+#
+# current tolerance is stored in context variable, so it is local to thread / asyncio task and it is changed
+# temporarily by context manager
+#
+#       with tolerance(absolute=1e-8):
+#           edge_intersection_2d(...)
+#
+# exact() is fast path for pre-validated data (no near-degenerate input), all tolerances are zero and kernels
+# skip computation of scales and compare with zero directly
+#
+# WARNING: absolute tolerance is not scale-invariant
+#       absolute tolerance is compared with values as they are, whatever their units are; by default
+#       (scale_aware=False) it is applied to determinants and cross products too, which are length ** 2
+#       (edge_intersection_2d(), parallel test of its batched kernel) or length ** 3 (planeline_intersection()),
+#       so with default 1e-10 every pair of segments shorter than about 1e-5 is PARALLEL and results change
+#       when coordinates are rescaled; scale_aware=True alone does not help, absolute part is still added
+#       for small or large coordinates (far from 1.0) use one of
+#           robust=True                                     exact predicates decide parallel / overlapping
+#           tolerance(absolute=0.0, scale_aware=True)       purely relative tests
+#           coordinates rescaled to magnitude of about 1.0
+#       functions which are scale-invariant whatever the tolerance is: relative tests of mesh_intersection,
+#       face_intersection_2d_batch, point_in_triangle_batch (barycentric coordinates), segment / ray - triangle
+#       kernels (plane_line_3d_intesection) and clipping (exact predicates)
+
+_DEFAULT_ABSOLUTE = 1e-10
+_DEFAULT_RELATIVE = 1e-12
+
+
+class Tolerance(object):
+    __slots__ = ("absolute", "relative", "scale_aware")
+
+    def __init__(self, absolute=_DEFAULT_ABSOLUTE, relative=_DEFAULT_RELATIVE, scale_aware=False):
+        if absolute < 0 or relative < 0:
+            raise ValueError("tolerance cannot be negative")
+        self.absolute = float(absolute)
+        self.relative = float(relative)
+        self.scale_aware = bool(scale_aware)
+
+    def __repr__(self):
+        return "Tolerance(absolute={}, relative={}, scale_aware={})".format(self.absolute, self.relative,
+                                                                            self.scale_aware)
+
+    def __eq__(self, other):
+        if not isinstance(other, Tolerance):
+            return NotImplemented
+        return (self.absolute, self.relative, self.scale_aware) == (other.absolute, other.relative,
+                                                                    other.scale_aware)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    def __hash__(self):
+        return hash((self.absolute, self.relative, self.scale_aware))
+
+    def __getstate__(self):
+        return self.absolute, self.relative, self.scale_aware
+
+    def __setstate__(self, state):
+        self.absolute, self.relative, self.scale_aware = state
+
+    @property
+    def exact(self):
+        return self.absolute == 0 and self.relative == 0
+
+    @property
+    def decimals(self):
+        # number of decimal places which are significant under absolute tolerance, None if exact
+        return None if self.absolute == 0 else max(int(round(-math.log10(self.absolute))), 0)
+
+    def replace(self, **kwargs):
+        """
+        :rtype: Tolerance, copy with given fields changed
+        """
+        values = {"absolute": self.absolute, "relative": self.relative, "scale_aware": self.scale_aware}
+        values.update(kwargs)
+        return Tolerance(**values)
+
+    def limit(self, scale=None):
+        """
+        largest magnitude of value considered zero
+
+        :param scale: float or ndarray, magnitude of value; used only if tolerance is scale-aware
+        :rtype: float or ndarray
+        """
+        if self.scale_aware and scale is not None:
+            return self.absolute + (self.relative * scale)
+        return self.absolute
+
+    def zero(self, value, scale=None):
+        """
+        |value| <= limit(scale); absolute tolerance is in units of value, so it is not scale-invariant for
+        determinants and cross products unless tolerance is scale-aware with absolute zero (see module comment)
+
+        :param value: float or ndarray
+        :param scale: float or ndarray, magnitude of value; used only if tolerance is scale-aware
+        :rtype: bool or ndarray of bool
+        """
+        if self.exact:
+            return value == 0
+        return abs(value) <= self.limit(scale)
+
+    def relative_limit(self, scale):
+        """
+        tolerance relative to magnitude of data
+
+        :param scale: float or ndarray
+        :rtype: float or ndarray
+        """
+        return self.relative * scale
+
+
+DEFAULT = Tolerance()
+EXACT = Tolerance(0.0, 0.0)
+
+_current = ContextVar("tolerance", default=DEFAULT)
+
+
+def get_tolerance():
+    """
+    :rtype: Tolerance, tolerance of current context
+    """
+    return _current.get()
+
+
+def set_tolerance(tol):
+    """
+    set tolerance of current context
+
+    :param tol: Tolerance
+    :return: token for reset_tolerance()
+    """
+    if not isinstance(tol, Tolerance):
+        raise TypeError("expected Tolerance, got {}".format(type(tol).__name__))
+    return _current.set(tol)
+
+
+def reset_tolerance(token):
+    _current.reset(token)
+
+
+@contextmanager
+def tolerance(tol=None, **kwargs):
+    """
+    context manager changing tolerance temporarily
+
+    :param tol: Tolerance or None for current one
+    :param kwargs: fields of Tolerance to be changed (absolute, relative, scale_aware)
+    """
+    tol = get_tolerance() if tol is None else tol
+    token = set_tolerance(tol.replace(**kwargs) if kwargs else tol)
+    try:
+        yield get_tolerance()
+    finally:
+        reset_tolerance(token)
+
+
+def exact():
+    """
+    context manager of fast path for pre-validated data, every tolerance is zero
+    """
+    return tolerance(EXACT)
@@ -0,0 +1,199 @@
+import numpy as np
+
+from mesh_io import load_mesh, weld_triangles
+
+# triangular mesh as struct of arrays
+#
+#       vertices:  contiguous float64 array of shape (V, D), D = 2 or 3
+#       faces:     contiguous int32 array of shape (F, 3), vertex indices
+# data derived from them are computed on first access and kept (arrays are read-only, derived data are valid
+# as long as mesh lives), so they are computed once per mesh instead of once per tested pair
+#       triangles:         (F, 3, D) vertices of faces
+#       edges:             (F, 3, D) edge vectors v1 - v0, v2 - v1, v0 - v2
+#       normals:           (F, 3) cross(v1 - v0, v2 - v0), not normalized (length is double area), z only in 2d
+#       offsets:           (F, ) plane offsets normal . v0, plane of face is normal . x = offset
+#       bounds:            (F, 2, D) lower and upper corner of bounding box of face
+#       unique_edges:      (E, 2) vertex indices (lower first) of edges shared by faces
+#       face_edges:        (F, 3) indices to unique_edges of edges of face (in the order of edges)
+#       edge_faces:        (E, 2) faces adjacent to edge, -1 for boundary edge (the first two faces of
+#                          non-manifold edges)
+#       edge_face_counts:  (E, ) number of faces of edge (1 boundary, 2 manifold, more non-manifold)
+#
+# mesh converts to triangle soup (numpy.asarray(mesh) is mesh.triangles), so it is accepted by every function
+# taking array of triangles; bounding_boxes(), TriangleBVH, mesh_intersection(), mesh_self_intersection()
+# and 3d segment / ray - triangle kernels use derived data of mesh directly
+#
+#       mesh = TriangleMesh.load("part.stl")
+#       pairs = mesh_self_intersection(mesh)
+#       moved = mesh.moved(vertices)  # new coordinates, topology (and its derived data) is shared
+
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def _readonly(array):
+    array = array.view()
+    array.flags.writeable = False
+    return array
+
+
+class TriangleMesh(object):
+    __slots__ = ("vertices", "faces", "_triangles", "_edges", "_normals", "_offsets", "_bounds", "_topology")
+
+    def __init__(self, vertices, faces):
+        """
+        :param vertices: array_like of shape (V, 2) or (V, 3)
+        :param faces: array_like of int of shape (F, 3), vertex indices
+        """
+        vertices = np.ascontiguousarray(vertices, dtype=np.float64)
+        if vertices.ndim != 2 or vertices.shape[1] not in (2, 3):
+            raise ValueError("vertices have to be array of shape (V, 2) or (V, 3)")
+        if len(vertices) > _INT32_MAX:
+            raise ValueError("too many vertices for int32 faces")
+        faces = np.ascontiguousarray(np.reshape(faces, (-1, 3)), dtype=np.int32)
+        self.vertices = _readonly(vertices)
+        self.faces = _readonly(faces)
+        self._triangles = self._edges = self._normals = self._offsets = self._bounds = None
+        # (unique_edges, face_edges, edge_faces, edge_face_counts), shared by moved copies
+        self._topology = None
+
+    @classmethod
+    def from_triangles(cls, triangles, weld=True):
+        """
+        :param triangles: array_like of shape (F, 3, D), triangle soup
+        :param weld: bool, True: vertices with equal coordinates are merged (needed for adjacency and
+                     mesh_self_intersection()), False: every face has its own vertices (triangles are kept,
+                     float64 input is not copied)
+        :rtype: TriangleMesh
+        """
+        triangles = np.ascontiguousarray(triangles, dtype=np.float64)
+        triangles = triangles.reshape(-1, 3, triangles.shape[-1] if triangles.size else 3)
+        if weld:
+            return cls(*weld_triangles(triangles))
+        mesh = cls(triangles.reshape(-1, triangles.shape[-1]), np.arange(3 * len(triangles)))
+        mesh._triangles = _readonly(triangles)
+        return mesh
+
+    @classmethod
+    def from_mesh_data(cls, data, weld=True):
+        """
+        :param data: mesh_io.MeshData
+        :param weld: bool, weld triangle soup (e.g. STL), see from_triangles()
+        :rtype: TriangleMesh
+        """
+        if data.indexed:
+            return cls(data.vertices, data.faces)
+        return cls.from_triangles(data.triangles, weld)
+
+    @classmethod
+    def load(cls, path, weld=True):
+        """
+        :param path: str, STL, OBJ or PLY file, see mesh_io.load_mesh()
+        :param weld: bool, weld triangle soup (e.g. STL), see from_triangles()
+        :rtype: TriangleMesh
+        """
+        return cls.from_mesh_data(load_mesh(path), weld)
+
+    def __len__(self):
+        return len(self.faces)
+
+    def __repr__(self):
+        return "TriangleMesh(vertices={}, faces={}, dimension={})".format(len(self.vertices), len(self.faces),
+                                                                          self.dimension)
+
+    def __array__(self, dtype=None, copy=None):
+        # triangle soup view, used by functions taking array of triangles
+        if copy:
+            return np.array(self.triangles, dtype=dtype)
+        return self.triangles if dtype is None else self.triangles.astype(dtype, copy=False)
+
+    @property
+    def dimension(self):
+        return self.vertices.shape[1]
+
+    def moved(self, vertices):
+        """
+        mesh of the same faces with new vertex coordinates, topology data are shared
+
+        :param vertices: array_like of shape (V, D)
+        :rtype: TriangleMesh
+        """
+        mesh = TriangleMesh(vertices, self.faces)
+        if mesh.vertices.shape != self.vertices.shape:
+            raise ValueError("moved mesh has to have the same number of vertices")
+        mesh._topology = self._topology
+        return mesh
+
+    @property
+    def triangles(self):
+        if self._triangles is None:
+            self._triangles = _readonly(self.vertices[self.faces])
+        return self._triangles
+
+    @property
+    def edges(self):
+        if self._edges is None:
+            tri = self.triangles
+            self._edges = _readonly(np.roll(tri, -1, axis=1) - tri)
+        return self._edges
+
+    @property
+    def normals(self):
+        if self._normals is None:
+            tri = self.triangles
+            # the same expression as in kernels, so results of mesh and of plain arrays are identical
+            normals = np.cross(tri[:, 1] - tri[:, 0], tri[:, 2] - tri[:, 0])
+            if self.dimension == 2:
+                normals = np.stack((np.zeros_like(normals), np.zeros_like(normals), normals), axis=1)
+            self._normals = _readonly(normals)
+        return self._normals
+
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            v0 = self.triangles[:, 0]
+            normals = self.normals if self.dimension == 3 else self.normals[:, :2]
+            self._offsets = _readonly(np.einsum("kd,kd->k", v0, normals))
+        return self._offsets
+
+    @property
+    def bounds(self):
+        if self._bounds is None:
+            tri = self.triangles
+            self._bounds = _readonly(np.stack((tri.min(axis=1), tri.max(axis=1)), axis=1))
+        return self._bounds
+
+    def _adjacency(self):
+        if self._topology is None:
+            # edge k of face f is row 3 * f + k
+            pairs = np.sort(self.faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+            keys = pairs[:, 0].astype(np.int64) * len(self.vertices) + pairs[:, 1]
+            _, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+            inverse = inverse.ravel()
+
+            # faces grouped by edge, the first two of every group
+            faces = np.argsort(inverse, kind="stable") // 3
+            starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+            edge_faces = np.full((len(counts), 2), -1, dtype=np.int32)
+            edge_faces[:, 0] = faces[starts]
+            shared = counts > 1
+            edge_faces[shared, 1] = faces[starts[shared] + 1]
+
+            self._topology = (_readonly(pairs[first]), _readonly(inverse.reshape(-1, 3).astype(np.int32)),
+                              _readonly(edge_faces), _readonly(counts))
+        return self._topology
+
+    @property
+    def unique_edges(self):
+        return self._adjacency()[0]
+
+    @property
+    def face_edges(self):
+        return self._adjacency()[1]
+
+    @property
+    def edge_faces(self):
+        return self._adjacency()[2]
+
+    @property
+    def edge_face_counts(self):
+        return self._adjacency()[3]